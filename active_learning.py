@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+"""
+主动学习标注顺序：优先标注智能提示模型最拿不准（概率接近 0.5）的案例。
+
+后台线程从随机顺序中取出一批待标注案例作为候选池（默认 1000 条），分词、提取特征后
+缓存为稀疏特征矩阵，用 predict_many 批量打分并按 |p - 0.5| 排序。每次标注在线更新
+模型后只需重新做一次矩阵-向量乘法即可重新排序；学习特征增删或累计更新较多
+（TF-IDF 文档频率有变化）时才重新提取候选池的特征。排序全部在后台完成，标注界面
+只从已发布的排序中取第一个，候选池尚未打分时按随机顺序出题，不会等待。
+后台排序出错时打印原因，连续失败 MAX_FAILURES 次后停止排序，之后按随机顺序出题。
+
+可选的多样性采样（diversity > 0）：在最不确定的若干案例中贪心挑选，
+得分 = 不确定度 - diversity × 与最近已选案例的最大余弦相似度，避免连续出现相似案例。
+
+位置只在本次会话内有效：served[位置] 为第几个出题的案例，撤销时回到该位置。
+"""
+
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+import numpy as np
+
+from case_store import LabeledCases
+from hints import (
+    CaseAnalysis,
+    FeatureMatrix,
+    WeightVector,
+    extract_features_enhanced,
+    feature_set_version,
+    normalize_text,
+    predict_many,
+)
+from work_queue import WorkQueue
+
+# 候选池大小与每批提取特征的案例数（每批之后发布一次排序）
+POOL_SIZE = 1000
+BATCH_SIZE = 64
+# 累计在线更新达到该次数后重新提取候选池特征（TF-IDF 随文档频率变化）
+REFRESH_EVERY = 20
+# 多样性采样：参与贪心挑选的最不确定案例数、比较相似度的最近已选案例数
+DIVERSITY_CANDIDATES = 50
+DIVERSITY_RECENT = 10
+# 后台排序连续失败该次数后停止（标注继续按随机顺序出题）
+MAX_FAILURES = 5
+
+
+def _cosine(a: Dict[str, float], b: Dict[str, float]) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    dot = sum(x * b.get(k, 0.0) for k, x in a.items())
+    if dot == 0:
+        return 0.0
+    na = sum(x * x for x in a.values())
+    nb = sum(x * x for x in b.values())
+    return dot / (na * nb) ** 0.5
+
+
+def diversify(
+    candidates: List[int],
+    uncertainty: Dict[int, float],
+    features: Dict[int, Dict[str, float]],
+    recent: List[Dict[str, float]],
+    diversity: float,
+) -> List[int]:
+    """按 不确定度 - diversity × 最大相似度 贪心排序；已选案例计入后续比较"""
+    chosen: List[int] = []
+    remaining = list(candidates)
+    # 每个候选与已选集合（含最近出题的案例）的最大相似度，增量维护
+    max_sim = {
+        c: max((_cosine(features[c], r) for r in recent), default=0.0)
+        for c in remaining
+    }
+    while remaining:
+        best = max(remaining, key=lambda c: uncertainty[c] - diversity * max_sim[c])
+        remaining.remove(best)
+        chosen.append(best)
+        for c in remaining:
+            max_sim[c] = max(max_sim[c], _cosine(features[c], features[best]))
+    return chosen
+
+
+def _snapshot_model(model: Dict) -> Dict:
+    """复制打分所需的权重与偏置，后台线程打分时主线程可以继续更新模型"""
+    weights = model.get("weights", {})
+    if isinstance(weights, WeightVector):
+        weights = weights.copy()
+    else:
+        weights = WeightVector(dict(weights))
+    return {"weights": weights, "bias": model.get("bias", 0.0)}
+
+
+class _PoolEntry:
+    __slots__ = ("analysis", "features")
+
+    def __init__(self, analysis: CaseAnalysis, features: Dict[str, float]):
+        self.analysis = analysis
+        self.features = features
+
+
+class ActiveQueue:
+    """按模型不确定度出题的标注队列，接口与 WorkQueue 相同"""
+
+    def __init__(
+        self,
+        cases: LabeledCases,
+        model: Dict,
+        order: Optional[np.ndarray] = None,
+        pool_size: int = POOL_SIZE,
+        diversity: float = 0.0,
+    ):
+        self.cases = cases
+        self.model = model
+        self.pool_size = pool_size
+        self.diversity = diversity
+        # 候选池从该顺序（通常为随机顺序）中补充，排序尚未就绪时也按它出题
+        self._source = WorkQueue(cases, order)
+        self._source_position = 0
+
+        self.served: List[int] = []
+        self._served_position: Dict[int, int] = {}
+        self._recent: Deque[Dict[str, float]] = deque(maxlen=DIVERSITY_RECENT)
+
+        self._lock = threading.Lock()
+        self._ranking: List[int] = []
+        self._pool: Dict[int, _PoolEntry] = {}
+        self._changed = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, name="active-learning", daemon=True
+        )
+        self._thread.start()
+
+    def __len__(self) -> int:
+        return len(self.cases)
+
+    # ---------------- 标注循环使用的接口 ----------------
+
+    def case_at(self, position: int) -> int:
+        return self.served[position]
+
+    def position_of(self, case_index: int) -> int:
+        return self._served_position[case_index]
+
+    def next_pending(self, position: int) -> int:
+        """从 position 起第一个待标注的位置；走到末尾时取排序最靠前的案例出题"""
+        while position < len(self.served):
+            if not self.cases.is_annotated(self.served[position]):
+                return position
+            position += 1
+        case_index = self._pick()
+        if case_index is None:
+            return len(self)
+        self._served_position[case_index] = len(self.served)
+        self.served.append(case_index)
+        with self._lock:
+            entry = self._pool.pop(case_index, None)
+        if entry is not None:
+            self._recent.append(entry.features)
+        return position
+
+    def upcoming(self, position: int, count: int) -> List[int]:
+        """预计接下来出题的案例（供后台预取，排序变化时可能不准）"""
+        result = [
+            c for c in self.served[position + 1 :] if not self.cases.is_annotated(c)
+        ][:count]
+        with self._lock:
+            ranking = list(self._ranking)
+        for c in ranking:
+            if len(result) >= count:
+                break
+            if c not in self._served_position and not self.cases.is_annotated(c):
+                result.append(c)
+        return result
+
+    def refresh(self):
+        """模型更新（标注、撤销）后调用，通知后台重新排序"""
+        self._changed.set()
+
+    def close(self):
+        self._stop.set()
+        self._changed.set()
+        self._thread.join(timeout=2)
+
+    # ---------------- 出题 ----------------
+
+    def _available(self, case_index: int) -> bool:
+        return case_index not in self._served_position and not self.cases.is_annotated(
+            case_index
+        )
+
+    def _pick(self) -> Optional[int]:
+        with self._lock:
+            ranking = self._ranking
+            while ranking and not self._available(ranking[0]):
+                ranking.pop(0)
+            if ranking:
+                return ranking.pop(0)
+        # 排序尚未就绪（或候选池已取完）：按来源顺序取下一个未出过的案例
+        source = self._source
+        position = self._source_position
+        while True:
+            position = source.next_pending(position)
+            if position >= len(source):
+                return None
+            case_index = source.case_at(position)
+            position += 1
+            if case_index not in self._served_position:
+                self._source_position = position
+                return case_index
+
+    # ---------------- 后台打分 ----------------
+
+    def _featurize(self, analysis: CaseAnalysis) -> Dict[str, float]:
+        return extract_features_enhanced(self.model, None, analysis)
+
+    def _fill_pool(self) -> bool:
+        """补充一批候选；没有可补充的案例时返回 False"""
+        source = self._source
+        new: Dict[int, _PoolEntry] = {}
+        position = 0
+        with self._lock:
+            members = set(self._pool)
+        while len(members) + len(new) < self.pool_size and len(new) < BATCH_SIZE:
+            position = source.next_pending(position)
+            if position >= len(source):
+                break
+            case_index = source.case_at(position)
+            position += 1
+            if case_index in members or not self._available(case_index):
+                continue
+            # 不放入全局分析缓存，以免挤掉标注界面预取的案例
+            analysis = CaseAnalysis(normalize_text(self.cases.row(case_index)))
+            new[case_index] = _PoolEntry(analysis, self._featurize(analysis))
+        if not new:
+            return False
+        with self._lock:
+            self._pool.update(new)
+        return True
+
+    def _refeaturize(self):
+        with self._lock:
+            entries = list(self._pool.values())
+        for entry in entries:
+            if self._stop.is_set():
+                return
+            entry.features = self._featurize(entry.analysis)
+
+    def _rank(self):
+        with self._lock:
+            for c in [c for c in self._pool if not self._available(c)]:
+                del self._pool[c]
+            members = list(self._pool)
+            features = {c: self._pool[c].features for c in members}
+        if not members:
+            ranking: List[int] = []
+        else:
+            X = FeatureMatrix.from_feature_dicts(features[c] for c in members)
+            proba = predict_many(_snapshot_model(self.model), X)
+            closeness = np.abs(proba - 0.5)
+            idx = np.argsort(closeness, kind="stable")
+            ordered = [members[i] for i in idx]
+            ranking = ordered
+            if self.diversity > 0 and len(ordered) > 1:
+                head = ordered[:DIVERSITY_CANDIDATES]
+                uncertainty = {
+                    members[i]: 0.5 - float(closeness[i])
+                    for i in idx[:DIVERSITY_CANDIDATES]
+                }
+                head = diversify(
+                    head, uncertainty, features, list(self._recent), self.diversity
+                )
+                ranking = head + ordered[DIVERSITY_CANDIDATES:]
+        with self._lock:
+            self._ranking = ranking
+
+    def _run(self):
+        featurized_at = (feature_set_version(), self.model.get("n_updates", 0))
+        failures = 0
+        while not self._stop.is_set():
+            self._changed.clear()
+            try:
+                filled = self._fill_pool()
+                current = (feature_set_version(), self.model.get("n_updates", 0))
+                if current[0] != featurized_at[0] or (
+                    abs(current[1] - featurized_at[1]) >= REFRESH_EVERY
+                ):
+                    self._refeaturize()
+                    featurized_at = current
+                self._rank()
+            except RuntimeError:
+                # 主线程同时修改模型（TF-IDF 等字典）时遍历偶发“迭代中大小改变”，下一轮重试
+                failures += 1
+                filled = False
+            except Exception as e:
+                failures += 1
+                filled = False
+                if failures == 1:
+                    print(f"\n⚠️  主动学习排序出错: {e!r}")
+            else:
+                failures = 0
+            if failures >= MAX_FAILURES:
+                with self._lock:
+                    self._ranking = []
+                print(
+                    f"\n⚠️  主动学习排序连续失败 {failures} 次，已停止，改按随机顺序出题"
+                )
+                return
+            if filled:
+                continue
+            self._changed.wait(timeout=1.0)
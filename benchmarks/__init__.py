@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+"""
+智能提示引擎的性能基准。
+
+- corpus.py：可复现的合成事故报告语料生成器
+- run.py：按语料规模 × 模型规模计时各环节，输出 JSON（可与上一版本结果对比）
+
+用法（在项目根目录）：
+    python -m benchmarks.run -o bench.json
+    python -m benchmarks.run --baseline bench_v1.json -o bench_v2.json
+"""
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+"""
+合成事故调查报告语料：按固定随机种子生成，结果完全可复现。
+
+每篇报告按真实报告的结构组织（基本情况 / 事故发生经过 / 事故原因 / 处理建议），
+正文由通用公文词汇与某一行业（船舶/交通/矿山/化工/建筑）的关键词混合而成，
+并掺入少量其他行业的词作为干扰。行业词表取自 hints.BUILTIN_GROUPS
+（内置 FEATURE_GROUPS，不受外置种子配置影响，保证不同环境生成的语料一致）。
+"""
+
+import random
+from typing import Dict, List
+
+import pandas as pd
+
+from hints import BUILTIN_GROUPS
+
+DOMAINS = ["ship", "traffic", "mining", "chemical", "construction"]
+
+DOMAIN_TITLES = {
+    "ship": "船舶碰撞",
+    "traffic": "道路交通",
+    "mining": "煤矿顶板",
+    "chemical": "化工中毒",
+    "construction": "高处坠落",
+}
+
+REGIONS = ["江苏省", "浙江省", "广东省", "山东省", "四川省", "湖北省", "河南省"]
+CITIES = ["某市", "某县", "某区", "经济开发区", "高新区"]
+
+COMMON_WORDS = [
+    "公司",
+    "项目",
+    "负责人",
+    "安全检查",
+    "隐患排查",
+    "整改措施",
+    "监督管理",
+    "从业人员",
+    "操作规程",
+    "教育培训",
+    "责任制度",
+    "应急预案",
+    "现场管理",
+    "违章指挥",
+    "违规作业",
+    "设备设施",
+    "防护用品",
+    "技术交底",
+    "主要负责人",
+    "安全管理人员",
+    "属地监管",
+    "调查组",
+    "有关规定",
+    "经济损失",
+    "医院抢救",
+    "当场死亡",
+    "立即报告",
+    "组织救援",
+    "落实到位",
+    "未按要求",
+]
+
+CAUSE_PHRASES = [
+    "安全生产主体责任落实不到位",
+    "安全教育培训流于形式",
+    "现场安全管理混乱",
+    "未认真开展隐患排查治理",
+    "作业人员安全意识淡薄",
+    "监管部门履行职责不到位",
+]
+
+
+def _domain_words(domain: str) -> List[str]:
+    return list(BUILTIN_GROUPS.get(domain, []))
+
+
+def _sentence(rng: random.Random, domain: str, length: int) -> str:
+    own = _domain_words(domain)
+    other = _domain_words(rng.choice([d for d in DOMAINS if d != domain]))
+    words: List[str] = []
+    for _ in range(length):
+        x = rng.random()
+        if x < 0.6 or not own:
+            words.append(rng.choice(COMMON_WORDS))
+        elif x < 0.92:
+            words.append(rng.choice(own))
+        else:
+            words.append(rng.choice(other or COMMON_WORDS))
+    return "，".join(words) + "。"
+
+
+def _paragraph(rng: random.Random, domain: str, min_sent: int, max_sent: int) -> str:
+    return "".join(
+        _sentence(rng, domain, rng.randint(6, 14))
+        for _ in range(rng.randint(min_sent, max_sent))
+    )
+
+
+def generate_report(rng: random.Random, domain: str, index: int) -> Dict:
+    """生成一篇报告（与 data/raw 中 CSV 的列一致，另含 domain 与标签）"""
+    year = rng.randint(2015, 2024)
+    month = rng.randint(1, 12)
+    day = rng.randint(1, 28)
+    place = rng.choice(REGIONS) + rng.choice(CITIES)
+    title = f"{place}“{month}·{day}”{DOMAIN_TITLES[domain]}事故调查报告"
+    sections = [
+        title,
+        "一、基本情况",
+        _paragraph(rng, domain, 2, 6),
+        "二、事故发生经过",
+        f"{year}年{month}月{day}日{rng.randint(0, 23)}时{rng.randint(0, 59)}分许，"
+        + _paragraph(rng, domain, 3, 8),
+        "三、事故原因",
+        "（一）直接原因\n" + _paragraph(rng, domain, 1, 3),
+        "（二）间接原因\n" + "；".join(rng.sample(CAUSE_PHRASES, 3)) + "。",
+        "四、责任认定及处理建议",
+        _paragraph(rng, domain, 2, 5),
+    ]
+    return {
+        "title": title,
+        "publish_date": f"{year}-{month:02d}-{day:02d}",
+        "category": "事故调查报告",
+        "url": f"https://example.com/reports/{index}",
+        "full_text": "\n".join(sections),
+        "domain": domain,
+        "is_construction": 1 if domain == "construction" else 0,
+    }
+
+
+def generate_corpus(n: int, seed: int = 2025) -> pd.DataFrame:
+    """生成 n 篇报告；建筑业约占四成，其余行业平均分配"""
+    rng = random.Random(seed)
+    weights = [0.15, 0.15, 0.15, 0.15, 0.4]
+    rows = [generate_report(rng, rng.choices(DOMAINS, weights)[0], i) for i in range(n)]
+    return pd.DataFrame(rows)
+
+
+def synthetic_tokens(n: int, seed: int = 2025) -> List[str]:
+    """生成 n 个互不相同的 2~4 字中文 token（用于构造大规模 token 统计）"""
+    rng = random.Random(seed)
+    seen = set()
+    tokens: List[str] = []
+    while len(tokens) < n:
+        tok = "".join(
+            chr(0x4E00 + rng.randint(0, 6000)) for _ in range(rng.randint(2, 4))
+        )
+        if tok not in seen:
+            seen.add(tok)
+            tokens.append(tok)
+    return tokens
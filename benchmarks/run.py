@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+"""
+智能提示引擎基准：在不同语料规模 × 模型规模（token 统计条目数）下计时各环节，
+结果写成 JSON，便于版本之间对比回归。
+
+用法（在项目根目录）：
+    python -m benchmarks.run
+    python -m benchmarks.run --corpus-sizes 200 1000 --model-tokens 0 20000 200000 -o bench.json
+    python -m benchmarks.run --baseline bench_old.json -o bench_new.json
+
+计时项：
+- 与模型无关（每个语料规模一次）：_tokenize_for_learning、extract_features（冷缓存）、
+  locate_key_excerpt（不走缓存）、utils.display_case（清屏替换为空操作，输出重定向到内存）
+- 与模型有关：按标注会话的顺序逐条执行 extract_features_enhanced →
+  update_model_online_enhanced → update_token_stats → maybe_expand_features；
+  另外重复计时 _rebuild_automaton、save_hint_model_enhanced、load_hint_model_enhanced
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+# 允许从项目根导入
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import pandas as pd
+
+import hints
+import utils
+from benchmarks.corpus import generate_corpus, synthetic_tokens
+from excerpt import locate_key_excerpt
+
+# 对比基线时，p50 变化超过该比例视为变快/变慢
+DEFAULT_THRESHOLD = 0.2
+
+
+def _summary(times_ms: List[float]) -> Dict:
+    arr = np.asarray(times_ms, dtype=np.float64)
+    return {
+        "calls": int(arr.size),
+        "mean_ms": round(float(arr.mean()), 4),
+        "p50_ms": round(float(np.percentile(arr, 50)), 4),
+        "p95_ms": round(float(np.percentile(arr, 95)), 4),
+        "max_ms": round(float(arr.max()), 4),
+        "total_s": round(float(arr.sum()) / 1000, 4),
+    }
+
+
+def _timed(fn: Callable, *args) -> Tuple[float, object]:
+    t0 = time.perf_counter()
+    result = fn(*args)
+    return (time.perf_counter() - t0) * 1000, result
+
+
+def _repeat(fn: Callable, repeat: int) -> List[float]:
+    return [_timed(fn)[0] for _ in range(repeat)]
+
+
+def build_model(n_tokens: int, base_path: str, seed: int) -> Tuple[Dict, List[str]]:
+    """构造含 n_tokens 条 token 统计的模型（约 1% 的 token 已学习为特征）"""
+    model = hints.load_hint_model_enhanced(base_path)
+    rng = random.Random(seed)
+    tokens = synthetic_tokens(n_tokens, seed)
+    stats = model["token_stats"]
+    tfidf = model["tfidf"]
+    for tok in tokens:
+        pos, neg = rng.randint(0, 8), rng.randint(0, 8)
+        stats[tok] = {"pos": pos, "neg": neg}
+        tfidf.term_doc_freq[tok] = max(1, pos + neg)
+        if len(tfidf.vocabulary) < tfidf.max_features:
+            tfidf.vocabulary[tok] = len(tfidf.vocabulary)
+    tfidf.doc_count = max(1, n_tokens // 20)
+    model["n_updates"] = n_tokens // 20
+    learned = tokens[: n_tokens // 100]
+    for tok in learned:
+        model["weights"][tok] = rng.uniform(-3.0, 3.0)
+    return model, learned
+
+
+def bench_corpus(rows: List[pd.Series]) -> Dict[str, List[float]]:
+    """与模型无关的环节"""
+    texts = [hints.normalize_text(row) for row in rows]
+    tokenize = [_timed(hints._tokenize_for_learning, t)[0] for t in texts]
+
+    hints.clear_analysis_cache()
+    extract = [_timed(hints.extract_features, row)[0] for row in rows]
+
+    locate = [
+        _timed(locate_key_excerpt.__wrapped__, str(row["full_text"]))[0] for row in rows
+    ]
+
+    display: List[float] = []
+    clear_screen = utils.clear_screen
+    utils.clear_screen = lambda: None
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            for i, row in enumerate(rows):
+                display.append(_timed(utils.display_case, row, i, len(rows))[0])
+    finally:
+        utils.clear_screen = clear_screen
+    return {
+        "_tokenize_for_learning": tokenize,
+        "extract_features": extract,
+        "locate_key_excerpt": locate,
+        "display_case": display,
+    }
+
+
+def bench_model(
+    rows: List[pd.Series], n_tokens: int, repeat: int, seed: int
+) -> Dict[str, List[float]]:
+    """与模型有关的环节（模拟一次完整标注会话）"""
+    timings: Dict[str, List[float]] = {
+        "extract_features_enhanced": [],
+        "update_model_online_enhanced": [],
+        "update_token_stats": [],
+        "maybe_expand_features": [],
+    }
+    saved_learned = list(hints.FEATURE_GROUPS.get("_learned", []))
+    with tempfile.TemporaryDirectory() as tmp:
+        base = os.path.join(tmp, "bench")
+        model, learned = build_model(n_tokens, base, seed)
+        hints.FEATURE_GROUPS["_learned"] = sorted(learned)
+        try:
+            timings["_rebuild_automaton"] = _repeat(hints._rebuild_automaton, repeat)
+
+            # 分词与关键词匹配预先算好，会话各环节只计模型本身的开销
+            analyses = [
+                hints.CaseAnalysis(hints.normalize_text(row)).warm() for row in rows
+            ]
+            for row, analysis in zip(rows, analyses):
+                label = 0 if row["is_construction"] == 1 else 1
+                ms, feats = _timed(
+                    hints.extract_features_enhanced, model, row, analysis
+                )
+                timings["extract_features_enhanced"].append(ms)
+                ms, _ = _timed(
+                    hints.update_model_online_enhanced,
+                    model,
+                    row,
+                    feats,
+                    label,
+                    analysis,
+                )
+                timings["update_model_online_enhanced"].append(ms)
+                ms, _ = _timed(hints.update_token_stats, model, row, label, analysis)
+                timings["update_token_stats"].append(ms)
+                ms, _ = _timed(hints.maybe_expand_features, model)
+                timings["maybe_expand_features"].append(ms)
+
+            timings["save_hint_model_enhanced"] = _repeat(
+                lambda: hints.save_hint_model_enhanced(base, model), repeat
+            )
+            timings["load_hint_model_enhanced"] = _repeat(
+                lambda: hints.load_hint_model_enhanced(base), repeat
+            )
+        finally:
+            hints.FEATURE_GROUPS["_learned"] = saved_learned
+            hints._rebuild_automaton()
+    return timings
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            check=True,
+        )
+        return out.stdout.decode().strip()
+    except Exception:
+        return None
+
+
+def run(corpus_sizes: List[int], model_tokens: List[int], repeat: int, seed: int):
+    t0 = time.perf_counter()
+    tokenizer = hints._get_tokenizer()
+    tokenizer_init_s = time.perf_counter() - t0
+
+    results: List[Dict] = []
+    for size in corpus_sizes:
+        df = generate_corpus(size, seed)
+        rows = [df.iloc[i] for i in range(len(df))]
+        print(f"语料 {size} 篇：与模型无关的环节...", flush=True)
+        for name, times in bench_corpus(rows).items():
+            results.append(
+                dict(
+                    {"bench": name, "corpus_size": size, "model_tokens": None},
+                    **_summary(times),
+                )
+            )
+        for n_tokens in model_tokens:
+            print(f"语料 {size} 篇 × 模型 {n_tokens} token...", flush=True)
+            for name, times in bench_model(rows, n_tokens, repeat, seed).items():
+                results.append(
+                    dict(
+                        {"bench": name, "corpus_size": size, "model_tokens": n_tokens},
+                        **_summary(times),
+                    )
+                )
+
+    meta = {
+        "timestamp": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "jieba": getattr(tokenizer, "__version__", None),
+        "tokenizer_init_s": round(tokenizer_init_s, 4),
+        "seed": seed,
+        "repeat": repeat,
+    }
+    return {"meta": meta, "results": results}
+
+
+def _key(r: Dict) -> Tuple:
+    return (r["bench"], r["corpus_size"], r["model_tokens"])
+
+
+def print_results(report: Dict, baseline: Optional[Dict], threshold: float):
+    old = {_key(r): r for r in baseline["results"]} if baseline else {}
+    print(
+        f"\n{'环节':<30} {'语料':>6} {'模型token':>10} {'p50ms':>10} "
+        f"{'p95ms':>10} {'合计s':>9}" + ("  对比基线" if baseline else "")
+    )
+    for r in report["results"]:
+        line = (
+            f"{r['bench']:<30} {r['corpus_size']:>6} {str(r['model_tokens']):>10} "
+            f"{r['p50_ms']:>10} {r['p95_ms']:>10} {r['total_s']:>9}"
+        )
+        prev = old.get(_key(r))
+        if prev and prev["p50_ms"] > 0:
+            ratio = r["p50_ms"] / prev["p50_ms"]
+            mark = ""
+            if ratio > 1 + threshold:
+                mark = "  ⚠️ 变慢"
+            elif ratio < 1 - threshold:
+                mark = "  ✓ 变快"
+            line += f"  x{ratio:.2f}{mark}"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="智能提示引擎性能基准")
+    parser.add_argument("--corpus-sizes", type=int, nargs="+", default=[200, 1000])
+    parser.add_argument(
+        "--model-tokens", type=int, nargs="+", default=[0, 20000, 200000]
+    )
+    parser.add_argument("--repeat", type=int, default=5, help="整体操作的重复次数")
+    parser.add_argument("--seed", type=int, default=2025)
+    parser.add_argument("-o", "--output", help="结果 JSON 文件")
+    parser.add_argument("--baseline", help="上一版本的结果 JSON，用于对比")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=DEFAULT_THRESHOLD,
+        help="p50 变化超过该比例时标记（默认 0.2）",
+    )
+    args = parser.parse_args()
+
+    report = run(args.corpus_sizes, args.model_tokens, args.repeat, args.seed)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+    print_results(report, baseline, args.threshold)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
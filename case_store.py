@@ -0,0 +1,499 @@
+# -*- coding: utf-8 -*-
+"""
+案例库：把原始 CSV 按块流式转换为带索引的压缩 Parquet（data/store/<文件名>.parquet）。
+
+- zstd 压缩；分类、来源、日期等元数据列用字典编码
+- 行组较小（默认 1024 行），按行号读取时只解压所在行组
+- case_id：稳定的案例编号。首次导入时为原始文件中的行号；重新导入（原始文件有更新）时，
+  正文未变的案例沿用原编号，新增案例编号接在最大编号之后
+- content_hash：正文的 blake2b 摘要（16 位十六进制），用于识别重复与改动
+- 同时写入关键段落区间列（excerpt.locate_many），显示案例时直接切片
+
+标注时通过 LabeledCases 访问：案例行用 CaseReader 按需读取（内存映射，只解压用到的行组），
+标注结果只在内存中保存为 int8 数组，常驻内存不随语料规模增长。
+
+原始文件的大小和修改时间记录在 Parquet 元数据中，原始文件变化后自动重新导入。
+
+用法：
+    python case_store.py ingest data/raw/accident_cases.csv
+    python case_store.py info data/store/accident_cases.parquet
+"""
+
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from pathlib import Path
+from typing import Deque, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from excerpt import SPAN_COLUMNS, locate_many
+
+STORE_DIR = Path("data/store")
+STORE_FORMAT_VERSION = 1
+_METADATA_KEY = b"case_store"
+
+ROW_GROUP_SIZE = 1024
+CHUNK_SIZE = 20000
+
+# 长文本列不做字典编码，其余字符串列（分类、来源、日期等）重复值多，字典编码
+TEXT_COLUMNS = {"full_text", "title", "url", "content_hash"}
+# 原始文件中可能已有的标注列，按数值读取
+LABEL_COLUMN = "is_construction"
+NUMERIC_COLUMNS = {LABEL_COLUMN}
+
+# 标注值在内存中用 int8 保存：0/1 为标注结果，另有两个哨兵值
+LABEL_SKIP = -1
+LABEL_NA = -128
+
+
+def store_path_for(csv_path: Path) -> Path:
+    return STORE_DIR / f"{Path(csv_path).stem}.parquet"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _source_info(csv_path: Path) -> Dict:
+    st = os.stat(csv_path)
+    return {"source": Path(csv_path).name, "size": st.st_size, "mtime": st.st_mtime}
+
+
+def read_store_metadata(store_path: Path) -> Optional[Dict]:
+    try:
+        meta = pq.read_metadata(store_path).metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return None
+    raw = meta.get(_METADATA_KEY)
+    return json.loads(raw) if raw else None
+
+
+def is_store_current(csv_path: Path, store_path: Path) -> bool:
+    """案例库存在且由当前版本的原始文件生成"""
+    meta = read_store_metadata(store_path)
+    if meta is None or meta.get("format_version") != STORE_FORMAT_VERSION:
+        return False
+    source = _source_info(csv_path)
+    return all(meta.get(k) == source[k] for k in ("source", "size", "mtime"))
+
+
+def _previous_ids(store_path: Path) -> Dict[str, Deque[int]]:
+    """旧案例库中 content_hash -> case_id（同一正文出现多次时按顺序依次沿用）"""
+    ids: Dict[str, Deque[int]] = defaultdict(deque)
+    if read_store_metadata(store_path) is None:
+        return ids
+    table = pq.read_table(store_path, columns=["case_id", "content_hash"])
+    for case_id, digest in zip(
+        table.column("case_id").to_pylist(), table.column("content_hash").to_pylist()
+    ):
+        ids[digest].append(case_id)
+    return ids
+
+
+def _iter_csv(csv_path: Path, chunk_size: int) -> Iterable[pd.DataFrame]:
+    # 全部按字符串读取，避免各块类型推断不一致（如某块某列全为空）
+    return pd.read_csv(
+        csv_path,
+        encoding="utf-8-sig",
+        dtype=str,
+        keep_default_na=False,
+        na_values=[""],
+        chunksize=chunk_size,
+    )
+
+
+def _schema_for(chunk: pd.DataFrame) -> pa.Schema:
+    """按列名确定类型（不依赖单个块的类型推断）"""
+    fields = []
+    for name in chunk.columns:
+        if name == "case_id":
+            fields.append(pa.field(name, pa.int64(), nullable=False))
+        elif name in NUMERIC_COLUMNS:
+            fields.append(pa.field(name, pa.float64()))
+        elif name in ("excerpt_start", "excerpt_end"):
+            fields.append(pa.field(name, pa.int32()))
+        else:
+            fields.append(pa.field(name, pa.string()))
+    return pa.schema(fields)
+
+
+def _prepare_chunk(
+    chunk: pd.DataFrame,
+    first_row: int,
+    previous: Dict[str, Deque[int]],
+    next_id: int,
+) -> Tuple[pd.DataFrame, int]:
+    if "full_text" not in chunk.columns:
+        raise ValueError("CSV文件中缺少必需的 'full_text' 列")
+    chunk = chunk.drop(
+        columns=[c for c in ["case_id", "content_hash"] + SPAN_COLUMNS if c in chunk]
+    )
+    for col in NUMERIC_COLUMNS & set(chunk.columns):
+        chunk[col] = pd.to_numeric(chunk[col], errors="coerce")
+
+    texts = chunk["full_text"].fillna("")
+    hashes = [content_hash(t) for t in texts]
+    case_ids: List[int] = []
+    for i, digest in enumerate(hashes):
+        reused = previous.get(digest)
+        if reused:
+            case_ids.append(reused.popleft())
+        elif previous:
+            case_ids.append(next_id)
+            next_id += 1
+        else:
+            case_ids.append(first_row + i)
+    chunk.insert(0, "case_id", pd.array(case_ids, dtype="int64"))
+    chunk["content_hash"] = hashes
+    spans = locate_many(texts)
+    spans.index = chunk.index
+    return pd.concat([chunk, spans], axis=1), next_id
+
+
+def ingest_csv(
+    csv_path: Path,
+    store_path: Optional[Path] = None,
+    chunk_size: int = CHUNK_SIZE,
+    row_group_size: int = ROW_GROUP_SIZE,
+) -> Path:
+    """流式导入原始 CSV，返回案例库路径（先写临时文件再替换）"""
+    csv_path = Path(csv_path)
+    store_path = Path(store_path) if store_path else store_path_for(csv_path)
+    store_path.parent.mkdir(parents=True, exist_ok=True)
+
+    previous = _previous_ids(store_path)
+    next_id = max((max(ids) for ids in previous.values()), default=-1) + 1
+
+    tmp = store_path.with_name(store_path.name + ".tmp")
+    writer = None
+    schema = None
+    rows = 0
+    try:
+        for chunk in _iter_csv(csv_path, chunk_size):
+            chunk, next_id = _prepare_chunk(chunk, rows, previous, next_id)
+            rows += len(chunk)
+            if schema is None:
+                schema = _schema_for(chunk)
+                dictionary = [
+                    f.name
+                    for f in schema
+                    if pa.types.is_string(f.type) and f.name not in TEXT_COLUMNS
+                ]
+                writer = pq.ParquetWriter(
+                    tmp,
+                    schema,
+                    compression="zstd",
+                    use_dictionary=dictionary,
+                    write_statistics=["case_id"],
+                )
+            table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=False)
+            writer.write_table(table, row_group_size=row_group_size)
+        if writer is None:
+            raise ValueError(f"原始文件为空: {csv_path}")
+        meta = dict(_source_info(csv_path))
+        meta.update(format_version=STORE_FORMAT_VERSION, rows=rows)
+        writer.add_key_value_metadata({_METADATA_KEY: json.dumps(meta)})
+        writer.close()
+        writer = None
+        os.replace(tmp, store_path)
+    finally:
+        if writer is not None:
+            writer.close()
+        if tmp.exists():
+            tmp.unlink()
+    return store_path
+
+
+def ensure_store(csv_path: Path, quiet: bool = False) -> Path:
+    """返回原始文件对应的案例库，不存在或已过期时先导入"""
+    store_path = store_path_for(csv_path)
+    if not is_store_current(csv_path, store_path):
+        if not quiet:
+            print(f"正在将 {Path(csv_path).name} 导入案例库 {store_path}...")
+        t0 = time.perf_counter()
+        ingest_csv(csv_path, store_path)
+        if not quiet:
+            print(f"导入完成（{time.perf_counter() - t0:.1f} 秒）")
+    return store_path
+
+
+def load_cases(path: Path, quiet: bool = False) -> pd.DataFrame:
+    """读取案例：CSV 先转换为案例库再读取，Parquet 直接读取"""
+    path = Path(path)
+    if path.suffix != ".parquet":
+        path = ensure_store(path, quiet=quiet)
+    return pd.read_parquet(path)
+
+
+class CaseReader:
+    """按需读取案例行：Parquet 以内存映射打开，只解压被访问的行组（保留最近几个），
+    内存占用与语料规模无关。标注列不在行中返回，由 LabeledCases 单独保存"""
+
+    def __init__(self, path: Path, cache_groups: int = 4):
+        self.path = Path(path)
+        self._cache_groups = cache_groups
+        self._lock = threading.Lock()
+        self._open()
+
+    def _open(self):
+        self._pf = pq.ParquetFile(self.path, memory_map=True)
+        meta = self._pf.metadata
+        bounds = [0]
+        for i in range(meta.num_row_groups):
+            bounds.append(bounds[-1] + meta.row_group(i).num_rows)
+        self._bounds = bounds
+        self.schema = self._pf.schema_arrow
+        self.columns = [n for n in self.schema.names if n != LABEL_COLUMN]
+        self._groups: "OrderedDict[int, pa.Table]" = OrderedDict()
+
+    def __len__(self) -> int:
+        return self._bounds[-1]
+
+    def _group(self, group: int) -> pa.Table:
+        with self._lock:
+            table = self._groups.get(group)
+            if table is None:
+                table = self._pf.read_row_group(group, columns=self.columns)
+                self._groups[group] = table
+                while len(self._groups) > self._cache_groups:
+                    self._groups.popitem(last=False)
+            else:
+                self._groups.move_to_end(group)
+            return table
+
+    def row(self, index: int) -> pd.Series:
+        """第 index 行（与 df.iloc[index] 用法一致）"""
+        if not 0 <= index < len(self):
+            raise IndexError(f"行号超出范围: {index}")
+        group = bisect.bisect_right(self._bounds, index) - 1
+        table = self._group(group)
+        offset = index - self._bounds[group]
+        values = {name: table.column(name)[offset].as_py() for name in self.columns}
+        return pd.Series(values, name=index, dtype=object)
+
+    def read_column(self, name: str) -> pa.ChunkedArray:
+        """整列读取（只解压这一列）"""
+        with self._lock:
+            return self._pf.read(columns=[name]).column(0)
+
+    def iter_batches(self) -> Iterator[pa.Table]:
+        """按行组依次读取（不含标注列），用于流式写出"""
+        for group in range(len(self._bounds) - 1):
+            with self._lock:
+                table = self._pf.read_row_group(group, columns=self.columns)
+            yield table
+
+    def close(self):
+        with self._lock:
+            self._groups.clear()
+            self._pf = None
+
+    def reopen(self):
+        with self._lock:
+            self._open()
+
+
+class FrameReader:
+    """内存中 DataFrame 的 CaseReader 等价物（用于只有 CSV 快照的旧标注文件）"""
+
+    def __init__(self, df: pd.DataFrame, batch_size: int = ROW_GROUP_SIZE):
+        self.path = None
+        self.df = df.drop(columns=[LABEL_COLUMN], errors="ignore").reset_index(
+            drop=True
+        )
+        self.columns = list(self.df.columns)
+        self.schema = pa.Schema.from_pandas(self.df, preserve_index=False)
+        self._batch_size = batch_size
+
+    def __len__(self) -> int:
+        return len(self.df)
+
+    def row(self, index: int) -> pd.Series:
+        return self.df.iloc[index]
+
+    def iter_batches(self) -> Iterator[pa.Table]:
+        for start in range(0, len(self.df), self._batch_size):
+            chunk = self.df.iloc[start : start + self._batch_size]
+            yield pa.Table.from_pandas(chunk, schema=self.schema, preserve_index=False)
+
+    def close(self):
+        pass
+
+
+def encode_labels(values) -> np.ndarray:
+    """is_construction 列 -> int8 数组（缺失为 LABEL_NA）"""
+    numeric = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(
+        dtype=np.float64, na_value=np.nan
+    )
+    labels = np.full(len(numeric), LABEL_NA, dtype=np.int8)
+    mask = ~np.isnan(numeric)
+    labels[mask] = numeric[mask].astype(np.int8)
+    return labels
+
+
+def decode_labels(labels: np.ndarray) -> pa.Array:
+    """int8 数组 -> 可空的 int8 Arrow 数组（LABEL_NA 为空值）"""
+    return pa.array(labels, type=pa.int8(), mask=labels == LABEL_NA)
+
+
+class LabeledCases:
+    """标注会话中的案例：行按需从 reader 读取，标注结果只保存为 int8 数组。
+
+    标注值：1 建筑业，0 非建筑业，LABEL_SKIP(-1) 跳过，LABEL_NA(-128) 未标注
+    """
+
+    def __init__(self, reader, labels: Optional[np.ndarray] = None):
+        self.reader = reader
+        if labels is None:
+            labels = np.full(len(reader), LABEL_NA, dtype=np.int8)
+        if len(labels) != len(reader):
+            raise ValueError("标注数组长度与案例数不一致")
+        self.labels = labels
+
+    @classmethod
+    def open(cls, path: Path) -> "LabeledCases":
+        """打开 Parquet（案例库或标注快照），已有标注列时读入标注"""
+        reader = CaseReader(path)
+        labels = None
+        if LABEL_COLUMN in reader.schema.names:
+            labels = encode_labels(reader.read_column(LABEL_COLUMN).to_pandas())
+        return cls(reader, labels)
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "LabeledCases":
+        labels = encode_labels(df[LABEL_COLUMN]) if LABEL_COLUMN in df else None
+        return cls(FrameReader(df), labels)
+
+    def __len__(self) -> int:
+        return len(self.labels)
+
+    @property
+    def columns(self) -> List[str]:
+        return self.reader.columns
+
+    def row(self, index: int) -> pd.Series:
+        return self.reader.row(index)
+
+    def label(self, index: int) -> Optional[int]:
+        value = int(self.labels[index])
+        return None if value == LABEL_NA else value
+
+    def set_label(self, index: int, value: Optional[int]):
+        self.labels[index] = LABEL_NA if value is None else value
+
+    def is_annotated(self, index: int) -> bool:
+        """已给出 0/1 标注（跳过不算）"""
+        return self.labels[index] >= 0
+
+    def is_skipped(self, index: int) -> bool:
+        return self.labels[index] == LABEL_SKIP
+
+    def counts(self) -> Dict[str, int]:
+        bins = np.bincount(self.labels.astype(np.int16) + 128, minlength=256)
+        return {
+            "total": len(self.labels),
+            "construction": int(bins[128 + 1]),
+            "non_construction": int(bins[128 + 0]),
+            "skipped": int(bins[128 + LABEL_SKIP]),
+            "unlabeled": int(bins[128 + LABEL_NA]),
+        }
+
+    def save(self, parquet_path: Path, csv_path: Path):
+        """逐个行组写出带标注列的 Parquet 与 CSV（先写临时文件再替换）"""
+        parquet_path = Path(parquet_path)
+        csv_path = Path(csv_path)
+        tmp_parquet = parquet_path.with_name(parquet_path.name + ".tmp")
+        tmp_csv = csv_path.with_name(csv_path.name + ".tmp")
+        writer = None
+        start = 0
+        try:
+            for table in self.reader.iter_batches():
+                n = table.num_rows
+                table = table.append_column(
+                    LABEL_COLUMN, decode_labels(self.labels[start : start + n])
+                )
+                if writer is None:
+                    writer = pq.ParquetWriter(
+                        tmp_parquet, table.schema, compression="zstd"
+                    )
+                writer.write_table(table, row_group_size=ROW_GROUP_SIZE)
+                table.to_pandas().to_csv(
+                    tmp_csv,
+                    mode="w" if start == 0 else "a",
+                    header=start == 0,
+                    index=False,
+                    encoding="utf-8-sig" if start == 0 else "utf-8",
+                )
+                start += n
+        finally:
+            if writer is not None:
+                writer.close()
+        # 正在读取的文件被替换时先关闭（Windows 上被映射的文件不能替换）
+        same_file = (
+            self.reader.path is not None
+            and parquet_path.exists()
+            and os.path.samefile(self.reader.path, parquet_path)
+        )
+        if same_file:
+            self.reader.close()
+        try:
+            os.replace(tmp_parquet, parquet_path)
+            os.replace(tmp_csv, csv_path)
+        finally:
+            if same_file:
+                self.reader.reopen()
+
+
+def read_rows(store_path: Path, rows: List[int]) -> pd.DataFrame:
+    """按行号读取若干案例，只解压涉及的行组"""
+    reader = CaseReader(store_path)
+    return pd.DataFrame([reader.row(r) for r in rows], index=rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="原始 CSV -> 压缩 Parquet 案例库")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_ingest = sub.add_parser("ingest", help="导入原始 CSV")
+    p_ingest.add_argument("csv", help="原始 CSV 文件")
+    p_ingest.add_argument(
+        "-o", "--output", help="案例库路径（默认 data/store/<文件名>.parquet）"
+    )
+    p_ingest.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    p_ingest.add_argument("--row-group-size", type=int, default=ROW_GROUP_SIZE)
+    p_info = sub.add_parser("info", help="查看案例库信息")
+    p_info.add_argument("store", help="案例库 Parquet 文件")
+    args = parser.parse_args()
+
+    if args.command == "ingest":
+        t0 = time.perf_counter()
+        store = ingest_csv(
+            Path(args.csv),
+            Path(args.output) if args.output else None,
+            chunk_size=args.chunk_size,
+            row_group_size=args.row_group_size,
+        )
+        size_mb = store.stat().st_size / (1024 * 1024)
+        print(
+            f"已导入: {args.csv} -> {store}（{size_mb:.1f} MB，"
+            f"{time.perf_counter() - t0:.1f} 秒）"
+        )
+    else:
+        pf = pq.ParquetFile(args.store)
+        meta = read_store_metadata(Path(args.store)) or {}
+        print(f"案例数:   {pf.metadata.num_rows}")
+        print(f"行组数:   {pf.metadata.num_row_groups}")
+        print(f"原始文件: {meta.get('source')}（{meta.get('size')} 字节）")
+        print(f"列:       {', '.join(pf.schema_arrow.names)}")
+
+
+if __name__ == "__main__":
+    main()
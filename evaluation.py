@@ -0,0 +1,701 @@
+# -*- coding: utf-8 -*-
+"""
+离线评估引擎：带标签数据集只预处理一次，训练与打分不再重复分词，指标用 NumPy 计算。
+
+- prepare_cases：多进程分词、匹配关键词，结果编码为整数 id 的稀疏数组
+  （每个案例的去重 token 及词频、命中的关键词）
+- train_online：按给定顺序逐条在线更新模型，更新规则与标注时完全相同，只是特征取自预处理结果；
+  expand=True 时同样更新 token 统计并扩展学习特征（需预处理时给出 candidate_min_count）
+- feature_matrix / score_cases：模型冻结后向量化计算 TF-IDF，构造稀疏特征矩阵，predict_many 一次打分
+- train_batch：由已有标注一次性重建模型（token 统计、TF-IDF 文档频率、学习特征向量化累计，
+  权重用小批量 SGD 拟合，目标与逐条在线更新相同）
+- roc_auc / pr_curve / threshold_metrics：排序 + 累加得到 ROC AUC、PR 曲线与各阈值下的指标
+
+种子关键词的命中只取决于种子配置，子进程与主进程一致。学习特征是 token_stats 中的 token，
+总频次至少为 MIN_COUNT，所以只需为语料中出现次数达到该值的 token 预先匹配一次子串命中
+（与 KeywordMatcher 的匹配规则相同），训练中扩展出的特征直接从中取命中。
+"""
+
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from math import log, sqrt
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from hints import (
+    DEFAULT_BIAS,
+    L2_LAMBDA,
+    CaseAnalysis,
+    FeatureMatrix,
+    HintEngine,
+    KeywordMatcher,
+    OnlineTFIDF,
+    _sigmoid_array,
+    default_engine,
+    normalize_text,
+    predict_many,
+    update_model_online,
+)
+
+# normalize_text 用到的列，其余列不发送给子进程
+TEXT_COLUMNS = ["title", "category", "publish_date", "date", "full_text"]
+# 每个子任务的案例数
+CHUNK_SIZE = 500
+DEFAULT_THRESHOLDS = (0.3, 0.5, 0.7)
+
+
+def load_labeled(path) -> Tuple[pd.DataFrame, np.ndarray]:
+    """读取带标签的标注文件（CSV/Parquet），只保留有正文且标为 0/1 的案例。
+
+    返回 (案例, 标签)，标签为 1 表示非建筑业（与智能提示模型的输出一致）。
+    """
+    path = Path(path)
+    if path.suffix == ".parquet":
+        df = pd.read_parquet(path)
+    else:
+        df = pd.read_csv(path)
+    df = df[df["full_text"].notna()]
+    df = df[df["is_construction"].isin([0, 1])]
+    y = (df["is_construction"].to_numpy() == 0).astype(np.int8)
+    return df, y
+
+
+# ---------------- 预处理 ----------------
+
+
+def _analyze_chunk(chunk: pd.DataFrame):
+    """在子进程中分词并匹配关键词，token 与关键词按块内编号返回"""
+    vocab: Dict[str, int] = {}
+    keywords: Dict[str, int] = {}
+    token_ids: List[int] = []
+    token_counts: List[int] = []
+    token_indptr = [0]
+    totals: List[int] = []
+    hit_ids: List[int] = []
+    hit_indptr = [0]
+    for _, row in chunk.iterrows():
+        analysis = CaseAnalysis(normalize_text(row))
+        tokens = analysis.tokens
+        # Counter 按首次出现的顺序保存，与 OnlineTFIDF.transform_one 的词频顺序一致
+        for tok, count in Counter(tokens).items():
+            token_ids.append(vocab.setdefault(tok, len(vocab)))
+            token_counts.append(count)
+        token_indptr.append(len(token_ids))
+        totals.append(len(tokens))
+        for kw in analysis.keyword_hits:
+            hit_ids.append(keywords.setdefault(kw, len(keywords)))
+        hit_indptr.append(len(hit_ids))
+    return (
+        list(vocab),
+        np.asarray(token_ids, dtype=np.int32),
+        np.asarray(token_counts, dtype=np.int32),
+        np.asarray(token_indptr, dtype=np.int64),
+        np.asarray(totals, dtype=np.int32),
+        list(keywords),
+        np.asarray(hit_ids, dtype=np.int32),
+        np.asarray(hit_indptr, dtype=np.int64),
+    )
+
+
+# 子进程内的候选 token 匹配器（由 _init_candidate_worker 构建）
+_CANDIDATES: Optional[KeywordMatcher] = None
+_CANDIDATE_INDEX: Dict[str, int] = {}
+
+
+def _init_candidate_worker(candidates: List[str]):
+    global _CANDIDATES, _CANDIDATE_INDEX
+    _CANDIDATES = KeywordMatcher()
+    _CANDIDATES.rebuild(candidates, [])
+    _CANDIDATE_INDEX = {tok: i for i, tok in enumerate(candidates)}
+
+
+def _match_candidates(chunk: pd.DataFrame) -> Tuple[np.ndarray, np.ndarray]:
+    """在子进程中匹配候选 token 的子串命中，返回 (候选编号, indptr)"""
+    ids: List[int] = []
+    indptr = [0]
+    for _, row in chunk.iterrows():
+        hits = _CANDIDATES.match(normalize_text(row))
+        ids.extend(sorted(_CANDIDATE_INDEX[tok] for tok in hits))
+        indptr.append(len(ids))
+    return np.asarray(ids, dtype=np.int32), np.asarray(indptr, dtype=np.int64)
+
+
+def _remap(names: List[str], index: Dict[str, int], ids: np.ndarray) -> np.ndarray:
+    """块内编号 -> 全局编号"""
+    table = np.fromiter(
+        (index.setdefault(name, len(index)) for name in names),
+        dtype=np.int32,
+        count=len(names),
+    )
+    return table[ids] if len(ids) else ids
+
+
+def _concat_indptr(parts: List[np.ndarray]) -> np.ndarray:
+    out = [np.zeros(1, dtype=np.int64)]
+    offset = 0
+    for indptr in parts:
+        out.append(indptr[1:] + offset)
+        offset += int(indptr[-1])
+    return np.concatenate(out)
+
+
+def _gather(indptr: np.ndarray, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """取出 rows 各行的元素：返回 (新 indptr, 元素在原数组中的位置)"""
+    starts = indptr[rows]
+    lengths = indptr[rows + 1] - starts
+    new_indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_indptr[1:])
+    positions = np.repeat(starts - new_indptr[:-1], lengths) + np.arange(
+        new_indptr[-1], dtype=np.int64
+    )
+    return new_indptr, positions
+
+
+class PreparedCases:
+    """预处理后的案例：token、关键词均为全局编号，按行用 indptr 切分（CSR）"""
+
+    def __init__(self, parts: Sequence[Tuple]):
+        self.token_index: Dict[str, int] = {}
+        self.keyword_index: Dict[str, int] = {}
+        token_ids, hit_ids = [], []
+        for vocab, ids, _, _, _, keywords, hits, _ in parts:
+            token_ids.append(_remap(vocab, self.token_index, ids))
+            hit_ids.append(_remap(keywords, self.keyword_index, hits))
+        self.tokens: List[str] = list(self.token_index)
+        self.keywords: List[str] = list(self.keyword_index)
+
+        def _cat(arrays, dtype):
+            return np.concatenate(arrays) if arrays else np.zeros(0, dtype=dtype)
+
+        self.token_ids = _cat(token_ids, np.int32)
+        self.token_counts = _cat([p[2] for p in parts], np.int32)
+        self.token_indptr = _concat_indptr([p[3] for p in parts])
+        self.token_totals = _cat([p[4] for p in parts], np.int32)
+        self.hit_ids = _cat(hit_ids, np.int32)
+        self.hit_indptr = _concat_indptr([p[7] for p in parts])
+        # 可能成为学习特征的 token 及其子串命中（prepare_cases 的 candidate_min_count）
+        self.candidates: List[str] = []
+        self.candidate_ids = np.zeros(0, dtype=np.int32)
+        self.candidate_indptr = np.zeros(len(self) + 1, dtype=np.int64)
+
+    def token_frequency(self) -> np.ndarray:
+        """各 token 在全部案例中的出现次数"""
+        return np.bincount(
+            self.token_ids, weights=self.token_counts, minlength=len(self.tokens)
+        ).astype(np.int64)
+
+    def set_candidates(self, candidates: List[str], parts: Sequence[Tuple]):
+        self.candidates = list(candidates)
+        if parts:
+            self.candidate_ids = np.concatenate([p[0] for p in parts])
+        self.candidate_indptr = _concat_indptr([p[1] for p in parts])
+
+    def __len__(self) -> int:
+        return len(self.token_totals)
+
+    def token_counts_of(self, i: int) -> Dict[str, int]:
+        s, e = self.token_indptr[i], self.token_indptr[i + 1]
+        tokens = self.tokens
+        return {
+            tokens[t]: c
+            for t, c in zip(
+                self.token_ids[s:e].tolist(), self.token_counts[s:e].tolist()
+            )
+        }
+
+    def keyword_hits_of(self, i: int) -> List[str]:
+        s, e = self.hit_indptr[i], self.hit_indptr[i + 1]
+        keywords = self.keywords
+        return [keywords[k] for k in self.hit_ids[s:e].tolist()]
+
+    def learned_hits_of(self, i: int, learned: Set[str]) -> List[str]:
+        """案例中出现的学习特征（learned 须为候选 token 的子集）"""
+        s, e = self.candidate_indptr[i], self.candidate_indptr[i + 1]
+        candidates = self.candidates
+        return [
+            tok
+            for tok in (candidates[c] for c in self.candidate_ids[s:e].tolist())
+            if tok in learned
+        ]
+
+
+def _chunks(df: pd.DataFrame, chunk_size: int) -> Iterable[pd.DataFrame]:
+    cols = [c for c in TEXT_COLUMNS if c in df.columns]
+    for start in range(0, len(df), chunk_size):
+        yield df.iloc[start : start + chunk_size][cols]
+
+
+def prepare_cases(
+    df: pd.DataFrame,
+    workers: Optional[int] = None,
+    chunk_size: int = CHUNK_SIZE,
+    candidate_min_count: Optional[int] = None,
+) -> PreparedCases:
+    """并行预处理 df 的每一行（顺序与 df 相同）；workers=1 时在本进程中完成。
+
+    candidate_min_count 不为空时再做一遍子串匹配：出现次数达到该值、且不是已命中关键词的
+    token 都作为可能的学习特征，记录每个案例中命中了哪些（训练时 expand=True 需要）。
+    """
+    workers = workers or os.cpu_count() or 1
+    serial = workers == 1 or len(df) <= chunk_size
+    if serial:
+        parts = [_analyze_chunk(chunk) for chunk in _chunks(df, chunk_size)]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(_analyze_chunk, _chunks(df, chunk_size)))
+    prepared = PreparedCases(parts)
+    if candidate_min_count is None:
+        return prepared
+
+    frequency = prepared.token_frequency()
+    candidates = [
+        tok
+        for tok in np.asarray(prepared.tokens, dtype=object)[
+            frequency >= candidate_min_count
+        ]
+        if tok not in prepared.keyword_index
+    ]
+    if serial:
+        _init_candidate_worker(candidates)
+        parts = [_match_candidates(chunk) for chunk in _chunks(df, chunk_size)]
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_candidate_worker,
+            initargs=(candidates,),
+        ) as pool:
+            parts = list(pool.map(_match_candidates, _chunks(df, chunk_size)))
+    prepared.set_candidates(candidates, parts)
+    return prepared
+
+
+# ---------------- 训练与打分 ----------------
+
+
+def keyword_features(prepared: PreparedCases, i: int) -> Dict[str, int]:
+    """与 extract_features 相同"""
+    return {k: 1 for k in prepared.keyword_hits_of(i)}
+
+
+def enhanced_features(
+    model: Dict, prepared: PreparedCases, i: int, learned: Optional[Set[str]] = None
+) -> Dict[str, float]:
+    """与 extract_features_enhanced 相同：关键词特征（含学习特征） + TF-IDF 特征"""
+    tfidf = model.get("tfidf")
+    if tfidf is None:
+        tfidf = model["tfidf"] = OnlineTFIDF(max_features=300)
+    feats = {k: 1.0 for k in prepared.keyword_hits_of(i)}
+    if learned:
+        for k in prepared.learned_hits_of(i, learned):
+            feats[k] = 1.0
+    feats.update(
+        tfidf.transform_counts(
+            prepared.token_counts_of(i), int(prepared.token_totals[i])
+        )
+    )
+    return feats
+
+
+def learn_document_frequency(model: Dict, prepared: PreparedCases, rows):
+    """无监督地为增强模型累积 TF-IDF 文档频率"""
+    tfidf = model.get("tfidf")
+    if tfidf is None:
+        tfidf = model["tfidf"] = OnlineTFIDF(max_features=300)
+    for i in rows:
+        tfidf.learn_one(list(prepared.token_counts_of(int(i))))
+
+
+def train_online(
+    model: Dict,
+    prepared: PreparedCases,
+    rows,
+    labels,
+    enhanced: bool = True,
+    expand: bool = False,
+    engine: Optional[HintEngine] = None,
+) -> List[str]:
+    """按 rows 的顺序逐条在线更新（labels 为 1 表示非建筑业），返回扩展出的学习特征。
+
+    expand=True 时每条依次执行 update_model_online_enhanced、update_token_stats、
+    maybe_expand_features（与标注时相同）。新特征登记在 engine 的特征分组中
+    （默认为模块级函数使用的默认引擎）；用独立的 HintEngine 训练时不影响其他模型。
+    """
+    engine = (engine or default_engine()).with_model(model)
+    learned: Set[str] = set()
+    added: List[str] = []
+    for i, y in zip(np.asarray(rows).tolist(), np.asarray(labels).tolist()):
+        if not enhanced:
+            update_model_online(model, keyword_features(prepared, i), int(y))
+            continue
+        feats = enhanced_features(model, prepared, i, learned)
+        counts = prepared.token_counts_of(i)
+        if expand:
+            # token 统计按出现次数累计，按首次出现的顺序还原分词结果
+            tokens = [tok for tok, c in counts.items() for _ in range(c)]
+        else:
+            # TF-IDF 只用到去重后的 token
+            tokens = list(counts)
+        analysis = CaseAnalysis("", tokens=tokens)
+        engine.update_online_enhanced(None, feats, int(y), analysis=analysis)
+        if expand:
+            engine.update_token_stats(None, int(y), analysis=analysis)
+            new = engine.maybe_expand_features()
+            learned.update(new)
+            added.extend(new)
+    return added
+
+
+def _tfidf_entries(model: Dict, prepared: PreparedCases, rows: np.ndarray):
+    """向量化的 TF-IDF：返回 (行号, 列号, 值, 列名)，与 OnlineTFIDF.transform_counts 相同"""
+    empty = (np.zeros(0, np.int64), np.zeros(0, np.int64), np.zeros(0), [])
+    tfidf = model.get("tfidf")
+    if tfidf is None or tfidf.doc_count == 0:
+        return empty
+    vocab = [t for t in tfidf.vocabulary if t in prepared.token_index]
+    if not vocab:
+        return empty
+    column = np.full(len(prepared.tokens), -1, dtype=np.int64)
+    column[[prepared.token_index[t] for t in vocab]] = np.arange(len(vocab))
+    idf = np.array(
+        [
+            log((tfidf.doc_count + 1) / (tfidf.term_doc_freq.get(t, 1) + 1))
+            for t in vocab
+        ]
+    )
+
+    indptr, positions = _gather(prepared.token_indptr, rows)
+    cols = column[prepared.token_ids[positions]]
+    row_ids = np.repeat(np.arange(len(rows)), np.diff(indptr))
+    keep = cols >= 0
+    cols, row_ids, positions = cols[keep], row_ids[keep], positions[keep]
+    totals = prepared.token_totals[rows].astype(np.float64)
+    values = prepared.token_counts[positions] / totals[row_ids] * idf[cols]
+    # L2 归一化
+    norms = np.sqrt(np.bincount(row_ids, weights=values * values, minlength=len(rows)))
+    scale = np.where(norms > 0, norms, 1.0)
+    values = values / scale[row_ids]
+    return row_ids, cols, values, [f"tfidf_{t}" for t in vocab]
+
+
+def _learned_entries(prepared: PreparedCases, rows: np.ndarray, learned: Iterable[str]):
+    """学习特征的命中：返回 (行号, 列号, 值, 列名)"""
+    names = [t for t in learned if t not in prepared.keyword_index]
+    column = np.full(len(prepared.candidates), -1, dtype=np.int64)
+    lookup = {tok: c for c, tok in enumerate(prepared.candidates)}
+    for j, tok in enumerate(names):
+        column[lookup[tok]] = j
+    indptr, positions = _gather(prepared.candidate_indptr, rows)
+    cols = column[prepared.candidate_ids[positions]]
+    row_ids = np.repeat(np.arange(len(rows)), np.diff(indptr))
+    keep = cols >= 0
+    return row_ids[keep], cols[keep], np.ones(int(keep.sum())), names
+
+
+def feature_matrix(
+    prepared: PreparedCases,
+    rows,
+    model: Optional[Dict] = None,
+    learned: Sequence[str] = (),
+) -> FeatureMatrix:
+    """rows 各案例的稀疏特征矩阵：关键词特征（含 learned 中的学习特征），
+    model 为增强模型时再附加 TF-IDF 特征"""
+    rows = np.asarray(rows, dtype=np.int64)
+    indptr, positions = _gather(prepared.hit_indptr, rows)
+    kw_cols = prepared.hit_ids[positions].astype(np.int64)
+    names = list(prepared.keywords)
+    if model is None and not learned:
+        return FeatureMatrix(names, indptr, kw_cols, np.ones(len(kw_cols)))
+
+    blocks = [
+        (
+            np.repeat(np.arange(len(rows)), np.diff(indptr)),
+            kw_cols,
+            np.ones(len(kw_cols)),
+            names,
+        )
+    ]
+    if learned:
+        blocks.append(_learned_entries(prepared, rows, learned))
+    if model is not None:
+        blocks.append(_tfidf_entries(model, prepared, rows))
+    row_parts, col_parts, data_parts, names = [], [], [], []
+    for block_rows, block_cols, block_data, block_names in blocks:
+        row_parts.append(block_rows)
+        col_parts.append(block_cols + len(names))
+        data_parts.append(block_data)
+        names = names + list(block_names)
+    row_ids = np.concatenate(row_parts)
+    order = np.argsort(row_ids, kind="stable")
+    indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(np.bincount(row_ids, minlength=len(rows)), out=indptr[1:])
+    return FeatureMatrix(
+        names,
+        indptr,
+        np.concatenate(col_parts)[order],
+        np.concatenate(data_parts)[order],
+    )
+
+
+def score_cases(
+    model: Dict,
+    prepared: PreparedCases,
+    rows,
+    enhanced: bool = True,
+    learned: Sequence[str] = (),
+) -> np.ndarray:
+    """冻结模型，批量计算 rows 各案例的非建筑业概率（learned 为训练中扩展出的学习特征）"""
+    X = feature_matrix(prepared, rows, model if enhanced else None, learned)
+    return predict_many(model, X)
+
+
+# ---------------- 批量训练 ----------------
+
+
+def _first_seen(ids: np.ndarray) -> np.ndarray:
+    """ids 中出现过的编号，按首次出现的顺序排列"""
+    unique, first = np.unique(ids, return_index=True)
+    return unique[np.argsort(first, kind="stable")]
+
+
+def batch_token_stats(prepared: PreparedCases, rows, labels) -> Dict[str, Dict]:
+    """rows 各案例按标签（1=非建筑业）累计的 token 统计。
+    与逐条 update_token_stats 的结果相同，token 也按首次出现的顺序插入"""
+    rows = np.asarray(rows, dtype=np.int64)
+    indptr, positions = _gather(prepared.token_indptr, rows)
+    ids = prepared.token_ids[positions]
+    counts = prepared.token_counts[positions].astype(np.int64)
+    is_pos = np.repeat(np.asarray(labels) == 1, np.diff(indptr))
+    n_tokens = len(prepared.tokens)
+    pos = np.bincount(ids, weights=counts * is_pos, minlength=n_tokens)
+    total = np.bincount(ids, weights=counts, minlength=n_tokens)
+    order = _first_seen(ids)
+    tokens = prepared.tokens
+    return {
+        tokens[t]: {"pos": p, "neg": n}
+        for t, p, n in zip(
+            order.tolist(),
+            pos[order].astype(np.int64).tolist(),
+            (total - pos)[order].astype(np.int64).tolist(),
+        )
+    }
+
+
+def batch_document_frequency(model: Dict, prepared: PreparedCases, rows):
+    """向量化的 learn_document_frequency：重新累计 TF-IDF 文档频率。
+    词表与逐条学习时一样，取按案例顺序最先出现的 max_features 个 token"""
+    rows = np.asarray(rows, dtype=np.int64)
+    old = model.get("tfidf")
+    tfidf = OnlineTFIDF(max_features=old.max_features if old else 300)
+    _, positions = _gather(prepared.token_indptr, rows)
+    # 每个案例中的 token 已去重，出现次数即文档频率
+    ids = prepared.token_ids[positions]
+    doc_freq = np.bincount(ids, minlength=len(prepared.tokens))
+    order = _first_seen(ids)
+    tokens = prepared.tokens
+    tfidf.doc_count = len(rows)
+    tfidf.term_doc_freq.update(
+        zip((tokens[t] for t in order.tolist()), doc_freq[order].tolist())
+    )
+    for t in order[: tfidf.max_features].tolist():
+        tfidf.vocabulary[tokens[t]] = len(tfidf.vocabulary)
+    model["tfidf"] = tfidf
+    return tfidf
+
+
+def logistic_loss(
+    X: FeatureMatrix, y, weights: np.ndarray, bias: float, l2: float = L2_LAMBDA
+) -> float:
+    """fit_logistic 的目标：平均对数损失 + 每个案例中出现的特征的 L2 惩罚"""
+    y = np.asarray(y, dtype=np.float64)
+    n = X.n_rows
+    row_ids = np.repeat(np.arange(n), np.diff(X.indptr))
+    z = bias + np.bincount(row_ids, weights=X.data * weights[X.indices], minlength=n)
+    # log(1 + e^z) - y*z 的数值稳定形式
+    loss = np.logaddexp(0.0, z) - y * z
+    active = np.bincount(X.indices, minlength=len(weights))
+    return float(loss.mean() + l2 / 2 * np.dot(active, weights * weights) / max(1, n))
+
+
+def fit_logistic(
+    X: FeatureMatrix,
+    y,
+    weights: np.ndarray,
+    bias: float = DEFAULT_BIAS,
+    epochs: int = 10,
+    batch_size: int = 256,
+    learning_rate: float = 2.0,
+    l2: float = L2_LAMBDA,
+    seed: int = 0,
+    callback=None,
+) -> Tuple[np.ndarray, float]:
+    """小批量 SGD 拟合逻辑回归，返回 (各列权重, 偏置)。
+
+    目标与 update_model_online_enhanced 相同：每个案例的对数损失，加上 l2/2 × 该案例中
+    出现的特征的权重平方和，偏置不正则化。每批取各案例梯度的平均，
+    第 k 轮的学习率为 learning_rate / sqrt(k)。weights 为各列的初始权重；
+    给出 callback 时每轮结束后计算目标值，调用 callback(轮次, 目标值)。
+    """
+    y = np.asarray(y, dtype=np.float64)
+    w = np.array(weights, dtype=np.float64)
+    b = float(bias)
+    n, n_cols = X.n_rows, len(w)
+    rng = np.random.default_rng(seed)
+    for epoch in range(1, epochs + 1):
+        lr = learning_rate / sqrt(epoch)
+        order = rng.permutation(n)
+        indptr, positions = _gather(X.indptr, order)
+        cols = X.indices[positions]
+        data = X.data[positions]
+        labels = y[order]
+        for start in range(0, n, batch_size):
+            stop = min(start + batch_size, n)
+            size = stop - start
+            s, e = indptr[start], indptr[stop]
+            c, x = cols[s:e], data[s:e]
+            r = np.repeat(np.arange(size), np.diff(indptr[start : stop + 1]))
+            z = b + np.bincount(r, weights=x * w[c], minlength=size)
+            err = labels[start:stop] - _sigmoid_array(z)
+            grad = np.bincount(c, weights=x * err[r], minlength=n_cols)
+            active = np.bincount(c, minlength=n_cols)
+            w += lr / size * (grad - l2 * active * w)
+            b += lr * float(err.mean())
+        if callback is not None:
+            callback(epoch, logistic_loss(X, y, w, b, l2))
+    return w, b
+
+
+def train_batch(
+    model: Dict,
+    prepared: PreparedCases,
+    rows,
+    labels,
+    expand: bool = True,
+    engine: Optional[HintEngine] = None,
+    **fit_options,
+) -> List[str]:
+    """由已有标注一次性重建增强模型（代替逐条 train_online），返回学习特征。
+
+    token 统计与 TF-IDF 文档频率按 rows 重新累计；expand=True 时按最终的 token 统计
+    扩展学习特征（预处理时需给出不大于 MIN_COUNT 的 candidate_min_count），
+    登记在 engine 中；之后构造特征矩阵，用 fit_logistic 拟合权重与偏置，
+    fit_options 传给 fit_logistic。
+    """
+    engine = (engine or default_engine()).with_model(model)
+    rows = np.asarray(rows, dtype=np.int64)
+    labels = np.asarray(labels)
+    model["token_stats"] = batch_token_stats(prepared, rows, labels)
+    tfidf = batch_document_frequency(model, prepared, rows)
+    learned: List[str] = []
+    if expand:
+        learned = engine.maybe_expand_features(max_add=len(model["token_stats"]))
+        missing = set(learned).difference(prepared.candidates)
+        if missing:
+            raise ValueError(
+                f"{len(missing)} 个学习特征没有预先匹配子串命中，"
+                "prepare_cases 需给出不大于 MIN_COUNT 的 candidate_min_count"
+            )
+    engine.maybe_prune_token_stats()
+    tfidf.prune(engine.token_budget)
+
+    X = feature_matrix(prepared, rows, model, learned)
+    weights = model["weights"]
+    w, b = fit_logistic(
+        X,
+        labels,
+        weights.lookup(X.names),
+        model.get("bias", DEFAULT_BIAS),
+        **fit_options,
+    )
+    for name, value in zip(X.names, w.tolist()):
+        weights[name] = value
+    model["bias"] = b
+    # 之后继续在线标注时，自适应学习率从已训练的条数接着衰减
+    model["n_updates"] = model.get("n_updates", 0) + len(rows)
+    return learned
+
+
+# ---------------- 指标 ----------------
+
+
+def _average_ranks(scores: np.ndarray) -> np.ndarray:
+    """秩（从 1 开始，并列取平均）"""
+    order = np.argsort(scores, kind="mergesort")
+    _, first, counts = np.unique(scores[order], return_index=True, return_counts=True)
+    ranks = np.empty(len(scores), dtype=np.float64)
+    ranks[order] = np.repeat(first + (counts + 1) / 2.0, counts)
+    return ranks
+
+
+def roc_auc(y_true, y_score) -> float:
+    """ROC AUC（Mann-Whitney U，并列分数按梯形积分处理）；只有一类时返回 0.5"""
+    y = np.asarray(y_true).astype(bool)
+    s = np.asarray(y_score, dtype=np.float64)
+    pos = int(y.sum())
+    neg = len(y) - pos
+    if pos == 0 or neg == 0:
+        return 0.5
+    ranks = _average_ranks(s)
+    return float((ranks[y].sum() - pos * (pos + 1) / 2.0) / (pos * neg))
+
+
+def pr_curve(y_true, y_score) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """PR 曲线：按分数从高到低，返回各个不同阈值下的 (precision, recall, threshold)"""
+    y = np.asarray(y_true).astype(bool)
+    s = np.asarray(y_score, dtype=np.float64)
+    order = np.argsort(-s, kind="mergesort")
+    s, y = s[order], y[order]
+    # 每个不同分数的最后一个位置
+    last = np.flatnonzero(np.r_[s[1:] != s[:-1], True])
+    tps = np.cumsum(y)[last]
+    fps = last + 1 - tps
+    pos = max(1, int(y.sum()))
+    return tps / (tps + fps), tps / pos, s[last]
+
+
+def average_precision(y_true, y_score) -> float:
+    precision, recall, _ = pr_curve(y_true, y_score)
+    return float(np.sum(np.diff(np.r_[0.0, recall]) * precision))
+
+
+def threshold_metrics(
+    y_true, y_score, thresholds: Sequence[float] = DEFAULT_THRESHOLDS
+) -> List[Dict]:
+    """各阈值（概率 >= 阈值判为非建筑业）下的准确率、精确率、召回率与 F1"""
+    y = np.asarray(y_true).astype(bool)
+    s = np.asarray(y_score, dtype=np.float64)
+    pred = s[None, :] >= np.asarray(thresholds, dtype=np.float64)[:, None]
+    tp = (pred & y).sum(axis=1)
+    fp = (pred & ~y).sum(axis=1)
+    fn = (~pred & y).sum(axis=1)
+    tn = (~pred & ~y).sum(axis=1)
+    result = []
+    for i, t in enumerate(thresholds):
+        precision = tp[i] / max(1, tp[i] + fp[i])
+        recall = tp[i] / max(1, tp[i] + fn[i])
+        f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0
+        result.append(
+            {
+                "threshold": float(t),
+                "acc": float((tp[i] + tn[i]) / max(1, len(y))),
+                "precision": float(precision),
+                "recall": float(recall),
+                "f1": float(f1),
+            }
+        )
+    return result
+
+
+def evaluate_scores(
+    y_true, y_score, thresholds: Sequence[float] = DEFAULT_THRESHOLDS
+) -> Dict:
+    """汇总指标：AUC、平均精确率（PR 曲线下面积）与各阈值下的指标"""
+    return {
+        "size": int(len(y_true)),
+        "auc": roc_auc(y_true, y_score),
+        "average_precision": average_precision(y_true, y_score),
+        "thresholds": threshold_metrics(y_true, y_score, thresholds),
+    }
@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+"""
+关键段落定位：一次扫描找出全文中所有“事故经过”类标记，按目录可能性与正文特征打分，
+返回要显示的摘录区间 (关键词, 起点, 终点)。
+
+区间只是三个数，可以按案例缓存，也可以用 locate_many 预先为整个语料算好，
+作为 excerpt_keyword / excerpt_start / excerpt_end 三列随数据保存，显示时直接切片：
+    python excerpt.py data/raw/accident_cases.csv -o data/raw/accident_cases.parquet
+"""
+
+import argparse
+import re
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+
+# 关键词按优先级排列：前三个描述事故经过，后两个是较宽泛的概况
+MARKER_KEYWORDS = ["事故发生经过", "事故经过", "事发经过", "事故情况", "事故概况"]
+_PRIMARY = set(MARKER_KEYWORDS[:3])
+
+# 标记关键词用一个正则一次扫描全部找出；编号（（六）/ 六、/ 6.）在命中后向前检查
+_MARKER_RE = re.compile("|".join(MARKER_KEYWORDS))
+_NUMBER_RE = re.compile(
+    r"(?:[（(][一二三四五六七八九十\d]+[）)]|[一二三四五六七八九十]+[、.．]|\d{1,2}[、.．])"
+    r"[ \t　]*$"
+)
+# 关键词之后紧跟的日期/时间，说明是正文而不是标题罗列
+_TIME_RE = re.compile(r"\d{4}年|\d{1,2}月\d{1,2}日|时\S{0,6}?分")
+_LEAD_RE = re.compile(r"[:：\s]*")
+# 目录行特征：点线/破折号引导符，或行尾页码
+_TOC_LINE_RE = re.compile(r"- |…|·{2,}|\.{3,}|[\s.…·-]\d{1,3}\s*$")
+
+# 目录行的判定长度，与判断窗口（标记所在行前后各若干行）
+TOC_LINE_MAX = 40
+TOC_WINDOW = 4
+# 窗口内目录行达到该数量视为目录
+TOC_THRESHOLD = 3
+
+# 摘录范围：关键词前保留的上下文、关键词后最多显示的字符数
+CONTEXT_BEFORE = 50
+EXCERPT_LENGTH = 1500
+
+SPAN_COLUMNS = ["excerpt_keyword", "excerpt_start", "excerpt_end"]
+
+
+class ExcerptSpan(NamedTuple):
+    keyword: str
+    start: int
+    end: int
+
+
+class _LineIndex:
+    """行边界与“是否像目录行”的索引，只对标记附近的行按需计算并缓存"""
+
+    def __init__(self, text: str):
+        self.text = text
+        self._toc: Dict[int, bool] = {}
+
+    def line_start(self, pos: int) -> int:
+        return self.text.rfind("\n", 0, pos) + 1
+
+    def line_end(self, pos: int) -> int:
+        end = self.text.find("\n", pos)
+        return len(self.text) if end == -1 else end
+
+    def is_toc(self, start: int) -> bool:
+        """start 为行起点"""
+        flag = self._toc.get(start)
+        if flag is None:
+            line = self.text[start : self.line_end(start)].strip()
+            flag = len(line) < TOC_LINE_MAX and bool(_TOC_LINE_RE.search(line))
+            self._toc[start] = flag
+        return flag
+
+    def toc_count(self, pos: int, window: int) -> int:
+        """pos 所在行及前后各 window 行中目录行的数量"""
+        start = self.line_start(pos)
+        count = int(self.is_toc(start))
+        prev = start
+        for _ in range(window):
+            if prev == 0:
+                break
+            prev = self.line_start(prev - 1)
+            count += self.is_toc(prev)
+        nxt = self.line_end(start)
+        for _ in range(window):
+            if nxt >= len(self.text):
+                break
+            nxt += 1
+            count += self.is_toc(nxt)
+            nxt = self.line_end(nxt)
+        return count
+
+
+def _followed_by_time(text: str, pos: int, line_end: int) -> bool:
+    """关键词之后（跳过标点与换行）紧跟日期，或本行剩余部分含时间"""
+    lead = _LEAD_RE.match(text, pos).end()
+    if _TIME_RE.match(text, lead):
+        return True
+    return lead < line_end and bool(
+        _TIME_RE.search(text, lead, min(line_end, lead + 80))
+    )
+
+
+def _marker_tier(text: str, m: "re.Match", index: _LineIndex) -> Optional[int]:
+    """标记的优先级（越小越好）；像目录的返回 None"""
+    keyword = m.group()
+    start = index.line_start(m.start())
+    toc = index.toc_count(start, TOC_WINDOW)
+    if toc >= TOC_THRESHOLD or (index.is_toc(start) and toc >= 2):
+        return None
+    if keyword not in _PRIMARY:
+        return 3
+    line_end = index.line_end(m.end())
+    if _followed_by_time(text, m.end(), line_end):
+        return 0
+    # 独占一行的（编号）标题
+    before = text[start : m.start()]
+    after = text[m.end() : line_end].strip(" \t　:：")
+    if not after and (not before.strip() or _NUMBER_RE.search(before)):
+        return 1
+    return 2
+
+
+def _span_from_marker(text: str, keyword: str, match_end: int) -> ExcerptSpan:
+    start = max(0, match_end - CONTEXT_BEFORE)
+    end = min(len(text), match_end + EXCERPT_LENGTH)
+    if start > 0:
+        # 尽量从完整的一行开始
+        newline_pos = text.find("\n", start, start + 100)
+        if newline_pos > start:
+            start = newline_pos + 1
+    return ExcerptSpan(keyword, start, end)
+
+
+@lru_cache(maxsize=256)
+def locate_key_excerpt(text: str) -> Optional[ExcerptSpan]:
+    """定位关键段落，返回摘录区间；未找到返回 None"""
+    best = None
+    index = _LineIndex(text)
+    for m in _MARKER_RE.finditer(text):
+        tier = _marker_tier(text, m, index)
+        if tier is None:
+            continue
+        if best is None or tier < best[0]:
+            best = (tier, m)
+            if tier == 0:
+                break
+    if best is None:
+        return None
+    m = best[1]
+    return _span_from_marker(text, m.group(), m.end())
+
+
+def format_excerpt(text: str, span: ExcerptSpan) -> str:
+    """按区间切出摘录，截断处加省略号"""
+    excerpt = text[span.start : span.end]
+    if span.start > 0 and text[span.start - 1] != "\n":
+        excerpt = "..." + excerpt
+    if span.end < len(text):
+        excerpt = excerpt + "..."
+    return excerpt
+
+
+def find_key_excerpt(full_text: str) -> Tuple[Optional[str], Optional[str]]:
+    """定位关键段落，返回 (匹配关键词, 截取内容)；未找到返回 (None, None)"""
+    span = locate_key_excerpt(full_text)
+    if span is None:
+        return None, None
+    return span.keyword, format_excerpt(full_text, span)
+
+
+def span_from_row(row: pd.Series, text_len: int) -> Optional[ExcerptSpan]:
+    """读取预先计算好的区间列；没有这些列或区间超出文本（文本已改动）时返回 None"""
+    if "excerpt_start" not in row.index:
+        return None
+    start = row["excerpt_start"]
+    if pd.isna(start):
+        return ExcerptSpan("", -1, -1)
+    end = int(row["excerpt_end"])
+    if end > text_len:
+        return None
+    return ExcerptSpan(str(row["excerpt_keyword"]), int(start), end)
+
+
+def key_excerpt_for_row(row: pd.Series) -> Tuple[Optional[str], Optional[str]]:
+    """案例的关键段落，优先使用预计算的区间列"""
+    full_text = str(row["full_text"])
+    span = span_from_row(row, len(full_text))
+    if span is None:
+        return find_key_excerpt(full_text)
+    if span.start < 0:
+        return None, None
+    return span.keyword, format_excerpt(full_text, span)
+
+
+def locate_many(texts: Iterable[str]) -> pd.DataFrame:
+    """为整批文本计算摘录区间，返回 SPAN_COLUMNS 三列（未找到为缺失值）"""
+    keywords: List[Optional[str]] = []
+    starts: List[Optional[int]] = []
+    ends: List[Optional[int]] = []
+    for text in texts:
+        span = locate_key_excerpt.__wrapped__(str(text))
+        keywords.append(span.keyword if span else None)
+        starts.append(span.start if span else None)
+        ends.append(span.end if span else None)
+    return pd.DataFrame(
+        {
+            "excerpt_keyword": pd.array(keywords, dtype="string"),
+            "excerpt_start": pd.array(starts, dtype="Int32"),
+            "excerpt_end": pd.array(ends, dtype="Int32"),
+        }
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="为语料预先计算关键段落区间列")
+    parser.add_argument("input", help="含 full_text 列的 CSV 或 Parquet")
+    parser.add_argument(
+        "-o", "--output", help="输出文件（默认覆盖输入，按后缀决定格式）"
+    )
+    args = parser.parse_args()
+
+    src = Path(args.input)
+    dst = Path(args.output) if args.output else src
+    if src.suffix == ".parquet":
+        df = pd.read_parquet(src)
+    else:
+        df = pd.read_csv(src, encoding="utf-8-sig")
+    t0 = time.perf_counter()
+    spans = locate_many(df["full_text"].fillna(""))
+    elapsed = time.perf_counter() - t0
+    df = df.drop(columns=[c for c in SPAN_COLUMNS if c in df.columns])
+    df = pd.concat([df.reset_index(drop=True), spans], axis=1)
+    if dst.suffix == ".parquet":
+        df.to_parquet(dst, index=False)
+    else:
+        df.to_csv(dst, index=False, encoding="utf-8-sig")
+    found = int(spans["excerpt_start"].notna().sum())
+    print(f"已定位 {found}/{len(df)} 个案例的关键段落（{elapsed:.2f} 秒）-> {dst}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,521 @@
+# -*- coding: utf-8 -*-
+"""
+智能提示模型的二进制存储格式（*_hint_model.bin）。
+
+JSON 格式启动时要解析全部 token 统计（数十万个嵌套字典），每次自动保存再整体
+序列化一遍。二进制格式把每张表存成“字符串表 + 定长数组”：加载时直接得到
+NumPy 数组视图（可 mmap），按需二分查找；保存时只合并本次会话改动过的条目。
+
+文件布局（各数据段按 8 字节对齐）：
+    b"HINTBIN\\0" | uint32 格式版本 | uint32 头部长度 | 头部 JSON | 数据段...
+头部 JSON 记录 bias、n_updates、TF-IDF 参数，以及每个数据段的偏移、类型和长度。
+字符串表 = UTF-8 字节串 + int64 偏移 + 按字节序排列的 int32 行号（用于二分查找）。
+
+JSON 与二进制互转（按输入文件后缀决定方向）：
+    python hint_store.py data/annotated/accident_cases_annotated_张三_hint_model.json
+    python hint_store.py data/annotated/accident_cases_annotated_张三_hint_model.bin
+"""
+
+import argparse
+import json
+import mmap
+import os
+import struct
+import time
+from collections.abc import Mapping, MutableMapping
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+import numpy as np
+
+MAGIC = b"HINTBIN\0"
+FORMAT_VERSION = 1
+_PREFIX = struct.Struct("<8sII")
+_ALIGN = 8
+
+
+class StringTable:
+    """只读字符串表：按行号取字符串，或按字节序二分查找行号"""
+
+    def __init__(self, buf, start: int, offsets: np.ndarray, order: np.ndarray):
+        self.buf = buf  # bytes 或 mmap，切片得到 bytes
+        self.start = start  # 字节串在 buf 中的起始位置
+        self.offsets = offsets  # int64，长度 n+1
+        self.order = order  # int32，按 UTF-8 字节序排列的行号
+        # memoryview 索引直接得到 Python int，比逐个取 NumPy 标量快
+        self._off = memoryview(offsets)
+        self._ord = memoryview(order)
+
+    def __len__(self) -> int:
+        return len(self.order)
+
+    def _bytes(self, row: int) -> bytes:
+        s = self.start
+        return bytes(self.buf[s + self._off[row] : s + self._off[row + 1]])
+
+    def name(self, row: int) -> str:
+        return self._bytes(row).decode("utf-8")
+
+    def bisect(self, key: bytes) -> int:
+        """key 在字节序中的插入位置"""
+        lo, hi = 0, len(self._ord)
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._bytes(self._ord[mid]) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def find(self, name: str) -> int:
+        """返回行号，不存在返回 -1"""
+        key = name.encode("utf-8")
+        pos = self.bisect(key)
+        if pos < len(self._ord):
+            row = self._ord[pos]
+            if self._bytes(row) == key:
+                return row
+        return -1
+
+    def names(self) -> List[str]:
+        offsets = self.offsets.tolist()
+        blob = bytes(self.buf[self.start : self.start + offsets[-1]])
+        return [blob[a:b].decode("utf-8") for a, b in zip(offsets, offsets[1:])]
+
+    def blob(self) -> np.ndarray:
+        return np.frombuffer(
+            self.buf, dtype=np.uint8, count=int(self.offsets[-1]), offset=self.start
+        )
+
+
+def merge_string_table(
+    table: Optional[StringTable], keep: Optional[np.ndarray], new_names: List[str]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """在已有字符串表上删除 keep=False 的行并追加 new_names（不能与保留行重名）。
+
+    返回 (字节串, 偏移, 字节序行号)。已有部分只做数组拷贝，
+    新名字二分插入到原有顺序中，耗时与新增数量相关而非总量。
+    """
+    if table is not None and len(table) > 0:
+        blob = table.blob()
+        lengths = np.diff(table.offsets)
+        order = table.order.astype(np.int64)
+        if keep is not None:
+            blob = blob[np.repeat(keep, lengths)]
+            lengths = lengths[keep]
+            remap = np.cumsum(keep) - 1
+            order_kept = keep[order]
+            # 原顺序中每个位置之前保留了多少行
+            kept_before = np.concatenate([[0], np.cumsum(order_kept)])
+            order = remap[order[order_kept]]
+        else:
+            kept_before = None
+    else:
+        blob = np.zeros(0, dtype=np.uint8)
+        lengths = np.zeros(0, dtype=np.int64)
+        order = np.zeros(0, dtype=np.int64)
+        kept_before = None
+
+    n_kept = len(lengths)
+    encoded = [name.encode("utf-8") for name in new_names]
+    if encoded:
+        blob = np.concatenate([blob, np.frombuffer(b"".join(encoded), np.uint8)])
+        lengths = np.concatenate(
+            [lengths, np.fromiter((len(e) for e in encoded), np.int64, len(encoded))]
+        )
+        new_rows = sorted(range(len(encoded)), key=encoded.__getitem__)
+        if table is not None and len(table) > 0:
+            positions = np.fromiter(
+                (table.bisect(encoded[i]) for i in new_rows), np.int64, len(new_rows)
+            )
+            if kept_before is not None:
+                positions = kept_before[positions]
+        else:
+            positions = np.zeros(len(new_rows), dtype=np.int64)
+        order = np.insert(order, positions, np.asarray(new_rows) + n_kept)
+
+    offsets = np.zeros(len(lengths) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    return blob, offsets, order.astype(np.int32)
+
+
+class _PackedMapping(MutableMapping):
+    """字符串表 + 列数组之上的可写映射。
+
+    基础数据只读；读写过的条目记录在 _values 中（基础行号记在 _rows），
+    新增条目按插入顺序排在基础行之后，删除的基础行记在 _deleted。
+    """
+
+    COLUMNS: Tuple[str, ...] = ()
+
+    def __init__(
+        self,
+        table: Optional[StringTable] = None,
+        columns: Optional[Dict[str, np.ndarray]] = None,
+    ):
+        self._table = table
+        self._columns = columns or {}
+        self._n_base = len(table) if table is not None else 0
+        self._values: Dict[str, object] = {}
+        self._rows: Dict[str, int] = {}
+        self._deleted: Set[int] = set()
+        self._new_positions: Dict[str, int] = {}
+        self._next_position = self._n_base
+
+    # 子类实现：基础行 <-> Python 值
+    def _load(self, row: int):
+        raise NotImplementedError
+
+    def _dump(self, value) -> Tuple[int, ...]:
+        raise NotImplementedError
+
+    def _base_row(self, name: str) -> int:
+        if self._table is None:
+            return -1
+        row = self._table.find(name)
+        if row < 0 or row in self._deleted:
+            return -1
+        return row
+
+    def __getitem__(self, name: str):
+        try:
+            return self._values[name]
+        except KeyError:
+            pass
+        row = self._base_row(name)
+        if row < 0:
+            raise KeyError(name)
+        value = self._load(row)
+        self._values[name] = value
+        self._rows[name] = row
+        return value
+
+    def get(self, name: str, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def __setitem__(self, name: str, value):
+        if name not in self._values:
+            row = self._table.find(name) if self._table is not None else -1
+            if row >= 0:
+                self._rows[name] = row
+                self._deleted.discard(row)
+            else:
+                self._new_positions[name] = self._next_position
+                self._next_position += 1
+        self._values[name] = value
+
+    def __delitem__(self, name: str):
+        if name in self._values:
+            del self._values[name]
+            row = self._rows.pop(name, None)
+            if row is None:
+                del self._new_positions[name]
+            else:
+                self._deleted.add(row)
+            return
+        row = self._base_row(name)
+        if row < 0:
+            raise KeyError(name)
+        self._deleted.add(row)
+
+    def __contains__(self, name) -> bool:
+        return name in self._values or self._base_row(name) >= 0
+
+    def __len__(self) -> int:
+        return self._n_base - len(self._deleted) + len(self._new_positions)
+
+    def __iter__(self) -> Iterator[str]:
+        if self._table is not None:
+            deleted = self._deleted
+            for row, name in enumerate(self._table.names()):
+                if row not in deleted:
+                    yield name
+        yield from list(self._new_positions)
+
+    def iter_rows(self) -> Iterator[Tuple[str, Tuple[int, ...]]]:
+        """按插入顺序遍历 (名称, 列值)，基础行不展开成 Python 对象"""
+        if self._table is not None:
+            deleted = self._deleted
+            values = self._values
+            columns = [self._columns[c].tolist() for c in self.COLUMNS]
+            for row, name in enumerate(self._table.names()):
+                if row in deleted:
+                    continue
+                if name in values:
+                    yield name, self._dump(values[name])
+                else:
+                    yield name, tuple(col[row] for col in columns)
+        for name in list(self._new_positions):
+            yield name, self._dump(self._values[name])
+
+    def position(self, name: str) -> int:
+        """条目的插入顺序（基础行为行号，新增条目依次排在后面）"""
+        position = self._new_positions.get(name)
+        if position is not None:
+            return position
+        row = self._rows.get(name)
+        return row if row is not None else self._base_row(name)
+
+    def pack(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray, Dict[str, np.ndarray]]:
+        """合并改动，返回 (字节串, 偏移, 字节序行号, 列数组)"""
+        if self._n_base:
+            columns = {c: self._columns[c].copy() for c in self.COLUMNS}
+        else:
+            columns = {c: np.zeros(0, dtype=np.int32) for c in self.COLUMNS}
+        for name, row in self._rows.items():
+            for c, v in zip(self.COLUMNS, self._dump(self._values[name])):
+                columns[c][row] = v
+        keep = None
+        if self._deleted:
+            keep = np.ones(self._n_base, dtype=bool)
+            keep[list(self._deleted)] = False
+            columns = {c: a[keep] for c, a in columns.items()}
+        new_names = list(self._new_positions)
+        if new_names:
+            dumped = [self._dump(self._values[name]) for name in new_names]
+            for i, c in enumerate(self.COLUMNS):
+                extra = np.fromiter((d[i] for d in dumped), np.int32, len(dumped))
+                columns[c] = np.concatenate([columns[c], extra])
+        blob, offsets, order = merge_string_table(self._table, keep, new_names)
+        return blob, offsets, order, columns
+
+    @classmethod
+    def from_mapping(cls, data: Mapping) -> "_PackedMapping":
+        if isinstance(data, cls):
+            return data
+        packed = cls()
+        for name, value in data.items():
+            packed[name] = value
+        return packed
+
+
+class TokenStats(_PackedMapping):
+    """token -> {"pos": int, "neg": int}，与 JSON 加载的字典用法一致（可原地修改）"""
+
+    COLUMNS = ("pos", "neg")
+
+    def _load(self, row: int) -> Dict[str, int]:
+        return {
+            "pos": int(self._columns["pos"][row]),
+            "neg": int(self._columns["neg"][row]),
+        }
+
+    def _dump(self, value) -> Tuple[int, ...]:
+        return (value.get("pos", 0), value.get("neg", 0))
+
+    def candidates(
+        self, min_count: int, min_abs_log_odds: float, alpha: float
+    ) -> Iterator[Tuple[str, int, int, int]]:
+        """向量化筛出未改动的基础行中可能满足扩展条件的 token，
+        产出 (token, pos, neg, 插入顺序)，供候选索引初始化时不必逐个查找"""
+        if not self._n_base:
+            return
+        pos = self._columns["pos"]
+        neg = self._columns["neg"]
+        log_odds = np.log((pos + alpha) / (neg + alpha))
+        mask = (pos.astype(np.int64) + neg >= min_count) & (
+            np.abs(log_odds) >= min_abs_log_odds
+        )
+        if self._deleted or self._rows:
+            mask[list(self._deleted) + list(self._rows.values())] = False
+        rows = np.nonzero(mask)[0]
+        table = self._table
+        for row, p, n in zip(rows.tolist(), pos[rows].tolist(), neg[rows].tolist()):
+            yield table.name(row), p, n, row
+
+    def changed(self) -> List[str]:
+        """本次加载后读写过或新增的 token"""
+        return list(self._values)
+
+
+class DocFreq(_PackedMapping):
+    """token -> 文档频率（OnlineTFIDF.term_doc_freq）"""
+
+    COLUMNS = ("df",)
+
+    def _load(self, row: int) -> int:
+        return int(self._columns["df"][row])
+
+    def _dump(self, value) -> Tuple[int, ...]:
+        return (value,)
+
+
+def _table_sections(
+    prefix: str, packed: _PackedMapping
+) -> List[Tuple[str, np.ndarray]]:
+    blob, offsets, order, columns = packed.pack()
+    sections = [
+        (f"{prefix}.blob", blob),
+        (f"{prefix}.offsets", offsets),
+        (f"{prefix}.order", order),
+    ]
+    sections.extend((f"{prefix}.{c}", columns[c]) for c in packed.COLUMNS)
+    return sections
+
+
+def write_hint_model_binary(path: Path, data: Dict):
+    """写入二进制模型（先写临时文件再替换）"""
+    weights = data.get("weights", {})
+    weight_names = list(weights)
+    weight_values = np.fromiter(
+        (weights[name] for name in weight_names), np.float64, len(weight_names)
+    )
+    weight_table = merge_string_table(None, None, weight_names)
+
+    sections: List[Tuple[str, np.ndarray]] = [
+        ("weights.blob", weight_table[0]),
+        ("weights.offsets", weight_table[1]),
+        ("weights.order", weight_table[2]),
+        ("weights.values", weight_values),
+    ]
+    sections += _table_sections(
+        "token_stats", TokenStats.from_mapping(data.get("token_stats", {}))
+    )
+
+    header: Dict = {
+        "format_version": FORMAT_VERSION,
+        "bias": float(data.get("bias", 0.0)),
+        "n_updates": int(data.get("n_updates", 0)),
+    }
+    tfidf = data.get("tfidf")
+    if isinstance(tfidf, Mapping):
+        header["tfidf"] = {
+            "doc_count": tfidf.get("doc_count", 0),
+            "max_features": tfidf.get("max_features", 300),
+            "vocabulary": dict(tfidf.get("vocabulary", {})),
+        }
+        sections += _table_sections(
+            "term_doc_freq", DocFreq.from_mapping(tfidf.get("term_doc_freq", {}))
+        )
+    # 其余可 JSON 序列化的字段原样放进头部
+    extra = {
+        k: v
+        for k, v in data.items()
+        if k not in ("bias", "n_updates", "weights", "token_stats", "tfidf")
+    }
+    if extra:
+        header["extra"] = extra
+
+    # 先算出头部长度再确定各段偏移（偏移数字的位数会影响头部长度，迭代到稳定）
+    layout: Dict[str, List] = {}
+    header_len = 0
+    while True:
+        offset = _align(_PREFIX.size + header_len)
+        for name, arr in sections:
+            layout[name] = [offset, arr.dtype.str, int(arr.size)]
+            offset = _align(offset + arr.nbytes)
+        header["sections"] = layout
+        header_bytes = json.dumps(header, ensure_ascii=False).encode("utf-8")
+        if len(header_bytes) <= header_len:
+            break
+        header_len = len(header_bytes) + 64
+    header_bytes = header_bytes.ljust(header_len, b" ")
+
+    tmp = path.with_name(path.name + ".tmp")
+    with open(tmp, "wb") as f:
+        f.write(_PREFIX.pack(MAGIC, FORMAT_VERSION, header_len))
+        f.write(header_bytes)
+        for name, arr in sections:
+            f.seek(layout[name][0])
+            f.write(np.ascontiguousarray(arr).tobytes())
+        f.truncate(_align(f.tell()))
+    os.replace(tmp, path)
+
+
+def _align(n: int) -> int:
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+def read_hint_model_binary(path: Path, use_mmap: bool = False) -> Dict:
+    """读取二进制模型。
+
+    use_mmap=True 时数组直接映射文件（多进程只读场景共享页缓存）；
+    否则一次性读入内存，避免映射期间文件无法被替换（Windows）。
+    """
+    with open(path, "rb") as f:
+        if use_mmap:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            buf = f.read()
+    magic, version, header_len = _PREFIX.unpack_from(buf, 0)
+    if magic != MAGIC:
+        raise ValueError(f"不是智能提示模型文件: {path}")
+    if version > FORMAT_VERSION:
+        raise ValueError(f"模型文件版本 {version} 高于当前支持的 {FORMAT_VERSION}")
+    header = json.loads(bytes(buf[_PREFIX.size : _PREFIX.size + header_len]))
+    layout = header["sections"]
+
+    def array(name: str) -> np.ndarray:
+        offset, dtype, count = layout[name]
+        return np.frombuffer(buf, dtype=np.dtype(dtype), count=count, offset=offset)
+
+    def table(prefix: str) -> StringTable:
+        return StringTable(
+            buf,
+            layout[f"{prefix}.blob"][0],
+            array(f"{prefix}.offsets"),
+            array(f"{prefix}.order"),
+        )
+
+    weights = dict(zip(table("weights").names(), array("weights.values").tolist()))
+    data = dict(header.get("extra", {}))
+    data.update(
+        {
+            "bias": header.get("bias", 0.0),
+            "n_updates": header.get("n_updates", 0),
+            "weights": weights,
+            "token_stats": TokenStats(
+                table("token_stats"),
+                {c: array(f"token_stats.{c}") for c in TokenStats.COLUMNS},
+            ),
+        }
+    )
+    if "tfidf" in header:
+        tfidf = dict(header["tfidf"])
+        tfidf["term_doc_freq"] = DocFreq(
+            table("term_doc_freq"),
+            {c: array(f"term_doc_freq.{c}") for c in DocFreq.COLUMNS},
+        )
+        data["tfidf"] = tfidf
+    return data
+
+
+def _json_default(obj):
+    if isinstance(obj, Mapping):
+        return dict(obj)
+    raise TypeError(f"无法序列化: {type(obj).__name__}")
+
+
+def convert(src: Path, dst: Optional[Path] = None) -> Path:
+    """*_hint_model.json <-> *_hint_model.bin"""
+    if src.suffix == ".json":
+        dst = dst or src.with_suffix(".bin")
+        with open(src, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        write_hint_model_binary(dst, data)
+    elif src.suffix == ".bin":
+        dst = dst or src.with_suffix(".json")
+        data = read_hint_model_binary(src)
+        with open(dst, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2, default=_json_default)
+    else:
+        raise SystemExit(f"无法识别的模型文件: {src}（应为 .json 或 .bin）")
+    return dst
+
+
+def main():
+    parser = argparse.ArgumentParser(description="智能提示模型 JSON/二进制格式互转")
+    parser.add_argument("model", help="*_hint_model.json 或 *_hint_model.bin")
+    parser.add_argument("-o", "--output", help="输出文件（默认同名换后缀）")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    dst = convert(Path(args.model), Path(args.output) if args.output else None)
+    print(f"已转换: {args.model} -> {dst}（{time.perf_counter() - t0:.2f} 秒）")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,36 @@
+import hashlib
+import heapq
 import json
+import logging
+import os
+import pickle
 import re
-from collections import defaultdict
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from collections.abc import MutableMapping
 from copy import deepcopy
 from math import exp, log, sqrt
 from pathlib import Path
-from typing import Dict, List, Set, Tuple
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 import ahocorasick  # type: ignore
-import jieba  # type: ignore
+import numpy as np
+
+from hint_store import (
+    DocFreq,
+    TokenStats,
+    read_hint_model_binary,
+    write_hint_model_binary,
+)
 
 # 轻量在线逻辑回归模型（非建筑业=1，建筑业=0）
 # 特征为关键词存在与否（0/1）
 
 DEFAULT_BIAS = 0.0
 LEARNING_RATE = 0.2
+# 增强版更新的 L2 正则化系数（只作用于案例中出现的特征，偏置不正则化）
+L2_LAMBDA = 0.01
 
 # 自学习关键词参数
 ALPHA = 1.0  # 平滑
@@ -21,6 +38,14 @@ MIN_COUNT = 6  # 最小出现次数（总计）
 ABS_LOG_ODDS_THRESH = 1.0  # |log((pos+α)/(neg+α))| 阈值
 MAX_TOKEN_LENGTH = 20
 
+# token 统计与 TF-IDF 文档频率的容量上限（条目数，0=不限），
+# 可在 keyword_seeds.json 中用 "token_budget" 覆盖。
+# 超出上限 PRUNE_SLACK 比例后按频次裁剪回上限（低频、较早出现的先裁掉）。
+TOKEN_STATS_BUDGET = 200000
+PRUNE_SLACK = 0.25
+# 最近若干次更新涉及的 token 不参与裁剪，保证这一范围内的撤销精确回滚
+UNDO_WINDOW = 50
+
 
 FEATURE_GROUPS = {
     # 非建筑业强特征：海事/船舶
@@ -134,15 +159,19 @@ BUILTIN_GROUPS = deepcopy(FEATURE_GROUPS)
 BUILTIN_DEFAULT_WEIGHTS = deepcopy(DEFAULT_WEIGHTS)
 
 
+def _new_seed_summary() -> Dict:
+    return {
+        "mode": "merge",
+        "seeds_groups": 0,
+        "seeds_weights": 0,
+        "final_features": 0,
+        "tokenizer": "jieba",
+        "tokenizer_effective": "jieba",
+    }
+
+
 # 供主程序打印的合并摘要
-SEED_LOAD_SUMMARY = {
-    "mode": "merge",
-    "seeds_groups": 0,
-    "seeds_weights": 0,
-    "final_features": 0,
-    "tokenizer": "jieba",
-    "tokenizer_effective": "jieba",
-}
+SEED_LOAD_SUMMARY = _new_seed_summary()
 
 
 # ---------------- 分词资源与分词器 ----------------
@@ -191,7 +220,7 @@ def _tokenizer_resources_dir() -> Path:
 
 
 def _init_tokenizer_resources():
-    # 扩展停用词
+    # 扩展停用词（用户词典在分词器初始化时加载，见 _get_tokenizer）
     sw = _tokenizer_resources_dir() / "stopwords.txt"
     if sw.exists():
         try:
@@ -202,32 +231,113 @@ def _init_tokenizer_resources():
                         _STOPWORDS.add(s)
         except Exception:
             pass
-    # 加载用户词典
+
+
+# jieba 的导入与前缀词典构建较慢（冷启动数秒），推迟到首次分词时进行；
+# 主程序在询问用户名等交互期间调用 start_warm_up() 在后台提前完成。
+# 加载用户词典后的前缀词典缓存在 data/cache/ 下，按 jieba 版本、主词典与用户词典的
+# 大小/修改时间/内容命名，任一变化即重新构建。
+_jieba = None
+_TOKENIZER_LOCK = threading.Lock()
+
+
+def _tokenizer_cache_dir() -> Path:
+    return _project_root() / "data" / "cache"
+
+
+def _jieba_cache_path(jieba_module) -> Path:
+    h = hashlib.sha1(str(getattr(jieba_module, "__version__", "")).encode("utf-8"))
+    main_dict = jieba_module.dt.dictionary or os.path.join(
+        os.path.dirname(jieba_module.__file__), "dict.txt"
+    )
+    for p in (Path(main_dict), _tokenizer_resources_dir() / "user_dict.txt"):
+        if p.exists():
+            st = p.stat()
+            h.update(f"{p.resolve()}|{st.st_size}|{st.st_mtime_ns}".encode("utf-8"))
+            if st.st_size < 16 * 1024 * 1024:
+                h.update(p.read_bytes())
+    return _tokenizer_cache_dir() / f"jieba_{h.hexdigest()[:16]}.pkl"
+
+
+def _load_jieba():
+    import jieba  # type: ignore
+
+    # 后台初始化时不要在交互提示中间打印 jieba 的调试日志
+    jieba.setLogLevel(logging.WARNING)
+    cache = _jieba_cache_path(jieba)
+    if cache.exists():
+        try:
+            # 一次读入再反序列化，比 jieba 自带缓存的 marshal.load(文件) 快数倍
+            freq, total = pickle.loads(cache.read_bytes())
+            jieba.dt.FREQ, jieba.dt.total = freq, total
+            jieba.dt.initialized = True
+            return jieba
+        except Exception:
+            pass
+
+    jieba.initialize()
     ud = _tokenizer_resources_dir() / "user_dict.txt"
     if ud.exists():
         try:
             jieba.load_userdict(str(ud))
         except Exception:
             pass
+    try:
+        cache.parent.mkdir(parents=True, exist_ok=True)
+        tmp = cache.with_name(cache.name + ".tmp")
+        with open(tmp, "wb") as f:
+            pickle.dump(
+                (jieba.dt.FREQ, jieba.dt.total), f, protocol=pickle.HIGHEST_PROTOCOL
+            )
+        os.replace(tmp, cache)
+        # 清理旧配置留下的缓存
+        for old in cache.parent.glob("jieba_*.pkl"):
+            if old != cache:
+                old.unlink()
+    except Exception:
+        pass
+    return jieba
+
+
+def _get_tokenizer():
+    global _jieba
+    if _jieba is None:
+        with _TOKENIZER_LOCK:
+            if _jieba is None:
+                _jieba = _load_jieba()
+    return _jieba
+
+
+def start_warm_up() -> threading.Thread:
+    """在后台线程中初始化分词器，首个案例显示时无需等待"""
+    thread = threading.Thread(target=_get_tokenizer, name="hints-warm-up", daemon=True)
+    thread.start()
+    return thread
 
 
 # ---------------- AC 自动机（关键词匹配） ----------------
-_AC = None
-_AC_KEYMAP: Dict[str, str] = {}
+# 分层匹配：种子关键词（内置 + 外置 + _custom）与上次压实时的学习特征编译在同一个
+# 自动机中，之后新增的学习特征放在小的增量集合里用子串查找匹配，撤销移除的特征
+# 用墓碑集合过滤。增量累积到一定数量后在后台线程重新压实为一个自动机。
+
+# 增量 + 墓碑超过该数量时触发后台压实
+COMPACT_THRESHOLD = 64
+
+
+def _seed_feature_keys() -> Set[str]:
+    # 使用 DEFAULT_WEIGHTS 的键覆盖所有内置/外置种子特征
+    return set(DEFAULT_WEIGHTS.keys()).union(FEATURE_GROUPS.get("_custom", []))
 
 
 def _all_feature_keys() -> Set[str]:
-    # 使用 DEFAULT_WEIGHTS 的键覆盖所有内置/外置/学习特征
-    return set(DEFAULT_WEIGHTS.keys()).union(
-        FEATURE_GROUPS.get("_learned", []), FEATURE_GROUPS.get("_custom", [])
-    )
+    return _seed_feature_keys().union(FEATURE_GROUPS.get("_learned", []))
 
 
-def _rebuild_automaton():
-    global _AC, _AC_KEYMAP
+def _build_automaton(keys: Iterable[str]):
+    """编译关键词自动机，返回 (automaton, lower -> 原始关键词)"""
     A = ahocorasick.Automaton()
     keymap: Dict[str, str] = {}
-    for k in _all_feature_keys():
+    for k in keys:
         kl = str(k).lower()
         if not kl:
             continue
@@ -235,58 +345,213 @@ def _rebuild_automaton():
             keymap[kl] = k
         A.add_word(kl, kl)  # 存 lower 值作为 payload
     A.make_automaton()
-    _AC = A
-    _AC_KEYMAP = keymap
+    return A, keymap
 
 
-def _merge_seeds_into_defaults():
-    path = _seed_config_path()
+class KeywordMatcher:
+    """分层关键词匹配器。
+
+    _state 为不可变快照 (自动机, keymap, 增量词, 墓碑词)，整体替换，
+    匹配线程无需加锁即可读到一致的状态。
+    version 在特征集合变化时递增（压实不改变特征集合，不递增）。
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._lock = threading.Lock()
+        self._state = None
+        self._seed_keys: Set[str] = set()
+        self._seed_lower: Set[str] = set()
+        self._compacted_learned: Set[str] = set()  # 已编译进自动机的学习特征
+        self._learned: Set[str] = set()  # 当前学习特征
+        self._compacting = False
+        self._generation = 0  # 每次全量重建递增，压实据此丢弃过期结果
+        self.compact_times: List[float] = []  # 每次压实耗时（毫秒）
+
+    @property
+    def ready(self) -> bool:
+        return self._state is not None
+
+    def rebuild(self, seed_keys: Iterable[str], learned: Iterable[str]):
+        """全量重建（种子变化时使用）"""
+        seed_keys = set(seed_keys)
+        learned = set(learned)
+        automaton, keymap = _build_automaton(seed_keys | learned)
+        with self._lock:
+            self._seed_keys = seed_keys
+            self._seed_lower = {str(k).lower() for k in seed_keys}
+            self._learned = learned
+            self._compacted_learned = set(learned)
+            self._state = (automaton, keymap, frozenset(), frozenset())
+            self._generation += 1
+            self.version += 1
+
+    def _publish(self, bump: bool = True):
+        # 调用方持有锁：根据当前学习特征与已编译集合计算增量与墓碑；
+        # 特征集合未变（压实）时 bump=False，不递增 version
+        automaton, keymap, _, _ = self._state
+        # 与种子词（忽略大小写）重复的学习特征始终由自动机匹配，不进增量/墓碑
+        seed_lower = self._seed_lower
+        delta = frozenset(
+            t.lower() for t in self._learned - self._compacted_learned
+        ).difference(seed_lower)
+        tombstones = frozenset(
+            t.lower() for t in self._compacted_learned - self._learned
+        ).difference(seed_lower)
+        self._state = (automaton, keymap, delta, tombstones)
+        if bump:
+            self.version += 1
+        return len(delta) + len(tombstones)
+
+    def add(self, terms: Iterable[str]):
+        with self._lock:
+            self._learned.update(terms)
+            if self._state is None:
+                # 尚未构建：首次匹配时由所属引擎按其特征分组全量构建
+                self.version += 1
+                return
+            pending = self._publish()
+        if pending > COMPACT_THRESHOLD:
+            self.compact(wait=False)
+
+    def remove(self, terms: Iterable[str]):
+        with self._lock:
+            self._learned.difference_update(terms)
+            if self._state is None:
+                self.version += 1
+                return
+            pending = self._publish()
+        if pending > COMPACT_THRESHOLD:
+            self.compact(wait=False)
+
+    def compact(self, wait: bool = True):
+        """把增量与墓碑并入新的自动机；wait=False 时在后台线程执行"""
+        with self._lock:
+            if self._compacting or self._state is None:
+                return
+            self._compacting = True
+            generation = self._generation
+            seed_keys = set(self._seed_keys)
+            learned = set(self._learned)
+
+        def _run():
+            t0 = time.perf_counter()
+            try:
+                automaton, keymap = _build_automaton(seed_keys | learned)
+                with self._lock:
+                    # 压实期间发生了全量重建：结果基于旧的种子，丢弃
+                    if generation == self._generation:
+                        # 压实期间可能又有增删，重新计算增量与墓碑
+                        self._compacted_learned = learned
+                        self._state = (automaton, keymap, frozenset(), frozenset())
+                        self._publish(bump=False)
+                        self.compact_times.append((time.perf_counter() - t0) * 1000)
+            finally:
+                with self._lock:
+                    self._compacting = False
+
+        if wait:
+            _run()
+        else:
+            threading.Thread(target=_run, name="ac-compact", daemon=True).start()
+
+    def pending(self) -> int:
+        _, _, delta, tombstones = self._state
+        return len(delta) + len(tombstones)
+
+    def match(self, text: str) -> Set[str]:
+        """返回文本中出现的关键词（原始大小写形式）"""
+        automaton, keymap, delta, tombstones = self._state
+        t = text.lower()
+        matched: Set[str] = set()
+        for _, payload in automaton.iter(t):
+            # payload 是 lower 形式
+            if payload in tombstones:
+                continue
+            matched.add(keymap.get(payload, payload))
+        for term in delta:
+            if term in t:
+                matched.add(term)
+        return matched
+
+
+_MATCHER = KeywordMatcher()
+
+
+def automaton_compaction_times() -> List[float]:
+    """默认引擎的关键词自动机各次压实的耗时（毫秒）"""
+    return list(_MATCHER.compact_times)
+
+
+def feature_set_version() -> int:
+    """关键词特征集合的版本号，学习特征增删后递增"""
+    return _MATCHER.version
+
+
+def _rebuild_automaton():
+    """按当前种子与学习特征全量重建关键词自动机"""
+    _MATCHER.rebuild(_seed_feature_keys(), FEATURE_GROUPS.get("_learned", []))
+
+
+def _apply_seed_config(
+    path: Path, groups: Dict, weights: Dict, summary: Dict
+) -> Tuple[bool, Optional[int]]:
+    """把种子配置文件合并进 groups / weights（原地修改），摘要写入 summary。
+    返回 (是否成功加载, 配置中的 token_budget；未指定时为 None)
+    """
     if not path.exists():
         # 无外置配置，统计基于内置
-        SEED_LOAD_SUMMARY.update(
+        summary.update(
             {
                 "mode": "builtin-only",
                 "seeds_groups": 0,
                 "seeds_weights": 0,
-                "final_features": len(DEFAULT_WEIGHTS),
+                "final_features": len(weights),
             }
         )
-        return
+        return False, None
     try:
         with open(path, "r", encoding="utf-8") as f:
             data = json.load(f)
     except Exception:
-        SEED_LOAD_SUMMARY.update(
+        summary.update(
             {
                 "mode": "load-error",
                 "seeds_groups": 0,
                 "seeds_weights": 0,
-                "final_features": len(DEFAULT_WEIGHTS),
+                "final_features": len(weights),
                 "tokenizer": "jieba",
                 "tokenizer_effective": "jieba",
             }
         )
-        return
+        return False, None
+
+    token_budget = None
+    try:
+        if "token_budget" in data:
+            token_budget = int(data["token_budget"])
+    except (TypeError, ValueError):
+        pass
 
-    groups = data.get("groups", {}) or {}
+    seed_groups = data.get("groups", {}) or {}
     weights_override = data.get("weights", {}) or {}
     mode = str(data.get("mode", "merge")).lower()
 
     # mode: replace -> 外置作为唯一真相，重置分组与默认权重
     if mode == "replace":
-        FEATURE_GROUPS.clear()
-        DEFAULT_WEIGHTS.clear()
+        groups.clear()
+        weights.clear()
         # 也允许回退到极简：若外置为空，则使用内置
-        if not groups and not weights_override:
-            FEATURE_GROUPS.update(deepcopy(BUILTIN_GROUPS))
-            DEFAULT_WEIGHTS.update(deepcopy(BUILTIN_DEFAULT_WEIGHTS))
+        if not seed_groups and not weights_override:
+            groups.update(deepcopy(BUILTIN_GROUPS))
+            weights.update(deepcopy(BUILTIN_DEFAULT_WEIGHTS))
             mode = "replace-empty-fallback"
 
     # 合并分组关键词（去重）
-    for group_name, key_list in groups.items():
+    for group_name, key_list in seed_groups.items():
         if not isinstance(key_list, list):
             continue
-        existing = set(FEATURE_GROUPS.get(group_name, []))
+        existing = set(groups.get(group_name, []))
         for k in key_list:
             try:
                 k_l = str(k).strip()
@@ -295,20 +560,20 @@ def _merge_seeds_into_defaults():
             if not k_l:
                 continue
             existing.add(k_l)
-        FEATURE_GROUPS[group_name] = sorted(existing)
+        groups[group_name] = sorted(existing)
 
     # 将分组新增的关键词赋默认权重
-    for group_name, key_list in FEATURE_GROUPS.items():
+    for group_name, key_list in groups.items():
         for k in key_list:
-            if k not in DEFAULT_WEIGHTS:
+            if k not in weights:
                 if group_name == "construction":
-                    DEFAULT_WEIGHTS[k] = -2.0
+                    weights[k] = -2.0
                 else:
-                    DEFAULT_WEIGHTS[k] = 1.5
+                    weights[k] = 1.5
 
     # 自定义权重：也将这些词加入到特征组，避免只在权重里但无法被提取
     if weights_override:
-        custom = set(FEATURE_GROUPS.get("_custom", []))
+        custom = set(groups.get("_custom", []))
         for k, w in weights_override.items():
             try:
                 k_l = str(k).strip()
@@ -317,24 +582,37 @@ def _merge_seeds_into_defaults():
                 continue
             if not k_l:
                 continue
-            DEFAULT_WEIGHTS[k_l] = w_f
+            weights[k_l] = w_f
             custom.add(k_l)
-        FEATURE_GROUPS["_custom"] = sorted(custom)
+        groups["_custom"] = sorted(custom)
 
-    SEED_LOAD_SUMMARY.update(
+    summary.update(
         {
             "mode": mode,
-            "seeds_groups": sum(len(v) for v in groups.values()) if groups else 0,
+            "seeds_groups": (
+                sum(len(v) for v in seed_groups.values()) if seed_groups else 0
+            ),
             "seeds_weights": len(weights_override),
-            "final_features": len(DEFAULT_WEIGHTS),
+            "final_features": len(weights),
             "tokenizer": "jieba",
             "tokenizer_effective": "jieba",
         }
     )
-    # 初始化分词资源（固定使用 jieba）
-    _init_tokenizer_resources()
-    # 构建关键词 AC 自动机
-    _rebuild_automaton()
+    return True, token_budget
+
+
+def _merge_seeds_into_defaults():
+    global TOKEN_STATS_BUDGET
+    loaded, token_budget = _apply_seed_config(
+        _seed_config_path(), FEATURE_GROUPS, DEFAULT_WEIGHTS, SEED_LOAD_SUMMARY
+    )
+    if token_budget is not None:
+        TOKEN_STATS_BUDGET = token_budget
+    if loaded:
+        # 初始化分词资源（固定使用 jieba；分词器本身延迟到首次使用时初始化）
+        _init_tokenizer_resources()
+        # 构建关键词 AC 自动机
+        _rebuild_automaton()
 
 
 # 在模块导入时合并外置种子
@@ -342,13 +620,7 @@ _merge_seeds_into_defaults()
 
 
 def get_seed_load_summary() -> str:
-    m = SEED_LOAD_SUMMARY.get("mode", "")
-    g = SEED_LOAD_SUMMARY.get("seeds_groups", 0)
-    w = SEED_LOAD_SUMMARY.get("seeds_weights", 0)
-    f = SEED_LOAD_SUMMARY.get("final_features", 0)
-    t = SEED_LOAD_SUMMARY.get("tokenizer", "jieba")
-    te = SEED_LOAD_SUMMARY.get("tokenizer_effective", "jieba")
-    return f"关键词加载: 模式={m}，外置组词={g}，外置权重={w}，最终特征数={f}，分词器={t}({te})"
+    return _DEFAULT_ENGINE.seed_load_summary()
 
 
 def sigmoid(x: float) -> float:
@@ -359,51 +631,105 @@ def sigmoid(x: float) -> float:
     return 1.0 / (1.0 + exp(-x))
 
 
+class WeightVector(MutableMapping):
+    """特征权重表：特征名 -> 整数 id，权重存放在 NumPy 向量中。
+
+    对外仍表现为 {特征名: 权重} 的映射，原有按名读写的代码无需修改；
+    批量打分（predict_many）直接按 id 向量化计算。删除的 id 会被复用。
+    """
+
+    def __init__(self, data: Optional[Dict[str, float]] = None):
+        self.index: Dict[str, int] = {}
+        self.values = np.zeros(64, dtype=np.float64)
+        self._free: List[int] = []
+        self._size = 0  # 已分配过的 id 数（含已删除待复用的）
+        if data:
+            for name, w in data.items():
+                self[name] = w
+
+    def _allocate(self) -> int:
+        if self._free:
+            return self._free.pop()
+        if self._size >= len(self.values):
+            grown = np.zeros(len(self.values) * 2, dtype=np.float64)
+            grown[: len(self.values)] = self.values
+            self.values = grown
+        fid = self._size
+        self._size += 1
+        return fid
+
+    def __getitem__(self, name: str) -> float:
+        return float(self.values[self.index[name]])
+
+    def get(self, name: str, default=None):
+        fid = self.index.get(name)
+        if fid is None:
+            return default
+        return float(self.values[fid])
+
+    def __setitem__(self, name: str, value: float):
+        fid = self.index.get(name)
+        if fid is None:
+            fid = self._allocate()
+            self.index[name] = fid
+        self.values[fid] = value
+
+    def __delitem__(self, name: str):
+        fid = self.index.pop(name)
+        self.values[fid] = 0.0
+        self._free.append(fid)
+
+    def __contains__(self, name) -> bool:
+        return name in self.index
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.index)
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def copy(self) -> "WeightVector":
+        other = WeightVector()
+        other.index = dict(self.index)
+        other.values = self.values.copy()
+        other._free = list(self._free)
+        other._size = self._size
+        return other
+
+    def to_dict(self) -> Dict[str, float]:
+        values = self.values
+        return {name: float(values[fid]) for name, fid in self.index.items()}
+
+    def lookup(self, names: Iterable[str]) -> np.ndarray:
+        """按特征名批量取权重（不存在的特征权重为 0）"""
+        index = self.index
+        ids = np.fromiter((index.get(name, -1) for name in names), dtype=np.int64)
+        # 末尾追加一个 0 作为“不存在”特征的取值
+        padded = np.append(self.values[: self._size], 0.0)
+        return padded[ids]
+
+
 def model_path_from_base(base_output_path: str) -> Path:
     p = Path(base_output_path)
     return p.parent / f"{p.stem}_hint_model.json"
 
 
-def load_hint_model(base_output_path: str) -> Dict:
-    path = model_path_from_base(base_output_path)
-    if not path.exists():
-        return {
-            "bias": DEFAULT_BIAS,
-            "weights": DEFAULT_WEIGHTS.copy(),
-            "token_stats": {},  # token -> {"pos": int, "neg": int}
-        }
-    try:
-        with open(path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        # 保护性合并（新关键词加入时）
-        weights = DEFAULT_WEIGHTS.copy()
-        weights.update(data.get("weights", {}))
-        # 保留所有字段，兼容增强版
-        result = {
-            "bias": data.get("bias", DEFAULT_BIAS),
-            "weights": weights,
-            "token_stats": data.get("token_stats", {}),
-        }
-        # 保留增强版字段
-        for key in ["n_updates", "tfidf"]:
-            if key in data:
-                result[key] = data[key]
-        return result
-    except Exception:
-        return {
-            "bias": DEFAULT_BIAS,
-            "weights": DEFAULT_WEIGHTS.copy(),
-            "token_stats": {},
-        }
+def binary_model_path_from_base(base_output_path: str) -> Path:
+    p = Path(base_output_path)
+    return p.parent / f"{p.stem}_hint_model.bin"
+
+
+def load_hint_model(base_output_path: str, use_mmap: bool = False) -> Dict:
+    """加载模型：优先读取二进制格式（*_hint_model.bin），没有时读取 JSON"""
+    return _DEFAULT_ENGINE.load_model(base_output_path, use_mmap, enhanced=False)
 
 
 def save_hint_model(base_output_path: str, model: Dict):
-    path = model_path_from_base(base_output_path)
-    try:
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(model, f, ensure_ascii=False, indent=2)
-    except Exception:
-        pass
+    """保存为二进制格式；JSON 可用 `python hint_store.py` 互转"""
+    path = binary_model_path_from_base(base_output_path)
+    # 下划线开头的键为运行时状态（如候选索引），不落盘
+    data = {k: v for k, v in model.items() if not k.startswith("_")}
+    write_hint_model_binary(path, data)
 
 
 def normalize_text(row) -> str:
@@ -422,24 +748,13 @@ def normalize_text(row) -> str:
     return "\n".join(parts).lower()
 
 
-def extract_features(row) -> Dict[str, int]:
-    text = normalize_text(row)
-    t = text.lower()
-    feats: Dict[str, int] = {}
-    A = _AC
-    if A is None:
-        _rebuild_automaton()
-        A = _AC
-    if A is None:
-        return feats
-    matched: Set[str] = set()
-    for _, payload in A.iter(t):
-        # payload 是 lower 形式
-        k = _AC_KEYMAP.get(payload, payload)
-        matched.add(k)
-    for k in matched:
-        feats[k] = 1
-    return feats
+def _match_keywords(text: str) -> Set[str]:
+    """匹配文本中出现的关键词（返回原始大小写形式）"""
+    return _DEFAULT_ENGINE.match_keywords(text)
+
+
+def extract_features(row, analysis: Optional["CaseAnalysis"] = None) -> Dict[str, int]:
+    return _DEFAULT_ENGINE.extract_features(row, analysis)
 
 
 # ---------------- 自学习关键词（轻量） ----------------
@@ -449,7 +764,7 @@ def _tokenize_for_learning(text: str) -> List[str]:
     # 固定使用 jieba 分词，辅以英文、数字+中文模式补充
     tokens: List[str] = []
     # jieba 中文/混合分词
-    for w in jieba.lcut(text, cut_all=False):
+    for w in _get_tokenizer().lcut(text, cut_all=False):
         w = w.strip().lower()
         if not w:
             continue
@@ -476,32 +791,105 @@ def _tokenize_for_learning(text: str) -> List[str]:
     return tokens
 
 
+# ---------------- 单案例分析缓存（每个案例只分词一次） ----------------
+
+# LRU 容量：覆盖当前案例、撤销回退的若干案例以及预取窗口
+CASE_CACHE_SIZE = 256
+
+
+class CaseAnalysis:
+    """单个案例的分析结果：规范化文本、分词结果、关键词命中。
+
+    分词结果与特征集合无关，首次访问时计算后一直复用；
+    关键词命中依赖引擎的特征集合，换用其他引擎或集合变化（matcher.version 递增）后重算。
+    """
+
+    __slots__ = ("key", "text", "_tokens", "_hits")
+
+    def __init__(self, text: str, key=None, tokens: Optional[List[str]] = None):
+        self.key = key
+        self.text = text
+        self._tokens = tokens
+        # (匹配器, 版本, 命中) 整体替换，多个线程/引擎并发读取时不会读到混合的状态
+        self._hits: Optional[Tuple[KeywordMatcher, int, Set[str]]] = None
+
+    @property
+    def tokens(self) -> List[str]:
+        if self._tokens is None:
+            self._tokens = _tokenize_for_learning(self.text)
+        return self._tokens
+
+    @property
+    def keyword_hits(self) -> Set[str]:
+        """默认引擎下的关键词命中"""
+        return self.hits_for(_DEFAULT_ENGINE)
+
+    def hits_for(self, engine: "HintEngine") -> Set[str]:
+        matcher = engine.matcher
+        version = matcher.version
+        cached = self._hits
+        if cached is not None and cached[0] is matcher and cached[1] == version:
+            return cached[2]
+        hits = engine.match_keywords(self.text)
+        self._hits = (matcher, version, hits)
+        return hits
+
+    def warm(self) -> "CaseAnalysis":
+        """预先完成分词与（默认引擎下的）关键词匹配，供后台预取调用"""
+        if self._tokens is None:
+            self._tokens = _tokenize_for_learning(self.text)
+        self.hits_for(_DEFAULT_ENGINE)
+        return self
+
+
+_ANALYSIS_CACHE: "OrderedDict[Tuple, CaseAnalysis]" = OrderedDict()
+_ANALYSIS_LOCK = threading.Lock()
+
+
+def analyze_case(row) -> CaseAnalysis:
+    """获取案例的分析结果（按 行索引 + 文本哈希 缓存，LRU 淘汰）"""
+    if isinstance(row, CaseAnalysis):
+        return row
+    text = normalize_text(row)
+    key = (getattr(row, "name", None), hash(text))
+    with _ANALYSIS_LOCK:
+        cached = _ANALYSIS_CACHE.get(key)
+        if cached is not None:
+            _ANALYSIS_CACHE.move_to_end(key)
+            return cached
+        analysis = CaseAnalysis(text, key)
+        _ANALYSIS_CACHE[key] = analysis
+        while len(_ANALYSIS_CACHE) > CASE_CACHE_SIZE:
+            _ANALYSIS_CACHE.popitem(last=False)
+    return analysis
+
+
+def clear_analysis_cache():
+    with _ANALYSIS_LOCK:
+        _ANALYSIS_CACHE.clear()
+
+
 def update_token_stats(
-    model: Dict, row, label_non_construction: int
+    model: Dict,
+    row,
+    label_non_construction: int,
+    analysis: Optional[CaseAnalysis] = None,
 ) -> Dict[str, Tuple[int, int]]:
     """根据当前案例与标签更新 token 统计，返回本次增量用于撤销。
     label_non_construction: 1=非建筑业, 0=建筑业
     返回: {token: (d_pos, d_neg)}
     """
-    if "token_stats" not in model:
-        model["token_stats"] = {}
-    text = normalize_text(row)
-    toks = _tokenize_for_learning(text)
-    delta: Dict[str, Tuple[int, int]] = {}
-    for tok in toks:
-        stat = model["token_stats"].setdefault(tok, {"pos": 0, "neg": 0})
-        if label_non_construction == 1:
-            stat["pos"] += 1
-            delta[tok] = (1, 0)
-        else:
-            stat["neg"] += 1
-            delta[tok] = (0, 1)
-    return delta
+    return _DEFAULT_ENGINE.with_model(model).update_token_stats(
+        row, label_non_construction, analysis
+    )
 
 
 def rollback_token_stats(model: Dict, delta: Dict[str, Tuple[int, int]]):
     if not delta:
         return
+    recent = model.get("_recent_deltas")
+    if recent and recent[-1] is delta:
+        recent.pop()
     stats = model.get("token_stats", {})
     for tok, (dp, dn) in delta.items():
         stat = stats.get(tok)
@@ -509,6 +897,49 @@ def rollback_token_stats(model: Dict, delta: Dict[str, Tuple[int, int]]):
             continue
         stat["pos"] = max(0, stat.get("pos", 0) - dp)
         stat["neg"] = max(0, stat.get("neg", 0) - dn)
+    index = model.get("_candidate_index")
+    if index is not None:
+        index.touch_many(delta)
+
+
+def _over_budget(size: int, budget: int) -> bool:
+    return budget > 0 and size > budget * (1 + PRUNE_SLACK)
+
+
+def _iter_counts(mapping) -> Iterator[Tuple[str, int]]:
+    """遍历 (token, 总计数)：token_stats 为 pos+neg，文档频率为 df"""
+    if isinstance(mapping, (TokenStats, DocFreq)):
+        for name, cols in mapping.iter_rows():
+            yield name, sum(cols)
+    else:
+        for name, value in mapping.items():
+            if isinstance(value, dict):
+                yield name, value.get("pos", 0) + value.get("neg", 0)
+            else:
+                yield name, value
+
+
+def prune_counts(mapping, budget: int, pinned: Set[str]) -> List[str]:
+    """按频次把计数表裁剪到 budget 条，返回被裁掉的 token。
+    计数低的先裁，同计数时先裁较早出现的；pinned 中的 token 保留。
+    """
+    excess = len(mapping) - budget
+    if excess <= 0:
+        return []
+    scored = [
+        (total, order, name)
+        for order, (name, total) in enumerate(_iter_counts(mapping))
+        if name not in pinned
+    ]
+    pruned = [name for _, _, name in heapq.nsmallest(excess, scored)]
+    for name in pruned:
+        del mapping[name]
+    return pruned
+
+
+def maybe_prune_token_stats(model: Dict, budget: Optional[int] = None) -> List[str]:
+    """token 统计超出容量上限（默认 TOKEN_STATS_BUDGET）时裁剪低频 token"""
+    return _DEFAULT_ENGINE.with_model(model).maybe_prune_token_stats(budget)
 
 
 def _log_odds(pos: int, neg: int, alpha: float = ALPHA) -> float:
@@ -517,63 +948,135 @@ def _log_odds(pos: int, neg: int, alpha: float = ALPHA) -> float:
     return log((pos + alpha) / (neg + alpha))
 
 
-def maybe_expand_features(model: Dict, max_add: int = 3) -> List[str]:
-    """基于 token 统计，筛选高判别力的 token 动态加入为特征，返回新增列表。
-    规则：总频次≥MIN_COUNT 且 |log_odds|≥阈值；初始权重=clip(log_odds, -3, 3)
+class CandidateIndex:
+    """自学习候选 token 的增量索引（供 maybe_expand_features 使用）。
+
+    只保存满足 总频次≥MIN_COUNT 且 |log_odds|≥阈值 的 token，
+    堆按 (总频次 降序, |log_odds| 降序, token_stats 插入顺序) 排列，
+    与全量扫描后稳定排序的结果一致。统计变化时只需 touch 受影响的 token。
     """
-    stats = model.get("token_stats", {})
-    weights = model.get("weights", {})
-    candidates: List[Tuple[str, float, int]] = []  # (token, log_odds, total)
-    for tok, st in stats.items():
-        total = st.get("pos", 0) + st.get("neg", 0)
+
+    def __init__(self, stats: Dict):
+        self.stats = stats
+        self.order: Dict[str, int] = {}  # token -> token_stats 中的插入顺序
+        self._next_order = 0
+        self.keys: Dict[str, Tuple[int, float, int]] = {}  # 当前合格 token -> 排序键
+        self.heap: List[Tuple[Tuple[int, float, int], str]] = []
+        # 已是特征（在 weights 中）的合格 token 暂存于此，移除特征时放回堆中
+        self.parked: Dict[str, Tuple[int, float, int]] = {}
+        if isinstance(stats, TokenStats):
+            # 二进制加载的统计：未改动的行直接由数组筛选并计算排序键，
+            # 改动过的 token 再逐个 touch
+            for tok, pos, neg, row in stats.candidates(
+                MIN_COUNT, ABS_LOG_ODDS_THRESH - 1e-9, ALPHA
+            ):
+                lo = _log_odds(pos, neg)
+                if abs(lo) >= ABS_LOG_ODDS_THRESH:
+                    self.keys[tok] = (-(pos + neg), -abs(lo), row)
+            # 有序列表本身就是合法的堆
+            self.heap = sorted((key, tok) for tok, key in self.keys.items())
+            for tok in stats.changed():
+                self.touch(tok)
+        else:
+            for tok in stats:
+                self.touch(tok)
+
+    def _order(self, tok: str) -> int:
+        if isinstance(self.stats, TokenStats):
+            return self.stats.position(tok)
+        return self.order[tok]
+
+    def _key(self, tok: str) -> Optional[Tuple[int, float, int]]:
+        st = self.stats.get(tok)
+        if not st:
+            return None
+        pos, neg = st.get("pos", 0), st.get("neg", 0)
+        total = pos + neg
         if total < MIN_COUNT:
-            continue
-        lo = _log_odds(st.get("pos", 0), st.get("neg", 0))
-        if abs(lo) >= ABS_LOG_ODDS_THRESH and tok not in weights:
-            candidates.append((tok, lo, total))
-    # 先按总频次，再按绝对 log_odds 排序，取前若干
-    candidates.sort(key=lambda x: (x[2], abs(x[1])), reverse=True)
-    added: List[str] = []
-    # 确保存在学习组
-    learned_set = set(FEATURE_GROUPS.get("_learned", []))
-
-    for tok, lo, _ in candidates[:max_add]:
-        # 初始权重按 log_odds 映射，并结合方向：正值=非建筑业；负值=建筑业
-        init_w = max(-3.0, min(3.0, lo))
-        weights[tok] = init_w
-        learned_set.add(tok)
-        added.append(tok)
-    model["weights"] = weights
-    FEATURE_GROUPS["_learned"] = sorted(learned_set)
-    # 新增学习特征后重建 AC 自动机
-    if added:
-        _rebuild_automaton()
-    return added
+            return None
+        lo = _log_odds(pos, neg)
+        if abs(lo) < ABS_LOG_ODDS_THRESH:
+            return None
+        return (-total, -abs(lo), self._order(tok))
+
+    def touch(self, tok: str):
+        if tok not in self.order and not isinstance(self.stats, TokenStats):
+            self.order[tok] = self._next_order
+            self._next_order += 1
+        key = self._key(tok)
+        if key is None:
+            self.keys.pop(tok, None)
+            self.parked.pop(tok, None)
+            return
+        if self.keys.get(tok) != key:
+            self.keys[tok] = key
+            self.parked.pop(tok, None)
+            heapq.heappush(self.heap, (key, tok))
+
+    def touch_many(self, tokens: Iterable[str]):
+        for tok in tokens:
+            self.touch(tok)
+        # 过期条目过多时重建堆
+        if len(self.heap) > 2 * len(self.keys) + 1024:
+            self.heap = [
+                (key, tok) for tok, key in self.keys.items() if tok not in self.parked
+            ]
+            heapq.heapify(self.heap)
+
+    def forget(self, tokens: Iterable[str]):
+        """token 已从统计中裁剪"""
+        for tok in tokens:
+            self.order.pop(tok, None)
+            self.keys.pop(tok, None)
+            self.parked.pop(tok, None)
+
+    def release(self, tok: str):
+        """token 不再是特征（撤销新增特征）时，重新作为候选"""
+        key = self.parked.pop(tok, None)
+        if key is not None and self.keys.get(tok) == key:
+            heapq.heappush(self.heap, (key, tok))
+
+    def top(self, weights, k: int) -> List[str]:
+        """取排序最靠前的 k 个不在 weights 中的候选"""
+        result: List[str] = []
+        popped: List[Tuple[Tuple[int, float, int], str]] = []
+        heap = self.heap
+        while heap and len(result) < k:
+            key, tok = heapq.heappop(heap)
+            if self.keys.get(tok) != key or tok in self.parked or tok in result:
+                continue  # 过期或重复条目
+            if tok in weights:
+                self.parked[tok] = key
+                continue
+            popped.append((key, tok))
+            result.append(tok)
+        for item in popped:
+            heapq.heappush(heap, item)
+        return result
+
+
+def _candidate_index(model: Dict) -> CandidateIndex:
+    stats = model.setdefault("token_stats", {})
+    index = model.get("_candidate_index")
+    # token_stats 被整体替换或绕过 update_token_stats 修改时，全量重建一次
+    if (
+        index is None
+        or index.stats is not stats
+        or (not isinstance(stats, TokenStats) and len(index.order) != len(stats))
+    ):
+        index = CandidateIndex(stats)
+        model["_candidate_index"] = index
+    return index
+
+
+def maybe_expand_features(model: Dict, max_add: int = 3) -> List[str]:
+    """基于 token 统计扩展学习特征（登记到 FEATURE_GROUPS["_learned"]），返回新增列表"""
+    return _DEFAULT_ENGINE.with_model(model).maybe_expand_features(max_add)
 
 
 def remove_learned_features(model: Dict, tokens: List[str]):
     """撤销时移除本次新加入的特征（仅限本次新增）。"""
-    if not tokens:
-        return
-    weights = model.get("weights", {})
-    for t in tokens:
-        if t in weights:
-            # 仅当该词来自学习组且不是内置/外置种子时移除
-            # 简单策略：如果不在任何分组（除了_learned和_custom）则留存；否则也可以保留。
-            # 这里按保守逻辑：只从weights删除，不动分组以避免影响其他流程。
-            try:
-                del weights[t]
-            except KeyError:
-                pass
-    model["weights"] = weights
-    # 从_learned分组移除
-    learned = set(FEATURE_GROUPS.get("_learned", []))
-    for t in tokens:
-        learned.discard(t)
-    FEATURE_GROUPS["_learned"] = sorted(learned)
-    # 学习特征移除后重建 AC 自动机
-    if tokens:
-        _rebuild_automaton()
+    _DEFAULT_ENGINE.with_model(model).remove_learned_features(tokens)
 
 
 def predict_non_construction_proba(
@@ -648,11 +1151,17 @@ class OnlineTFIDF:
 
         # 更新文档频率
         for tok in unique_tokens:
-            self.term_doc_freq[tok] += 1
+            self.term_doc_freq[tok] = self.term_doc_freq.get(tok, 0) + 1
             # 动态扩展词表（限制大小）
             if tok not in self.vocabulary and len(self.vocabulary) < self.max_features:
                 self.vocabulary[tok] = len(self.vocabulary)
 
+    def prune(self, budget: int) -> List[str]:
+        """文档频率表超出容量上限时按频次裁剪（词表中的词保留）"""
+        if not _over_budget(len(self.term_doc_freq), budget):
+            return []
+        return prune_counts(self.term_doc_freq, budget, set(self.vocabulary))
+
     def transform_one(self, tokens: List[str]) -> Dict[str, float]:
         """将文档转换为 TF-IDF 特征向量"""
         if self.doc_count == 0:
@@ -663,9 +1172,13 @@ class OnlineTFIDF:
         for tok in tokens:
             if tok in self.vocabulary:
                 term_count[tok] += 1
+        return self.transform_counts(term_count, len(tokens))
 
-        total_terms = len(tokens)
-        if total_terms == 0:
+    def transform_counts(
+        self, term_count: Dict[str, int], total_terms: int
+    ) -> Dict[str, float]:
+        """由词频计算 TF-IDF 特征（total_terms 为文档总词数，含词表外的词）"""
+        if self.doc_count == 0 or total_terms == 0:
             return {}
 
         # 计算 TF-IDF
@@ -690,7 +1203,7 @@ class OnlineTFIDF:
     def to_dict(self) -> Dict:
         return {
             "doc_count": self.doc_count,
-            "term_doc_freq": dict(self.term_doc_freq),
+            "term_doc_freq": self.term_doc_freq,
             "vocabulary": self.vocabulary,
             "max_features": self.max_features,
         }
@@ -699,34 +1212,20 @@ class OnlineTFIDF:
     def from_dict(cls, data: Dict):
         obj = cls(max_features=data.get("max_features", 300))
         obj.doc_count = data.get("doc_count", 0)
-        obj.term_doc_freq = defaultdict(int, data.get("term_doc_freq", {}))
+        term_doc_freq = data.get("term_doc_freq", {})
+        # 二进制加载的文档频率（DocFreq）按需查找，不展开成字典
+        if not isinstance(term_doc_freq, DocFreq):
+            term_doc_freq = defaultdict(int, term_doc_freq)
+        obj.term_doc_freq = term_doc_freq
         obj.vocabulary = data.get("vocabulary", {})
         return obj
 
 
-def extract_features_enhanced(model: Dict, row) -> Dict[str, float]:
+def extract_features_enhanced(
+    model: Dict, row, analysis: Optional[CaseAnalysis] = None
+) -> Dict[str, float]:
     """增强版特征提取：关键词特征 + TF-IDF 特征"""
-    # 1. 原有关键词特征（二值）
-    keyword_feats = extract_features(row)
-
-    # 2. TF-IDF 特征（连续值）
-    tfidf_module = model.get("tfidf")
-    if tfidf_module is None:
-        # 首次使用，初始化
-        tfidf_module = OnlineTFIDF(max_features=300)
-        model["tfidf"] = tfidf_module
-
-    text = normalize_text(row)
-    tokens = _tokenize_for_learning(text)
-    tfidf_feats = tfidf_module.transform_one(tokens)
-
-    # 合并特征（关键词权重为1，TF-IDF权重为实际值）
-    all_feats: Dict[str, float] = {}
-    for k, v in keyword_feats.items():
-        all_feats[k] = float(v)
-    all_feats.update(tfidf_feats)
-
-    return all_feats
+    return _DEFAULT_ENGINE.with_model(model).extract_features_enhanced(row, analysis)
 
 
 def predict_non_construction_proba_enhanced(
@@ -750,77 +1249,559 @@ def predict_non_construction_proba_enhanced(
     return p, contributions[:5]
 
 
+class FeatureMatrix:
+    """稀疏特征矩阵（CSR）：每行一个案例，列为 names 中的特征名"""
+
+    __slots__ = ("names", "indptr", "indices", "data")
+
+    def __init__(
+        self,
+        names: List[str],
+        indptr: np.ndarray,
+        indices: np.ndarray,
+        data: np.ndarray,
+    ):
+        self.names = names
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+
+    @property
+    def n_rows(self) -> int:
+        return len(self.indptr) - 1
+
+    @classmethod
+    def from_feature_dicts(cls, feature_dicts: Iterable[Dict[str, float]]):
+        column: Dict[str, int] = {}
+        indptr: List[int] = [0]
+        indices: List[int] = []
+        data: List[float] = []
+        for feats in feature_dicts:
+            for name, x in feats.items():
+                if x == 0:
+                    continue
+                col = column.get(name)
+                if col is None:
+                    col = column[name] = len(column)
+                indices.append(col)
+                data.append(x)
+            indptr.append(len(indices))
+        return cls(
+            list(column),
+            np.asarray(indptr, dtype=np.int64),
+            np.asarray(indices, dtype=np.int64),
+            np.asarray(data, dtype=np.float64),
+        )
+
+
+def build_feature_matrix(model: Dict, rows) -> FeatureMatrix:
+    """为一批案例（DataFrame、行或 CaseAnalysis 的序列）构建增强版特征矩阵"""
+    return _DEFAULT_ENGINE.with_model(model).build_feature_matrix(rows)
+
+
+def _sigmoid_array(z: np.ndarray) -> np.ndarray:
+    # 与 sigmoid() 相同的截断规则
+    out = 1.0 / (1.0 + np.exp(-np.clip(z, -50.0, 50.0)))
+    out[z < -50] = 0.0
+    out[z > 50] = 1.0
+    return out
+
+
+def predict_many(model: Dict, X) -> np.ndarray:
+    """批量预测非建筑业概率，一次稀疏矩阵-向量乘法完成。
+
+    X 可以是：
+    - FeatureMatrix（列为特征名，按名对齐权重）；
+    - 具有 indptr/indices/data 属性的 CSR 矩阵（列号即 WeightVector 的特征 id）；
+    - 案例序列或 DataFrame（先提取特征再打分）。
+    """
+    if not isinstance(X, FeatureMatrix) and not hasattr(X, "indptr"):
+        X = build_feature_matrix(model, X)
+    weights = model["weights"]
+    if not isinstance(weights, WeightVector):
+        weights = WeightVector(weights)
+    if isinstance(X, FeatureMatrix):
+        col_w = weights.lookup(X.names)
+    else:
+        col_w = weights.values
+    indptr = np.asarray(X.indptr, dtype=np.int64)
+    n_rows = len(indptr) - 1
+    row_ids = np.repeat(np.arange(n_rows), np.diff(indptr))
+    contrib = np.asarray(X.data, dtype=np.float64) * col_w[np.asarray(X.indices)]
+    z = model.get("bias", 0.0) + np.bincount(row_ids, weights=contrib, minlength=n_rows)
+    return _sigmoid_array(z)
+
+
 def update_model_online_enhanced(
-    model: Dict, row, features: Dict[str, float], label_non_construction: int
+    model: Dict,
+    row,
+    features: Dict[str, float],
+    label_non_construction: int,
+    analysis: Optional[CaseAnalysis] = None,
 ) -> Dict:
     """增强版在线更新（L2正则化 + 自适应学习率）"""
-    # 记录训练次数（用于自适应学习率）
-    n_updates = model.get("n_updates", 0) + 1
-    model["n_updates"] = n_updates
+    return _DEFAULT_ENGINE.with_model(model).update_online_enhanced(
+        row, features, label_non_construction, analysis
+    )
 
-    # 自适应学习率：lr_t = lr_0 / sqrt(t)
-    adaptive_lr = LEARNING_RATE / sqrt(n_updates)
 
-    # L2 正则化系数
-    l2_lambda = 0.01
+def load_hint_model_enhanced(base_output_path: str, use_mmap: bool = False) -> Dict:
+    """加载增强版模型（兼容旧版）"""
+    return _DEFAULT_ENGINE.load_model(base_output_path, use_mmap, enhanced=True)
 
-    # 预测
-    p, _ = predict_non_construction_proba_enhanced(model, features)
-    error = label_non_construction - p
 
-    # 更新偏置
-    delta_bias = adaptive_lr * error
-    model["bias"] = model.get("bias", 0.0) + delta_bias
+def load_hint_model_file(model_file: str, use_mmap: bool = False) -> Dict:
+    """读取指定的模型文件（*_hint_model.bin 或 .json）为增强版模型，读取失败时抛出异常"""
+    return _DEFAULT_ENGINE.load_model_file(Path(model_file), use_mmap, enhanced=True)
 
-    # 更新权重（带 L2 正则化）
-    delta_w: Dict[str, float] = {}
-    for name, x in features.items():
-        if x == 0:
-            continue
-        old_w = model["weights"].get(name, 0.0)
-        # 梯度 = error * x - l2_lambda * w
-        gradient = error * x - l2_lambda * old_w
-        dw = adaptive_lr * gradient
-        model["weights"][name] = old_w + dw
-        delta_w[name] = dw
 
-    # 更新 TF-IDF 模块
-    tfidf_module = model.get("tfidf")
-    if tfidf_module is not None:
-        text = normalize_text(row)
-        tokens = _tokenize_for_learning(text)
-        tfidf_module.learn_one(tokens)
+def save_hint_model_enhanced(base_output_path: str, model: Dict):
+    """保存增强版模型（连同默认引擎的学习特征列表）"""
+    _DEFAULT_ENGINE.with_model(model).save(base_output_path)
 
-    return {"bias": delta_bias, "weights": delta_w}
 
+# ==================== 智能提示引擎 ====================
 
-def load_hint_model_enhanced(base_output_path: str) -> Dict:
-    """加载增强版模型（兼容旧版）"""
-    model = load_hint_model(base_output_path)
 
-    # 确保 bias 字段存在
-    if "bias" not in model:
-        model["bias"] = 0.0
+class HintEngine:
+    """智能提示引擎：一个模型及其种子配置、关键词匹配器与学习特征分组。
 
-    # 确保 n_updates 字段存在
-    if "n_updates" not in model:
-        model["n_updates"] = 0
+    每个引擎的学习特征只登记在自己的 feature_groups["_learned"] 与匹配器中，
+    多个模型（多个评估配置、每位标注员各自的模型）可以在同一进程中独立训练与打分。
+    分词器、停用词与案例分析缓存中的分词结果与特征集合无关，所有引擎共用。
+    模块级函数（extract_features_enhanced、maybe_expand_features 等）作用于默认引擎，
+    其种子配置就是模块变量 FEATURE_GROUPS / DEFAULT_WEIGHTS。
+    """
+
+    def __init__(self, model: Optional[Dict] = None, seed_config=None):
+        """从内置关键词出发合并种子配置（默认 data/config/keyword_seeds.json），
+        构建独立的匹配器；model 为 None 时使用默认模型"""
+        groups = deepcopy(BUILTIN_GROUPS)
+        weights = deepcopy(BUILTIN_DEFAULT_WEIGHTS)
+        summary = _new_seed_summary()
+        path = _seed_config_path() if seed_config is None else Path(seed_config)
+        _, token_budget = _apply_seed_config(path, groups, weights, summary)
+        self._init_state(groups, weights, summary, KeywordMatcher(), token_budget)
+        self.rebuild_automaton()
+        self.model = self.new_model() if model is None else model
+
+    def _init_state(
+        self,
+        feature_groups: Dict,
+        default_weights: Dict,
+        seed_summary: Dict,
+        matcher: KeywordMatcher,
+        token_budget: Optional[int],
+    ):
+        self.feature_groups = feature_groups
+        self.default_weights = default_weights
+        self.seed_summary = seed_summary
+        self.matcher = matcher
+        # None 表示沿用模块变量 TOKEN_STATS_BUDGET
+        self._token_budget = token_budget
 
-    # 如果存在 TF-IDF 数据，恢复为对象
-    if "tfidf" in model and isinstance(model["tfidf"], dict):
-        model["tfidf"] = OnlineTFIDF.from_dict(model["tfidf"])
-    elif "tfidf" not in model:
-        model["tfidf"] = OnlineTFIDF(max_features=300)
+    @classmethod
+    def _from_state(cls, *state, model: Optional[Dict] = None) -> "HintEngine":
+        engine = cls.__new__(cls)
+        engine._init_state(*state)
+        engine.model = model
+        return engine
 
-    return model
+    @classmethod
+    def load(
+        cls,
+        base_output_path: str,
+        use_mmap: bool = False,
+        enhanced: bool = True,
+        seed_config=None,
+    ) -> "HintEngine":
+        """新建引擎并加载 base_output_path 对应的模型（不存在时为默认模型）"""
+        engine = cls(model={}, seed_config=seed_config)
+        engine.model = engine.load_model(base_output_path, use_mmap, enhanced)
+        return engine
+
+    def with_model(self, model: Dict) -> "HintEngine":
+        """共用本引擎的种子配置、匹配器与学习特征分组，换用另一份模型"""
+        return HintEngine._from_state(
+            self.feature_groups,
+            self.default_weights,
+            self.seed_summary,
+            self.matcher,
+            self._token_budget,
+            model=model,
+        )
 
+    @property
+    def token_budget(self) -> int:
+        if self._token_budget is None:
+            return TOKEN_STATS_BUDGET
+        return self._token_budget
 
-def save_hint_model_enhanced(base_output_path: str, model: Dict):
-    """保存增强版模型"""
-    # 序列化 TF-IDF 模块
-    model_copy = model.copy()
-    tfidf_module = model_copy.get("tfidf")
-    if tfidf_module is not None and hasattr(tfidf_module, "to_dict"):
-        model_copy["tfidf"] = tfidf_module.to_dict()
-
-    save_hint_model(base_output_path, model_copy)
+    # ---------------- 关键词集合与匹配 ----------------
+
+    def seed_feature_keys(self) -> Set[str]:
+        # 使用默认权重的键覆盖所有内置/外置种子特征
+        return set(self.default_weights).union(self.feature_groups.get("_custom", []))
+
+    def all_feature_keys(self) -> Set[str]:
+        return self.seed_feature_keys().union(self.feature_groups.get("_learned", []))
+
+    def rebuild_automaton(self):
+        """按当前种子与学习特征全量重建关键词自动机"""
+        self.matcher.rebuild(
+            self.seed_feature_keys(), self.feature_groups.get("_learned", [])
+        )
+
+    @property
+    def version(self) -> int:
+        """关键词特征集合的版本号，学习特征增删后递增"""
+        return self.matcher.version
+
+    def match_keywords(self, text: str) -> Set[str]:
+        """匹配文本中出现的关键词（返回原始大小写形式）"""
+        if not self.matcher.ready:
+            self.rebuild_automaton()
+        return self.matcher.match(text)
+
+    def seed_load_summary(self) -> str:
+        s = self.seed_summary
+        return (
+            f"关键词加载: 模式={s.get('mode', '')}，外置组词={s.get('seeds_groups', 0)}，"
+            f"外置权重={s.get('seeds_weights', 0)}，最终特征数={s.get('final_features', 0)}，"
+            f"分词器={s.get('tokenizer', 'jieba')}({s.get('tokenizer_effective', 'jieba')})"
+        )
+
+    # ---------------- 模型加载与保存 ----------------
+
+    def new_model(self, enhanced: bool = True) -> Dict:
+        model = {
+            "bias": DEFAULT_BIAS,
+            "weights": WeightVector(self.default_weights),
+            "token_stats": {},  # token -> {"pos": int, "neg": int}
+        }
+        if enhanced:
+            model["n_updates"] = 0
+            model["tfidf"] = OnlineTFIDF(max_features=300)
+        return model
+
+    def load_model(
+        self, base_output_path: str, use_mmap: bool = False, enhanced: bool = True
+    ) -> Dict:
+        """加载模型：优先读取二进制格式（*_hint_model.bin），没有时读取 JSON；
+        都不存在时为默认模型。二进制文件损坏时报错，不退回旧版 JSON"""
+        for path in (
+            binary_model_path_from_base(base_output_path),
+            model_path_from_base(base_output_path),
+        ):
+            if path.exists():
+                return self.load_model_file(path, use_mmap, enhanced)
+        self.set_learned([])
+        model = self.new_model(enhanced=False)
+        return self._complete_model(model) if enhanced else model
+
+    def load_model_file(
+        self, path: Path, use_mmap: bool = False, enhanced: bool = True
+    ) -> Dict:
+        """读取指定的模型文件（.bin 或 .json），读取失败时抛出异常；
+        enhanced=True 时补齐增强版字段（兼容旧版）"""
+        path = Path(path)
+        if path.suffix == ".bin":
+            try:
+                data = read_hint_model_binary(path, use_mmap=use_mmap)
+            except Exception as e:
+                raise ValueError(f"模型文件损坏: {path}（{e}）") from e
+        else:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        # 保护性合并（新关键词加入时）
+        weights = self.default_weights.copy()
+        weights.update(data.get("weights", {}))
+        # 保留所有字段，兼容增强版
+        model = {
+            "bias": data.get("bias", DEFAULT_BIAS),
+            "weights": WeightVector(weights),
+            "token_stats": data.get("token_stats", {}),
+        }
+        # 保留增强版字段
+        for key in ["n_updates", "tfidf"]:
+            if key in data:
+                model[key] = data[key]
+        # 训练时扩展出的学习特征需重新登记，否则匹配不到、权重不生效
+        self.set_learned(data.get("learned", []))
+        return self._complete_model(model) if enhanced else model
+
+    def _complete_model(self, model: Dict) -> Dict:
+        # 确保 bias 字段存在
+        if "bias" not in model:
+            model["bias"] = 0.0
+        # 确保 n_updates 字段存在
+        if "n_updates" not in model:
+            model["n_updates"] = 0
+        # 如果存在 TF-IDF 数据，恢复为对象
+        if "tfidf" in model and isinstance(model["tfidf"], dict):
+            model["tfidf"] = OnlineTFIDF.from_dict(model["tfidf"])
+        elif "tfidf" not in model:
+            model["tfidf"] = OnlineTFIDF(max_features=300)
+        return model
+
+    def save(self, base_output_path: str):
+        """保存模型；学习特征列表存为 learned 字段，加载时重新登记"""
+        model_copy = self.model.copy()
+        # 序列化 TF-IDF 模块
+        tfidf_module = model_copy.get("tfidf")
+        if tfidf_module is not None and hasattr(tfidf_module, "to_dict"):
+            model_copy["tfidf"] = tfidf_module.to_dict()
+        model_copy["learned"] = sorted(self.feature_groups.get("_learned", []))
+        save_hint_model(base_output_path, model_copy)
+
+    def set_learned(self, terms: Iterable[str]):
+        """以模型文件中的学习特征替换本引擎的学习特征分组，并重建匹配器"""
+        learned = sorted(set(terms))
+        if learned == self.feature_groups.get("_learned") and self.matcher.ready:
+            return
+        self.feature_groups["_learned"] = learned
+        self.rebuild_automaton()
+
+    # ---------------- 特征与预测 ----------------
+
+    def extract_features(
+        self, row, analysis: Optional[CaseAnalysis] = None
+    ) -> Dict[str, int]:
+        if analysis is None:
+            analysis = analyze_case(row)
+        return {k: 1 for k in analysis.hits_for(self)}
+
+    def extract_features_enhanced(
+        self, row, analysis: Optional[CaseAnalysis] = None
+    ) -> Dict[str, float]:
+        """增强版特征提取：关键词特征 + TF-IDF 特征"""
+        model = self.model
+        if analysis is None:
+            analysis = analyze_case(row)
+        # 1. 原有关键词特征（二值）
+        keyword_feats = self.extract_features(row, analysis)
+
+        # 2. TF-IDF 特征（连续值）
+        tfidf_module = model.get("tfidf")
+        if tfidf_module is None:
+            # 首次使用，初始化
+            tfidf_module = OnlineTFIDF(max_features=300)
+            model["tfidf"] = tfidf_module
+
+        tfidf_feats = tfidf_module.transform_one(analysis.tokens)
+
+        # 合并特征（关键词权重为1，TF-IDF权重为实际值）
+        all_feats: Dict[str, float] = {}
+        for k, v in keyword_feats.items():
+            all_feats[k] = float(v)
+        all_feats.update(tfidf_feats)
+
+        return all_feats
+
+    def predict(
+        self, features: Dict[str, int]
+    ) -> Tuple[float, List[Tuple[str, float]]]:
+        return predict_non_construction_proba(self.model, features)
+
+    def predict_enhanced(
+        self, features: Dict[str, float]
+    ) -> Tuple[float, List[Tuple[str, float]]]:
+        return predict_non_construction_proba_enhanced(self.model, features)
+
+    def build_feature_matrix(self, rows) -> FeatureMatrix:
+        """为一批案例（DataFrame、行或 CaseAnalysis 的序列）构建增强版特征矩阵"""
+        if hasattr(rows, "iterrows"):
+            rows = (row for _, row in rows.iterrows())
+        return FeatureMatrix.from_feature_dicts(
+            self.extract_features_enhanced(row) for row in rows
+        )
+
+    def predict_many(self, X) -> np.ndarray:
+        """批量预测非建筑业概率（X 的形式见 predict_many）。
+        只读取模型，多个线程可以共用一个引擎并发打分"""
+        if not isinstance(X, FeatureMatrix) and not hasattr(X, "indptr"):
+            X = self.build_feature_matrix(X)
+        return predict_many(self.model, X)
+
+    # ---------------- 在线更新 ----------------
+
+    def update_online(self, features: Dict[str, int], label_non_construction: int):
+        return update_model_online(self.model, features, label_non_construction)
+
+    def update_online_enhanced(
+        self,
+        row,
+        features: Dict[str, float],
+        label_non_construction: int,
+        analysis: Optional[CaseAnalysis] = None,
+    ) -> Dict:
+        """增强版在线更新（L2正则化 + 自适应学习率）"""
+        model = self.model
+        # 记录训练次数（用于自适应学习率）
+        n_updates = model.get("n_updates", 0) + 1
+        model["n_updates"] = n_updates
+
+        # 自适应学习率：lr_t = lr_0 / sqrt(t)
+        adaptive_lr = LEARNING_RATE / sqrt(n_updates)
+
+        # 预测
+        p, _ = predict_non_construction_proba_enhanced(model, features)
+        error = label_non_construction - p
+
+        # 更新偏置
+        delta_bias = adaptive_lr * error
+        model["bias"] = model.get("bias", 0.0) + delta_bias
+
+        # 更新权重（带 L2 正则化）
+        delta_w: Dict[str, float] = {}
+        for name, x in features.items():
+            if x == 0:
+                continue
+            old_w = model["weights"].get(name, 0.0)
+            # 梯度 = error * x - L2_LAMBDA * w
+            gradient = error * x - L2_LAMBDA * old_w
+            dw = adaptive_lr * gradient
+            model["weights"][name] = old_w + dw
+            delta_w[name] = dw
+
+        # 更新 TF-IDF 模块
+        tfidf_module = model.get("tfidf")
+        if tfidf_module is not None:
+            if analysis is None:
+                analysis = analyze_case(row)
+            tfidf_module.learn_one(analysis.tokens)
+            tfidf_module.prune(self.token_budget)
+
+        return {"bias": delta_bias, "weights": delta_w}
+
+    def rollback_update(self, delta: Dict):
+        rollback_update(self.model, delta)
+
+    def update_token_stats(
+        self,
+        row,
+        label_non_construction: int,
+        analysis: Optional[CaseAnalysis] = None,
+    ) -> Dict[str, Tuple[int, int]]:
+        """根据当前案例与标签更新 token 统计，返回本次增量用于撤销。
+        label_non_construction: 1=非建筑业, 0=建筑业
+        返回: {token: (d_pos, d_neg)}
+        """
+        model = self.model
+        if "token_stats" not in model:
+            model["token_stats"] = {}
+        if analysis is None:
+            analysis = analyze_case(row)
+        toks = analysis.tokens
+        stats = model["token_stats"]
+        delta: Dict[str, Tuple[int, int]] = {}
+        for tok in toks:
+            stat = stats.setdefault(tok, {"pos": 0, "neg": 0})
+            dp, dn = delta.get(tok, (0, 0))
+            # 同一 token 在案例中多次出现时累计增量，保证撤销时能精确回滚
+            if label_non_construction == 1:
+                stat["pos"] += 1
+                delta[tok] = (dp + 1, dn)
+            else:
+                stat["neg"] += 1
+                delta[tok] = (dp, dn + 1)
+        index = model.get("_candidate_index")
+        if index is not None:
+            index.touch_many(delta)
+        recent = model.get("_recent_deltas")
+        if recent is None:
+            recent = model["_recent_deltas"] = deque(maxlen=UNDO_WINDOW)
+        recent.append(delta)
+        self.maybe_prune_token_stats()
+        return delta
+
+    def rollback_token_stats(self, delta: Dict[str, Tuple[int, int]]):
+        rollback_token_stats(self.model, delta)
+
+    def maybe_prune_token_stats(self, budget: Optional[int] = None) -> List[str]:
+        """token 统计超出容量上限时裁剪低频 token。
+        已是特征的 token 与最近 UNDO_WINDOW 次更新涉及的 token 不裁剪。
+        """
+        model = self.model
+        budget = self.token_budget if budget is None else budget
+        stats = model.get("token_stats", {})
+        if not _over_budget(len(stats), budget):
+            return []
+        pinned = set(model.get("weights", {}))
+        for delta in model.get("_recent_deltas", ()):
+            pinned.update(delta)
+        pruned = prune_counts(stats, budget, pinned)
+        index = model.get("_candidate_index")
+        if index is not None:
+            index.forget(pruned)
+        return pruned
+
+    # ---------------- 学习特征 ----------------
+
+    def maybe_expand_features(self, max_add: int = 3) -> List[str]:
+        """基于 token 统计，筛选高判别力的 token 动态加入为特征，返回新增列表。
+        规则：总频次≥MIN_COUNT 且 |log_odds|≥阈值；初始权重=clip(log_odds, -3, 3)
+        候选由 CandidateIndex 增量维护，先按总频次、再按绝对 log_odds 取前若干。
+        """
+        model = self.model
+        stats = model.setdefault("token_stats", {})
+        weights = model.get("weights", {})
+        index = _candidate_index(model)
+        added: List[str] = []
+        # 确保存在学习组
+        learned_set = set(self.feature_groups.get("_learned", []))
+
+        for tok in index.top(weights, max_add):
+            st = stats[tok]
+            lo = _log_odds(st.get("pos", 0), st.get("neg", 0))
+            # 初始权重按 log_odds 映射，并结合方向：正值=非建筑业；负值=建筑业
+            init_w = max(-3.0, min(3.0, lo))
+            weights[tok] = init_w
+            learned_set.add(tok)
+            added.append(tok)
+        model["weights"] = weights
+        self.feature_groups["_learned"] = sorted(learned_set)
+        # 新增学习特征加入匹配器的增量层
+        if added:
+            self.matcher.add(added)
+        return added
+
+    def remove_learned_features(self, tokens: List[str]):
+        """撤销时移除本次新加入的特征（仅限本次新增）。"""
+        if not tokens:
+            return
+        model = self.model
+        weights = model.get("weights", {})
+        for t in tokens:
+            if t in weights:
+                # 仅当该词来自学习组且不是内置/外置种子时移除
+                # 简单策略：如果不在任何分组（除了_learned和_custom）则留存；否则也可以保留。
+                # 这里按保守逻辑：只从weights删除，不动分组以避免影响其他流程。
+                try:
+                    del weights[t]
+                except KeyError:
+                    pass
+        model["weights"] = weights
+        # 从_learned分组移除
+        learned = set(self.feature_groups.get("_learned", []))
+        for t in tokens:
+            learned.discard(t)
+        self.feature_groups["_learned"] = sorted(learned)
+        # 移除的特征重新成为候选
+        index = model.get("_candidate_index")
+        if index is not None:
+            for t in tokens:
+                index.release(t)
+        # 学习特征移除后从匹配器中撤下
+        self.matcher.remove(tokens)
+
+
+# 默认引擎：种子配置即模块变量，模块级函数都作用于它
+_DEFAULT_ENGINE = HintEngine._from_state(
+    FEATURE_GROUPS, DEFAULT_WEIGHTS, SEED_LOAD_SUMMARY, _MATCHER, None
+)
+
+
+def default_engine() -> HintEngine:
+    """模块级函数使用的默认引擎"""
+    return _DEFAULT_ENGINE
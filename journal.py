@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+标注日志：每次标注、跳过、撤销都以一行 JSON 追加到日志文件并立即 fsync，
+取代每 10 条全量重写 Parquet/CSV 的自动保存。
+
+- 续标时先读取上次压实的快照（或原始文件），再按顺序重放日志；
+- 退出时（或手动执行本脚本）将日志压实进 Parquet/CSV，然后清空日志。
+
+日志记录的是绝对值（案例最终被设置成什么），重放是幂等的：
+压实写完快照但尚未清空日志时中断，下次重放得到的结果相同。
+
+手动压实：
+    python journal.py data/annotated/accident_cases_annotated_张三
+"""
+
+import argparse
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+
+from case_store import LabeledCases
+
+
+def journal_path_from_base(base_output_path: str) -> Path:
+    p = Path(base_output_path)
+    return p.parent / f"{p.stem}_journal.jsonl"
+
+
+class AnnotationJournal:
+    """追加写入的标注日志（JSON Lines）"""
+
+    def __init__(self, base_output_path: str, annotator: str = ""):
+        self.path = journal_path_from_base(base_output_path)
+        self.annotator = annotator
+        self._file = open(self.path, "a", encoding="utf-8")
+
+    def append(self, op: str, index: int, value, position: int):
+        """记录一次事件并落盘。
+
+        op: label / skip / undo
+        value: 事件后该案例的 is_construction 值（撤销为 None）
+        position: 事件后的标注进度位置（current_index）
+        """
+        record = {
+            "op": op,
+            "i": int(index),
+            "v": None if value is None else int(value),
+            "pos": int(position),
+            "ts": round(time.time(), 3),
+            "who": self.annotator,
+        }
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def truncate(self):
+        """压实完成后清空日志"""
+        self._file.seek(0)
+        self._file.truncate()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        if not self._file.closed:
+            self._file.close()
+
+
+def read_journal(base_output_path: str) -> List[Dict]:
+    """读取日志记录；末尾因崩溃写了一半的行会被忽略"""
+    path = journal_path_from_base(base_output_path)
+    if not path.exists():
+        return []
+    records: List[Dict] = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    return records
+
+
+def replay_journal(cases: LabeledCases, records: List[Dict]) -> Optional[int]:
+    """将日志重放到标注数组上，返回最后记录的进度位置（无记录返回 None）"""
+    if not records:
+        return None
+    for rec in records:
+        if 0 <= rec["i"] < len(cases):
+            cases.set_label(rec["i"], rec.get("v"))
+    return records[-1].get("pos")
+
+
+def compact_journal(base_output_path: str):
+    """手动压实：读取快照，重放日志，写回 Parquet/CSV 并清空日志"""
+    from utils import save_progress
+
+    base = Path(base_output_path)
+    parquet_path = base.with_suffix(".parquet")
+    csv_path = base.with_suffix(".csv")
+    if parquet_path.exists():
+        cases = LabeledCases.open(parquet_path)
+    elif csv_path.exists():
+        cases = LabeledCases.from_frame(pd.read_csv(csv_path, encoding="utf-8-sig"))
+    else:
+        raise SystemExit(f"未找到标注快照: {parquet_path} / {csv_path}")
+
+    records = read_journal(base_output_path)
+    if not records:
+        print("日志为空，无需压实")
+        return
+    position = replay_journal(cases, records)
+    print(f"重放 {len(records)} 条日志记录")
+    if save_progress(cases, base_output_path, position or 0):
+        journal = AnnotationJournal(base_output_path)
+        journal.truncate()
+        journal.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="将标注日志压实进 Parquet/CSV")
+    parser.add_argument(
+        "base",
+        help="标注文件基础路径（如 data/annotated/accident_cases_annotated_张三）",
+    )
+    args = parser.parse_args()
+    base = args.base
+    for suffix in (".parquet", ".csv"):
+        if base.endswith(suffix):
+            base = base[: -len(suffix)]
+    compact_journal(base)
+
+
+if __name__ == "__main__":
+    main()
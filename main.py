@@ -1,9 +1,15 @@
-import random
+import argparse
+import cProfile
+import sqlite3
 from pathlib import Path
+from typing import Optional
 
 import pandas as pd
 
+from active_learning import ActiveQueue
+from case_store import LABEL_SKIP, LabeledCases, ensure_store
 from hints import (
+    automaton_compaction_times,
     extract_features_enhanced,
     format_hint_line,
     get_seed_load_summary,
@@ -14,9 +20,14 @@ from hints import (
     rollback_token_stats,
     rollback_update,
     save_hint_model_enhanced,
+    start_warm_up,
     update_model_online_enhanced,
     update_token_stats,
 )
+from journal import AnnotationJournal, read_journal, replay_journal
+from prefetch import CasePrefetcher
+from profiling import StageTimer, metrics_path_from_base
+from shared_queue import SharedQueue, queue_status
 from utils import (
     clear_screen,
     display_case,
@@ -24,9 +35,15 @@ from utils import (
     load_progress,
     save_progress,
 )
+from work_queue import WorkQueue, load_random_order
 
 
-def main():
+def main(
+    profile: bool = False, diversity: float = 0.0, shared_db: Optional[str] = None
+):
+    # 回答交互提问期间在后台加载分词词典
+    start_warm_up()
+
     print("=" * 80)
     print("                     建筑业事故案例标注系统")
     print("=" * 80)
@@ -70,63 +87,28 @@ def main():
     except Exception:
         pass
 
-    # 交互式询问是否使用随机模式
-    print("\n🎲 是否启用随机标注模式？（多人协作时建议启用，避免冲突）")
-    random_choice = input("   请选择 (y/n, 默认n): ").strip().lower()
+    # 交互式询问是否使用随机模式（共享队列由数据库决定发放顺序，不再询问）
+    shared_mode = shared_db is not None
+    if shared_mode:
+        random_choice = ""
+    else:
+        print("\n🎲 是否启用随机标注模式？（多人协作时建议启用，避免冲突）")
+        print("   输入 a 启用主动学习模式：优先标注智能提示最拿不准的案例")
+        random_choice = input("   请选择 (y/n/a, 默认n): ").strip().lower()
+    active_mode = random_choice == "a"
     random_mode = random_choice == "y"
 
-    if random_mode:
+    if shared_mode:
+        print("   ✓ 共享队列模式（由共享队列分配案例）")
+    elif active_mode:
+        print("   ✓ 主动学习模式已启用")
+    elif random_mode:
         print("   ✓ 随机模式已启用")
     else:
         print("   ✓ 顺序模式（按原始顺序标注）")
 
     print("\n" + "=" * 80)
 
-    # 设置文件路径
-    raw_dir = Path("data/raw")
-    output_dir = Path("data/annotated")
-
-    # 确保目录存在
-    raw_dir.mkdir(parents=True, exist_ok=True)
-    output_dir.mkdir(parents=True, exist_ok=True)
-
-    # 自动检测 data/raw 目录下的 CSV 文件
-    csv_files = list(raw_dir.glob("*.csv"))
-
-    if not csv_files:
-        print(f"\n❗ 错误: 在 {raw_dir}/ 目录下未找到任何CSV文件")
-        print(f"\n请将原始CSV文件放在 {raw_dir}/ 目录下")
-        print("\n按回车键退出...")
-        input()
-        return
-    elif len(csv_files) == 1:
-        # 只有一个CSV文件，直接使用
-        input_file = csv_files[0]
-        print(f"\n📄 检测到数据文件: {input_file.name}")
-    else:
-        # 多个CSV文件，让用户选择
-        print(f"\n📂 检测到 {len(csv_files)} 个CSV文件，请选择要标注的文件：")
-        print()
-        for i, csv_file in enumerate(csv_files, 1):
-            file_size = csv_file.stat().st_size / (1024 * 1024)  # MB
-            print(f"  {i}. {csv_file.name} ({file_size:.1f} MB)")
-        print()
-
-        while True:
-            try:
-                choice = input("请输入文件序号: ").strip()
-                file_index = int(choice) - 1
-                if 0 <= file_index < len(csv_files):
-                    input_file = csv_files[file_index]
-                    print(f"\n✅ 已选择: {input_file.name}")
-                    break
-                else:
-                    print(f"⚠️  请输入 1 到 {len(csv_files)} 之间的数字")
-            except ValueError:
-                print("⚠️  请输入有效的数字")
-
-    print("\n" + "=" * 80)
-
     # 使用基础名称，如果有标注者ID则加上ID
     if annotator_id:
         base_output_name = f"accident_cases_annotated_{annotator_id}"
@@ -137,82 +119,161 @@ def main():
     output_csv = output_dir / f"{base_output_name}.csv"
     progress_file = output_dir / f"{base_output_name}_progress.txt"
 
-    # 优先从 Parquet 加载，否则从 CSV，最后从原始文件
-    if output_parquet.exists():
-        print(f"检测到快速加载文件，正在从 {output_parquet} 继续...")
-        df = pd.read_parquet(output_parquet)
-        start_index = load_progress(str(output_dir / base_output_name))
-        # 确保start_index不超过总案例数
-        start_index = min(start_index, len(df) - 1) if len(df) > 0 else 0
-    elif output_csv.exists():
-        print(f"检测到已标注的CSV文件，正在从 {output_csv} 继续...")
-        df = pd.read_csv(output_csv, encoding="utf-8-sig")
-        start_index = load_progress(str(output_dir / base_output_name))
-        # 确保start_index不超过总案例数
-        start_index = min(start_index, len(df) - 1) if len(df) > 0 else 0
-    else:
-        print(f"未找到标注文件，正在从原始文件 {input_file.name} 开始...")
+    base_output_path = str(output_dir / base_output_name)
+
+    if shared_mode:
+        # 共享队列：案例从数据库登记的案例库按需读取，标注直接写入数据库
         try:
-            df = pd.read_csv(input_file, encoding="utf-8-sig")
+            shared = SharedQueue(Path(shared_db), annotator_id)
+            cases = shared.open_cases()
+        except (OSError, ValueError, sqlite3.Error) as e:
+            print(f"\n❗ 错误: 无法打开共享队列: {e}")
+            print("\n按回车键退出...")
+            input()
+            return
+        print(f"\n🤝 共享队列: {shared_db}（案例库 {shared.store_path.name}）")
+        start_index = 0
+    else:
+        # 设置文件路径
+        raw_dir = Path("data/raw")
+        output_dir = Path("data/annotated")
 
-            # 检查必需列
-            if "full_text" not in df.columns:
-                print("\n❗ 错误: CSV文件中缺少必需的 'full_text' 列")
-                print("\n请确保原始CSV文件包含 full_text 列（案例文本）")
-                print("其他列（如 title、url、date 等）为可选，程序会自动识别")
-                print("\n按回车键退出...")
-                input()
-                return
+        # 确保目录存在
+        raw_dir.mkdir(parents=True, exist_ok=True)
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        # 自动检测 data/raw 目录下的 CSV 文件
+        csv_files = list(raw_dir.glob("*.csv"))
 
-            start_index = 0
-        except Exception as e:
-            print(f"读取文件失败: {e}")
+        if not csv_files:
+            print(f"\n❗ 错误: 在 {raw_dir}/ 目录下未找到任何CSV文件")
+            print(f"\n请将原始CSV文件放在 {raw_dir}/ 目录下")
             print("\n按回车键退出...")
             input()
             return
+        elif len(csv_files) == 1:
+            # 只有一个CSV文件，直接使用
+            input_file = csv_files[0]
+            print(f"\n📄 检测到数据文件: {input_file.name}")
+        else:
+            # 多个CSV文件，让用户选择
+            print(f"\n📂 检测到 {len(csv_files)} 个CSV文件，请选择要标注的文件：")
+            print()
+            for i, csv_file in enumerate(csv_files, 1):
+                file_size = csv_file.stat().st_size / (1024 * 1024)  # MB
+                print(f"  {i}. {csv_file.name} ({file_size:.1f} MB)")
+            print()
+
+            while True:
+                try:
+                    choice = input("请输入文件序号: ").strip()
+                    file_index = int(choice) - 1
+                    if 0 <= file_index < len(csv_files):
+                        input_file = csv_files[file_index]
+                        print(f"\n✅ 已选择: {input_file.name}")
+                        break
+                    else:
+                        print(f"⚠️  请输入 1 到 {len(csv_files)} 之间的数字")
+                except ValueError:
+                    print("⚠️  请输入有效的数字")
+
+        print("\n" + "=" * 80)
+
+        # 优先从 Parquet 加载，否则从 CSV，最后从原始文件
+        # 案例正文按需从 Parquet 读取（内存映射），内存中只保存 int8 标注数组
+        if output_parquet.exists():
+            print(f"检测到快速加载文件，正在从 {output_parquet} 继续...")
+            cases = LabeledCases.open(output_parquet)
+            start_index = load_progress(str(output_dir / base_output_name))
+            # 确保start_index不超过总案例数
+            start_index = min(start_index, len(cases) - 1) if len(cases) > 0 else 0
+        elif output_csv.exists():
+            print(f"检测到已标注的CSV文件，正在从 {output_csv} 继续...")
+            cases = LabeledCases.from_frame(
+                pd.read_csv(output_csv, encoding="utf-8-sig")
+            )
+            start_index = load_progress(str(output_dir / base_output_name))
+            # 确保start_index不超过总案例数
+            start_index = min(start_index, len(cases) - 1) if len(cases) > 0 else 0
+        else:
+            print(f"未找到标注文件，正在从原始文件 {input_file.name} 开始...")
+            try:
+                # 原始 CSV 先导入压缩的案例库（data/store/），之后直接读取案例库
+                cases = LabeledCases.open(ensure_store(input_file))
+
+                # 检查必需列
+                if "full_text" not in cases.columns:
+                    print("\n❗ 错误: CSV文件中缺少必需的 'full_text' 列")
+                    print("\n请确保原始CSV文件包含 full_text 列（案例文本）")
+                    print("其他列（如 title、url、date 等）为可选，程序会自动识别")
+                    print("\n按回车键退出...")
+                    input()
+                    return
+
+                start_index = 0
+            except Exception as e:
+                print(f"读取文件失败: {e}")
+                print("\n按回车键退出...")
+                input()
+                return
+
+        # 重放上次未压实的标注日志（异常退出或尚未压实时留下的记录）
+        journal_records = read_journal(base_output_path)
+        if journal_records:
+            print(f"检测到标注日志，正在重放 {len(journal_records)} 条记录...")
+            journal_position = replay_journal(cases, journal_records)
+            if journal_position is not None and len(cases) > 0:
+                start_index = min(journal_position, len(cases) - 1)
 
-    total_cases = len(df)
+    total_cases = len(cases)
 
-    # 如果是随机模式，创建随机索引序列
+    # 如果是随机模式，读取（或首次生成）随机顺序
     if random_mode:
         print("\n📊 随机标注模式已启用")
-
-        # 保存/加载索引映射
-        index_file = output_dir / f"{base_output_name}_random_indices.txt"
-        if index_file.exists():
-            # 加载已保存的随机序列
-            with open(index_file, "r") as f:
-                indices = list(map(int, f.read().strip().split(",")))
-            # 验证索引列表长度是否匹配
-            if len(indices) != total_cases:
-                print(
-                    f"⚠️  警告: 随机索引文件长度({len(indices)})与当前数据({total_cases})不匹配，将重新生成"
-                )
-                indices = list(range(total_cases))
-                random.shuffle(indices)
-                with open(index_file, "w") as f:
-                    f.write(",".join(map(str, indices)))
-        else:
-            # 第一次运行，生成新的随机序列
-            indices = list(range(total_cases))
-            random.shuffle(indices)
-            with open(index_file, "w") as f:
-                f.write(",".join(map(str, indices)))
+        order = load_random_order(base_output_path, total_cases)
     else:
-        indices = None
-
-    # 初始化列
-    if "is_construction" not in df.columns:
-        df["is_construction"] = pd.NA
+        order = None
 
     # 计算实际已标注的数量（不包括跳过的）
-    already_annotated = (
-        (df["is_construction"].notna()) & (df["is_construction"] != -1)
-    ).sum()
+    if shared_mode:
+        # 共享队列按全体标注者统计：已完成（标注人数已满）的案例
+        already_annotated = queue_status(shared.conn)["done"]
+    else:
+        counts = cases.counts()
+        already_annotated = counts["construction"] + counts["non_construction"]
     total_unannotated = total_cases - already_annotated
 
+    # 加载智能提示模型
+    hint_model = load_hint_model_enhanced(base_output_path)
+    # 打印关键词加载摘要
+    try:
+        print(get_seed_load_summary())
+    except Exception:
+        pass
+
+    if shared_mode:
+        queue = shared
+    elif active_mode:
+        # 候选池从随机顺序中抽取；出题顺序每次会话重新排，位置从头计
+        queue = ActiveQueue(
+            cases,
+            hint_model,
+            load_random_order(base_output_path, total_cases),
+            diversity=diversity,
+        )
+        start_index = 0
+    else:
+        # 待标注队列：按位置取下一个待标注案例、撤销时定位，都与语料规模无关
+        queue = WorkQueue(cases, order)
+
     print(f"\n共有 {total_cases} 个案例需要标注")
-    if random_mode:
+    if shared_mode:
+        print(f"全体已完成: {already_annotated} 条，剩余: {total_unannotated} 条")
+        print("(共享队列模式: 案例由共享队列按租约分配，不会与其他标注者重复)")
+    elif active_mode:
+        print(f"已标注: {already_annotated} 条，剩余: {total_unannotated} 条")
+        print("(主动学习模式: 按智能提示的不确定度出题)")
+    elif random_mode:
         print(f"已标注: {already_annotated} 条，剩余: {total_unannotated} 条")
         print(f"(随机模式: 将从第 {start_index + 1} 个随机位置继续)")
     else:
@@ -224,18 +285,19 @@ def main():
     current_index = start_index
     annotated_count = 0  # 记录本次会话实际标注的数量
 
-    # 加载智能提示模型
-    base_output_path = str(output_dir / base_output_name)
-    hint_model = load_hint_model_enhanced(base_output_path)
-    # 打印关键词加载摘要
-    try:
-        print(get_seed_load_summary())
-    except Exception:
-        pass
-
     print("=" * 80)
     print("准备开始标注...")
-    if random_mode:
+    if shared_mode:
+        print("- 标注模式: 共享队列")
+        print(f"- 全体已完成: {already_annotated} 条")
+        print(f"- 剩余数量: {total_unannotated} 条")
+    elif active_mode:
+        print("- 标注模式: 主动学习（不确定度优先）")
+        if diversity > 0:
+            print(f"- 多样性采样: {diversity}")
+        print(f"- 已标注: {already_annotated} 条")
+        print(f"- 剩余数量: {total_unannotated} 条")
+    elif random_mode:
         print("- 标注模式: 随机顺序")
         print(f"- 已标注: {already_annotated} 条")
         print(f"- 剩余数量: {total_unannotated} 条")
@@ -248,55 +310,101 @@ def main():
     print("\n按回车键开始...")
     input()
 
-    try:
-        while current_index < total_cases:
-            # 如果是随机模式，使用随机索引
-            actual_index = indices[current_index] if indices else current_index
+    # 后台预取后续案例的摘录与分词，标注者阅读时即可完成计算
+    prefetcher = CasePrefetcher(queue)
+    # 每次标注/跳过/撤销立即追加到日志，退出时再压实进 Parquet/CSV
+    # 共享队列模式下直接写入共享数据库，不生成本地标注文件
+    if shared_mode:
+        journal = shared
+    else:
+        journal = AnnotationJournal(base_output_path, annotator_id)
+    # --profile：记录每个案例各阶段耗时
+    metrics_path = metrics_path_from_base(base_output_path) if profile else None
+    timer = StageTimer(metrics_path)
 
-            # 检查是否已标注（非空且不等于-1表示已标注）
-            if (
-                pd.notna(df.loc[actual_index, "is_construction"])
-                and df.loc[actual_index, "is_construction"] != -1
-            ):
-                # 已标注，自动跳过
-                current_index += 1
-                continue
+    def compact():
+        if shared_mode:
+            return
+        if save_progress(cases, base_output_path, current_index):
+            journal.truncate()
 
-            row = df.iloc[actual_index]
-            display_case(row, current_index, total_cases, random_mode)
+    try:
+        while current_index < total_cases:
+            # 跳过已标注的案例（跳过过的案例仍需标注）
+            current_index = queue.next_pending(current_index)
+            if current_index >= total_cases:
+                break
+            actual_index = queue.case_at(current_index)
+
+            with timer.stage("display"):
+                case = prefetcher.get(actual_index)
+                row = case.row
+                # 主动学习、共享队列模式的位置从本次会话开始计，进度加上已标注数
+                shown_index = current_index + already_annotated * (
+                    active_mode or shared_mode
+                )
+                display_case(
+                    row,
+                    shown_index,
+                    total_cases,
+                    random_mode or active_mode or shared_mode,
+                    case.key_excerpt,
+                )
+                prefetcher.schedule(current_index)
 
             # 智能提示（非建筑业概率）
+            # 同一案例只分词一次：特征提取、在线更新与 token 统计共用分析结果，
+            # 撤销后重新显示时也会命中缓存；TF-IDF 与概率依赖在线模型，此处现场计算
+            analysis = case.analysis
             try:
-                feats = extract_features_enhanced(hint_model, row)
-                prob, contrib = predict_non_construction_proba_enhanced(
-                    hint_model, feats
-                )
+                with timer.stage("features"):
+                    feats = extract_features_enhanced(hint_model, row, analysis)
+                with timer.stage("predict"):
+                    prob, contrib = predict_non_construction_proba_enhanced(
+                        hint_model, feats
+                    )
                 print(format_hint_line(prob, contrib))
             except Exception:
                 feats = None
 
             # 显示是否之前被跳过
-            if (
-                pd.notna(df.loc[actual_index, "is_construction"])
-                and df.loc[actual_index, "is_construction"] == -1
-            ):
+            if cases.is_skipped(actual_index):
                 print("\n[此案例之前被跳过]")
 
             user_input = get_user_input()
 
+            # 共享队列：思考期间租约可能已过期并发给他人，标注前确认仍持有该案例
+            if (
+                shared_mode
+                and user_input in ["1", "0", "s", "skip"]
+                and not shared.hold(actual_index)
+            ):
+                print("⌛ 租约已过期，该案例已发给其他标注者，转到下一条")
+                continue
+
             if user_input == "1":
-                df.loc[actual_index, "is_construction"] = 1
+                cases.set_label(actual_index, 1)
                 print("✓ 已标注为: 建筑业案例")
                 annotation_history.append(actual_index)
                 # 在线更新（建筑业=0 -> 非建筑业概率应降低）
                 if feats is not None:
-                    lr_delta = update_model_online_enhanced(
-                        hint_model, row, feats, label_non_construction=0
-                    )
-                    tok_delta = update_token_stats(
-                        hint_model, row, label_non_construction=0
-                    )
-                    new_feats = maybe_expand_features(hint_model)
+                    with timer.stage("update"):
+                        lr_delta = update_model_online_enhanced(
+                            hint_model,
+                            row,
+                            feats,
+                            label_non_construction=0,
+                            analysis=analysis,
+                        )
+                    with timer.stage("token_stats"):
+                        tok_delta = update_token_stats(
+                            hint_model,
+                            row,
+                            label_non_construction=0,
+                            analysis=analysis,
+                        )
+                    with timer.stage("expand"):
+                        new_feats = maybe_expand_features(hint_model)
                     update_history.append(
                         {"lr": lr_delta, "tok": tok_delta, "new": new_feats}
                     )
@@ -304,19 +412,31 @@ def main():
                     update_history.append(None)
                 current_index += 1
                 annotated_count += 1
+                with timer.stage("journal"):
+                    journal.append("label", actual_index, 1, current_index)
             elif user_input == "0":
-                df.loc[actual_index, "is_construction"] = 0
+                cases.set_label(actual_index, 0)
                 annotation_history.append(actual_index)
                 print("✓ 已标注为: 非建筑业案例")
                 # 在线更新（非建筑业=1 -> 非建筑业概率应升高）
                 if feats is not None:
-                    lr_delta = update_model_online_enhanced(
-                        hint_model, row, feats, label_non_construction=1
-                    )
-                    tok_delta = update_token_stats(
-                        hint_model, row, label_non_construction=1
-                    )
-                    new_feats = maybe_expand_features(hint_model)
+                    with timer.stage("update"):
+                        lr_delta = update_model_online_enhanced(
+                            hint_model,
+                            row,
+                            feats,
+                            label_non_construction=1,
+                            analysis=analysis,
+                        )
+                    with timer.stage("token_stats"):
+                        tok_delta = update_token_stats(
+                            hint_model,
+                            row,
+                            label_non_construction=1,
+                            analysis=analysis,
+                        )
+                    with timer.stage("expand"):
+                        new_feats = maybe_expand_features(hint_model)
                     update_history.append(
                         {"lr": lr_delta, "tok": tok_delta, "new": new_feats}
                     )
@@ -324,72 +444,80 @@ def main():
                     update_history.append(None)
                 current_index += 1
                 annotated_count += 1
+                with timer.stage("journal"):
+                    journal.append("label", actual_index, 0, current_index)
             elif user_input in ["s", "skip"]:
-                df.loc[actual_index, "is_construction"] = -1
+                cases.set_label(actual_index, LABEL_SKIP)
                 annotation_history.append(actual_index)
                 print("⊘ 已跳过此案例")
                 update_history.append(None)
                 current_index += 1
                 annotated_count += 1
+                with timer.stage("journal"):
+                    journal.append("skip", actual_index, -1, current_index)
             elif user_input in ["u", "undo"]:
                 if annotation_history:
                     last_actual_index = annotation_history.pop()
                     # 清理相关列
-                    df.loc[last_actual_index, "is_construction"] = pd.NA
+                    cases.set_label(last_actual_index, None)
                     print("↶ 已撤销上一个标注")
                     annotated_count = max(0, annotated_count - 1)
 
                     # 撤销上一次模型更新
                     if update_history:
                         last_delta = update_history.pop()
-                        try:
-                            if last_delta:
-                                if isinstance(last_delta, dict) and "lr" in last_delta:
-                                    rollback_update(
-                                        hint_model, last_delta.get("lr", {})
-                                    )
-                                    rollback_token_stats(
-                                        hint_model, last_delta.get("tok", {})
-                                    )
-                                    remove_learned_features(
-                                        hint_model, last_delta.get("new", [])
-                                    )
-                                else:
-                                    rollback_update(hint_model, last_delta)
-                        except Exception:
-                            pass
-
-                    # 在随机模式下，需要找到last_actual_index在indices中的位置
-                    if indices:
-                        try:
-                            # 找到上一个标注案例在随机序列中的位置
-                            last_position = indices.index(last_actual_index)
-                            current_index = last_position
-                        except ValueError:
-                            # 如果找不到，保持当前位置不变
-                            pass
-                    else:
-                        # 顺序模式下，直接回退到该索引
-                        current_index = last_actual_index
+                        with timer.stage("undo"):
+                            try:
+                                if last_delta:
+                                    if (
+                                        isinstance(last_delta, dict)
+                                        and "lr" in last_delta
+                                    ):
+                                        rollback_update(
+                                            hint_model, last_delta.get("lr", {})
+                                        )
+                                        rollback_token_stats(
+                                            hint_model, last_delta.get("tok", {})
+                                        )
+                                        remove_learned_features(
+                                            hint_model, last_delta.get("new", [])
+                                        )
+                                    else:
+                                        rollback_update(hint_model, last_delta)
+                            except Exception:
+                                pass
+
+                    # 回到上一个标注案例在标注顺序中的位置
+                    current_index = queue.position_of(last_actual_index)
+                    with timer.stage("journal"):
+                        journal.append("undo", last_actual_index, None, current_index)
                 else:
                     print("⚠ 没有可以撤销的标注")
             elif user_input in ["q", "quit"]:
                 print("\n正在保存并退出...")
-                save_progress(df, str(output_dir / base_output_name), current_index)
+                with timer.stage("save"):
+                    compact()
+                timer.end_case(actual_index, user_input)
                 return
 
-            # 每实际标注10个案例自动保存（不包括自动跳过的）
+            # 模型已更新：主动学习模式下通知后台重新排序
+            queue.refresh()
+
+            # 标注已实时写入日志；每实际标注10个案例同步保存一次模型
             if annotated_count > 0 and annotated_count % 10 == 0:
-                save_progress(df, str(output_dir / base_output_name), current_index)
-                # 同步保存模型
                 try:
-                    save_hint_model_enhanced(base_output_path, hint_model)
+                    with timer.stage("save"):
+                        save_hint_model_enhanced(base_output_path, hint_model)
                 except Exception:
                     pass
+            timer.end_case(actual_index, user_input)
 
         clear_screen()
-        print("🎉 恭喜！所有案例标注完成！")
-        save_progress(df, str(output_dir / base_output_name), current_index)
+        if shared_mode:
+            print("🎉 共享队列中已没有可领取的案例！")
+        else:
+            print("🎉 恭喜！所有案例标注完成！")
+        compact()
         try:
             save_hint_model_enhanced(base_output_path, hint_model)
         except Exception:
@@ -398,15 +526,63 @@ def main():
         if progress_file.exists():
             progress_file.unlink()
 
-    except (KeyboardInterrupt, Exception) as e:
-        print(f"\n\n操作中断或发生错误: {e}")
-        print("正在紧急保存进度...")
-        save_progress(df, str(output_dir / base_output_name), current_index)
+    except KeyboardInterrupt:
+        print("\n\n操作中断，正在保存进度...")
+        compact()
         try:
             save_hint_model_enhanced(base_output_path, hint_model)
         except Exception:
             pass
+    except Exception as e:
+        # 标注记录已逐条落盘，出错时不再重写快照，下次启动重放日志即可恢复
+        print(f"\n\n发生错误: {e}")
+        print(f"标注记录已实时保存在 {journal.path}，下次启动会自动恢复")
+        try:
+            save_hint_model_enhanced(base_output_path, hint_model)
+        except Exception:
+            pass
+    finally:
+        prefetcher.close()
+        queue.close()
+        if not shared_mode:
+            journal.close()
+        if timer.enabled:
+            timer.add_samples("automaton", automaton_compaction_times())
+            print("\n各阶段耗时（毫秒）：")
+            print(timer.summary())
+            print(f"逐案例记录: {metrics_path}")
+        timer.close()
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="事故报告行业标注工具")
+    parser.add_argument(
+        "--profile", action="store_true", help="记录各阶段耗时，退出时打印 p50/p95/p99"
+    )
+    parser.add_argument(
+        "--cprofile", metavar="FILE", help="同时用 cProfile 采样主线程，结果写入 FILE"
+    )
+    parser.add_argument(
+        "--shared",
+        metavar="DB",
+        help="连接多人共享标注队列（由 shared_queue.py init 建立）",
+    )
+    parser.add_argument(
+        "--diversity",
+        type=float,
+        default=0.0,
+        metavar="W",
+        help="主动学习模式的多样性采样权重（0 为只按不确定度，常用 0.2~0.5）",
+    )
+    args = parser.parse_args()
+    if args.cprofile:
+        profiler = cProfile.Profile()
+        try:
+            profiler.runcall(
+                main, profile=True, diversity=args.diversity, shared_db=args.shared
+            )
+        finally:
+            profiler.dump_stats(args.cprofile)
+            print(f"cProfile 结果: {args.cprofile}（python -m pstats 查看）")
+    else:
+        main(profile=args.profile, diversity=args.diversity, shared_db=args.shared)
@@ -4,102 +4,198 @@
 
 用法：
     python merge_annotations.py file1.csv file2.csv file3.csv ... -o merged_output.csv
+
+各文件按 case_id（其次 content_hash、url）对齐，行顺序可以不同；
+标注读成 行 × 标注者 的 int8 票矩阵后一次性计票，20 人 × 100 万行也只需数秒。
+
+语料很大（内存装不下全文）时加 --streaming：各文件只按批读取键与标注列计票，
+写出时再按批读取第一个文件、拼上合并结果，内存占用只与批大小和案例数（票矩阵）有关。
 """
 
 import argparse
 import sys
 from pathlib import Path
+from typing import Dict, Iterator, List, Optional
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# 对齐各文件行的键，按优先级选用所有文件都有的列；都没有时按行号对齐
+KEY_COLUMNS = ["case_id", "content_hash", "url"]
+LABEL_COLUMN = "is_construction"
+# 流式读取的批大小（行）；写出时每批带全文，内存占用约为 批大小 × 单条全文大小
+BATCH_SIZE = 8192
 
 
-def load_annotation_file(filepath):
-    """加载标注文件"""
+def load_annotation_file(filepath, columns=None):
+    """加载标注文件；columns 不为空时只读取这些列"""
     path = Path(filepath)
     if path.suffix == ".parquet":
-        return pd.read_parquet(filepath)
+        return pd.read_parquet(filepath, columns=columns)
     else:
-        return pd.read_csv(filepath, encoding="utf-8-sig")
+        return pd.read_csv(filepath, encoding="utf-8-sig", usecols=columns)
 
 
-def merge_annotations(files, output_file):
-    """合并多个标注文件"""
-    print(f"\n开始合并 {len(files)} 个标注文件...")
+def iter_annotation_file(
+    filepath, columns=None, batch_size: int = BATCH_SIZE, dtype=None
+) -> Iterator[pd.DataFrame]:
+    """按批读取标注文件（Parquet 用 pyarrow 按批解码，CSV 按块读取）"""
+    path = Path(filepath)
+    if path.suffix == ".parquet":
+        pf = pq.ParquetFile(filepath)
+        for batch in pf.iter_batches(batch_size=batch_size, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(
+            filepath,
+            encoding="utf-8-sig",
+            usecols=columns,
+            chunksize=batch_size,
+            dtype=dtype,
+        )
 
-    # 加载所有文件
-    dfs = []
-    for i, file in enumerate(files, 1):
-        print(f"[{i}/{len(files)}] 加载: {file}")
-        df = load_annotation_file(file)
-        dfs.append(df)
 
-    # 使用第一个文件作为基准
-    base_df = dfs[0].copy()
-    total_cases = len(base_df)
+def file_columns(filepath) -> List[str]:
+    path = Path(filepath)
+    if path.suffix == ".parquet":
+        return pq.read_schema(filepath).names
+    return list(pd.read_csv(filepath, encoding="utf-8-sig", nrows=0).columns)
+
+
+def choose_key(columns_per_file: List[List[str]]) -> Optional[str]:
+    """所有文件共有的对齐键（case_id > content_hash > url）"""
+    for key in KEY_COLUMNS:
+        if all(key in cols for cols in columns_per_file):
+            return key
+    return None
+
+
+def encode_votes(values) -> np.ndarray:
+    """标注列 -> int8 票（1/0；跳过、缺失及其他取值为 -1，不计票）"""
+    v = pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(dtype=np.float64)
+    votes = np.full(len(v), -1, dtype=np.int8)
+    votes[v == 1] = 1
+    votes[v == 0] = 0
+    return votes
+
+
+def read_votes(
+    files: List[str],
+    key: Optional[str],
+    base_keys,
+    base_labels,
+    batch_size: int = BATCH_SIZE,
+) -> np.ndarray:
+    """按批读取各文件的键与标注列，对齐到第一个文件的行顺序，返回 行 × 文件 的票矩阵。
+
+    第一个文件的票直接取 base_labels；其余文件按键对齐（同一文件中重复的键以最后一次
+    出现为准，第一个文件中没有的行丢弃），没有对齐键时按行号对齐。
+    """
+    total = len(base_labels)
+    votes = np.full((total, len(files)), -1, dtype=np.int8)
+    votes[:, 0] = encode_votes(base_labels)
+    if key is not None:
+        # 第一个文件中的键去重后建索引，票先按唯一键记录，最后展开回各行
+        codes, uniques = pd.factorize(pd.Series(base_keys))
+        key_index = pd.Index(uniques)
+        by_key = np.full(len(uniques), -1, dtype=np.int8)
+    for i, file in enumerate(files[1:], 2):
+        print(f"[{i}/{len(files)}] 读取: {file}")
+        columns = [key, LABEL_COLUMN] if key is not None else [LABEL_COLUMN]
+        if key is not None:
+            by_key[:] = -1
+        offset = 0
+        for df in iter_annotation_file(file, columns=columns, batch_size=batch_size):
+            batch_votes = encode_votes(df[LABEL_COLUMN])
+            if key is not None:
+                pos = key_index.get_indexer(df[key])
+                found = pos >= 0
+                by_key[pos[found]] = batch_votes[found]
+            else:
+                n = max(0, min(len(df), total - offset))
+                votes[offset : offset + n, i - 1] = batch_votes[:n]
+            offset += len(df)
+        if key is not None:
+            votes[:, i - 1] = np.where(codes >= 0, by_key[codes], -1)
+    return votes
+
+
+def tally_votes(votes: np.ndarray, base_labels) -> Dict[str, np.ndarray]:
+    """计票：一致的行取该值，冲突标记为待复议，无人标注的保留第一个文件的原值"""
+    positive = (votes == 1).sum(axis=1)
+    negative = (votes == 0).sum(axis=1)
+    count = positive + negative
+    annotated = count > 0
+    conflict = (positive > 0) & (negative > 0)
+
+    merged = pd.to_numeric(pd.Series(base_labels), errors="coerce").to_numpy(
+        dtype=np.float64, copy=True
+    )
+    agreed = annotated & ~conflict
+    merged[agreed] = (positive[agreed] > 0).astype(np.float64)
+    merged[conflict] = np.nan
+    return {
+        "merged": merged,
+        "count": count.astype(np.int64),
+        "annotated": annotated,
+        "conflict": conflict,
+    }
 
-    # 添加合并相关的列
-    base_df["annotation_count"] = 0  # 有多少人标注了这条
-    base_df["is_construction_conflict"] = False  # 是否建筑业判断有冲突
-    base_df["annotators"] = ""  # 标注者列表
 
-    # 统计
+def merge_stats(tally: Dict[str, np.ndarray]) -> Dict:
     stats = {
-        "total": total_cases,
-        "annotated": 0,
-        "construction_conflicts": 0,
+        "total": len(tally["merged"]),
+        "annotated": int(tally["annotated"].sum()),
+        "construction_conflicts": int(tally["conflict"].sum()),
         "agreement_rate": 0.0,
     }
-
-    print("\n开始合并标注...")
-
-    for idx in range(total_cases):
-        # 收集所有标注者对这条数据的标注
-        is_construction_votes = []
-        annotator_ids = []
-
-        for df_idx, df in enumerate(dfs):
-            if (
-                pd.notna(df.loc[idx, "is_construction"])
-                and df.loc[idx, "is_construction"] != -1
-            ):
-                is_construction_votes.append(df.loc[idx, "is_construction"])
-                annotator_ids.append(f"A{df_idx + 1}")
-
-        # 如果没有人标注这条，跳过
-        if not is_construction_votes:
-            continue
-
-        base_df.loc[idx, "annotation_count"] = len(is_construction_votes)
-        base_df.loc[idx, "annotators"] = ",".join(annotator_ids)
-
-        # 检查 is_construction 是否一致
-        if len(set(is_construction_votes)) > 1:
-            # 有冲突
-            base_df.loc[idx, "is_construction_conflict"] = True
-            base_df.loc[idx, "is_construction"] = pd.NA  # 标记为待复议
-            stats["construction_conflicts"] += 1
-        else:
-            # 一致，使用该值
-            base_df.loc[idx, "is_construction"] = is_construction_votes[0]
-
-        stats["annotated"] += 1
-
     # 计算一致性率
     if stats["annotated"] > 0:
         conflicts = stats["construction_conflicts"]
         stats["agreement_rate"] = (
             (stats["annotated"] - conflicts) / stats["annotated"] * 100
         )
+    return stats
+
+
+def annotator_lists(voted: np.ndarray, names: List[str]) -> np.ndarray:
+    """每行参与投票的标注者名单（逗号分隔）。
+
+    先把每行的投票情况压成位掩码，只为出现过的组合拼一次字符串。
+    """
+    n, k = voted.shape
+    if k <= 63:
+        bits = np.zeros(n, dtype=np.uint64)
+        for j in range(k):
+            bits |= voted[:, j].astype(np.uint64) << np.uint64(j)
+        uniques, inverse = np.unique(bits, return_inverse=True)
+        labels = np.array(
+            [
+                ",".join(names[j] for j in range(k) if (int(u) >> j) & 1)
+                for u in uniques
+            ],
+            dtype=object,
+        )
+        return labels[inverse.reshape(-1)]
+    # 标注者过多时按行拼接
+    return np.array(
+        [",".join(names[j] for j in np.flatnonzero(row)) for row in voted],
+        dtype=object,
+    )
 
-    # 保存结果
-    print(f"\n保存合并结果到: {output_file}")
-    output_path = Path(output_file)
 
-    # 同时保存为 CSV 和 Parquet
-    base_df.to_csv(output_path.with_suffix(".csv"), index=False, encoding="utf-8-sig")
-    base_df.to_parquet(output_path.with_suffix(".parquet"), index=False)
+def _print_key(key: Optional[str]):
+    if key is None:
+        print(
+            "⚠️  文件缺少 case_id/content_hash/url 列，按行号对齐（需保证行顺序一致）"
+        )
+    else:
+        print(f"按 {key} 对齐各文件")
 
-    # 输出统计信息
+
+def _print_stats(stats: Dict):
     print("\n" + "=" * 80)
     print("合并完成！统计信息：")
     print("=" * 80)
@@ -109,8 +205,43 @@ def merge_annotations(files, output_file):
     print(f"标注一致率:       {stats['agreement_rate']:.2f}%")
     print("=" * 80)
 
+
+def merge_annotations(files, output_file):
+    """合并多个标注文件：按键对齐为 行 × 标注者 的票矩阵，向量化计票与检测冲突"""
+    print(f"\n开始合并 {len(files)} 个标注文件...")
+
+    key = choose_key([file_columns(f) for f in files])
+    _print_key(key)
+
+    # 第一个文件作为基准（保留全部列），其余文件只读取键与标注列
+    print(f"[1/{len(files)}] 加载: {files[0]}")
+    base_df = load_annotation_file(files[0])
+    base_keys = base_df[key] if key is not None else None
+    votes = read_votes(files, key, base_keys, base_df[LABEL_COLUMN])
+
+    print("\n开始合并标注...")
+    tally = tally_votes(votes, base_df[LABEL_COLUMN])
+    conflict = tally["conflict"]
+    base_df[LABEL_COLUMN] = tally["merged"]
+    names = [f"A{j + 1}" for j in range(len(files))]
+    base_df["annotation_count"] = tally["count"]
+    base_df["is_construction_conflict"] = conflict
+    base_df["annotators"] = annotator_lists(votes >= 0, names)
+    stats = merge_stats(tally)
+
+    # 保存结果
+    print(f"\n保存合并结果到: {output_file}")
+    output_path = Path(output_file)
+
+    # 同时保存为 CSV 和 Parquet
+    base_df.to_csv(output_path.with_suffix(".csv"), index=False, encoding="utf-8-sig")
+    base_df.to_parquet(output_path.with_suffix(".parquet"), index=False)
+
+    # 输出统计信息
+    _print_stats(stats)
+
     # 导出冲突案例到单独文件
-    conflict_df = base_df[base_df["is_construction_conflict"]]
+    conflict_df = base_df[conflict]
 
     if len(conflict_df) > 0:
         conflict_file = output_path.parent / f"{output_path.stem}_conflicts.csv"
@@ -121,6 +252,125 @@ def merge_annotations(files, output_file):
     return base_df, stats
 
 
+def _append_csv(df: pd.DataFrame, path: Path, first: bool):
+    df.to_csv(
+        path,
+        mode="w" if first else "a",
+        header=first,
+        index=False,
+        encoding="utf-8-sig" if first else "utf-8",
+    )
+
+
+def _iter_tables(
+    filepath, columns: List[str], key: Optional[str], batch_size: int
+) -> Iterator[pa.Table]:
+    """按批读取第一个文件的全部列为 Arrow 表（Parquet 不经过 pandas）"""
+    if Path(filepath).suffix == ".parquet":
+        pf = pq.ParquetFile(filepath)
+        for batch in pf.iter_batches(batch_size=batch_size):
+            yield pa.Table.from_batches([batch]).replace_schema_metadata(None)
+        return
+    # CSV 的文本列统一按字符串读取，保证各批的类型一致
+    dtype = {c: str for c in columns if c not in (key, LABEL_COLUMN)}
+    for df in iter_annotation_file(filepath, batch_size=batch_size, dtype=dtype):
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        yield table.replace_schema_metadata(None)
+
+
+def merge_annotations_streaming(
+    files, output_file, batch_size: int = BATCH_SIZE, write_csv: bool = True
+) -> Dict:
+    """流式合并：不把任何文件整体读入内存。
+
+    1. 各文件按批读取键与标注列，得到 行 × 标注者 的 int8 票矩阵；
+    2. 按批读取第一个文件的全部列，替换标注列、拼上合并结果，
+       依次写出 Parquet（与可选的 CSV），冲突案例同时追加到 _conflicts.csv。
+    """
+    print(f"\n开始流式合并 {len(files)} 个标注文件...")
+    base_columns = file_columns(files[0])
+    key = choose_key([base_columns] + [file_columns(f) for f in files[1:]])
+    _print_key(key)
+
+    print(f"[1/{len(files)}] 读取: {files[0]}")
+    columns = [key, LABEL_COLUMN] if key is not None else [LABEL_COLUMN]
+    base_keys = []
+    base_labels = []
+    for df in iter_annotation_file(files[0], columns=columns, batch_size=batch_size):
+        if key is not None:
+            base_keys.append(df[key])
+        base_labels.append(df[LABEL_COLUMN])
+    base_labels = pd.concat(base_labels, ignore_index=True)
+    base_keys = pd.concat(base_keys, ignore_index=True) if key is not None else None
+    votes = read_votes(files, key, base_keys, base_labels, batch_size=batch_size)
+    del base_keys
+
+    print("\n开始合并标注...")
+    tally = tally_votes(votes, base_labels)
+    names = [f"A{j + 1}" for j in range(len(files))]
+    annotators = annotator_lists(votes >= 0, names)
+    stats = merge_stats(tally)
+    del votes, base_labels
+
+    output_path = Path(output_file)
+    parquet_path = output_path.with_suffix(".parquet")
+    csv_path = output_path.with_suffix(".csv")
+    conflict_file = output_path.parent / f"{output_path.stem}_conflicts.csv"
+    print(
+        f"\n保存合并结果到: {parquet_path}" + (f" 与 {csv_path}" if write_csv else "")
+    )
+
+    # CSV 的文本列统一按字符串读取，保证各批写出的 Parquet 模式一致
+    writer = None
+    schema = None
+    start = 0
+    n_conflicts = 0
+    try:
+        for table in _iter_tables(files[0], base_columns, key, batch_size):
+            end = start + table.num_rows
+            label_index = table.schema.get_field_index(LABEL_COLUMN)
+            conflict = tally["conflict"][start:end]
+            table = table.set_column(
+                label_index,
+                LABEL_COLUMN,
+                pa.array(tally["merged"][start:end], from_pandas=True),
+            )
+            table = table.append_column(
+                "annotation_count", pa.array(tally["count"][start:end])
+            )
+            table = table.append_column("is_construction_conflict", pa.array(conflict))
+            table = table.append_column(
+                "annotators", pa.array(annotators[start:end], type=pa.string())
+            )
+            if writer is None:
+                # 首批中全为空的文本列推断为 null 类型，按字符串写出以容纳后续批次
+                schema = pa.schema(
+                    [
+                        f.with_type(pa.string()) if pa.types.is_null(f.type) else f
+                        for f in table.schema
+                    ]
+                )
+                writer = pq.ParquetWriter(parquet_path, schema, compression="zstd")
+            table = table.cast(schema)
+            writer.write_table(table)
+            if write_csv:
+                _append_csv(table.to_pandas(), csv_path, start == 0)
+            if conflict.any():
+                conflicts = table.filter(pa.array(conflict)).to_pandas()
+                _append_csv(conflicts, conflict_file, n_conflicts == 0)
+                n_conflicts += len(conflicts)
+            start = end
+    finally:
+        if writer is not None:
+            writer.close()
+
+    _print_stats(stats)
+    if n_conflicts:
+        print(f"\n冲突案例已导出到: {conflict_file}")
+        print(f"共 {n_conflicts} 条冲突案例需要复议\n")
+    return stats
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="合并多人标注的结果文件",
@@ -133,17 +383,34 @@ def main():
         accident_cases_annotated_user2.csv \\
         accident_cases_annotated_user3.csv \\
         -o merged_result.csv
-        
+
     # 也支持 parquet 格式
     python merge_annotations.py \\
         accident_cases_annotated_user1.parquet \\
         accident_cases_annotated_user2.parquet \\
         -o merged_result.csv
+
+    # 大语料：流式合并，只写 Parquet 与冲突案例
+    python merge_annotations.py --streaming --no-csv \\
+        accident_cases_annotated_user*.parquet -o merged_result.parquet
         """,
     )
 
     parser.add_argument("files", nargs="+", help="要合并的标注文件（至少2个）")
     parser.add_argument("-o", "--output", required=True, help="输出文件路径")
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="流式合并：按批读取，不把全文读入内存（适合数 GB 的语料）",
+    )
+    parser.add_argument(
+        "--batch-size", type=int, default=BATCH_SIZE, help="流式合并每批的行数"
+    )
+    parser.add_argument(
+        "--no-csv",
+        action="store_true",
+        help="流式合并时不写出完整的 CSV（仍写出冲突案例 CSV）",
+    )
 
     args = parser.parse_args()
 
@@ -158,7 +425,15 @@ def main():
             sys.exit(1)
 
     # 执行合并
-    merge_annotations(args.files, args.output)
+    if args.streaming:
+        merge_annotations_streaming(
+            args.files,
+            args.output,
+            batch_size=args.batch_size,
+            write_csv=not args.no_csv,
+        )
+    else:
+        merge_annotations(args.files, args.output)
 
 
 if __name__ == "__main__":
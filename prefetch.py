@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""
+后台预取模块：标注者阅读当前案例时，提前为后续待标注案例计算
+关键段落摘录、分词结果与关键词命中，按键后直接从缓存取出显示。
+
+预取内容只包含与模型无关（或自带版本校验）的部分：
+- 摘录、分词：只依赖案例文本，不会过期；
+- 关键词命中：CaseAnalysis 按特征集合版本校验，学习特征增删后自动重算；
+- TF-IDF 特征与概率：依赖在线模型，显示时基于缓存的分词现场计算（代价很小）。
+"""
+
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Optional, Tuple
+
+import pandas as pd
+
+from excerpt import key_excerpt_for_row
+from hints import CaseAnalysis, analyze_case
+from work_queue import WorkQueue
+
+# 默认向后预取的案例数
+PREFETCH_DEPTH = 5
+
+
+class PrefetchedCase:
+    """预取结果：案例行、分析结果与关键段落摘录"""
+
+    __slots__ = ("row", "analysis", "key_excerpt")
+
+    def __init__(
+        self,
+        row: pd.Series,
+        analysis: CaseAnalysis,
+        key_excerpt: Tuple[Optional[str], Optional[str]],
+    ):
+        self.row = row
+        self.analysis = analysis
+        self.key_excerpt = key_excerpt
+
+
+def prepare_case(row: pd.Series) -> PrefetchedCase:
+    """计算单个案例的展示与提示所需的中间结果"""
+    # 分词与关键词匹配是耗时部分
+    analysis = analyze_case(row).warm()
+    key_excerpt = key_excerpt_for_row(row)
+    return PrefetchedCase(row, analysis, key_excerpt)
+
+
+class CasePrefetcher:
+    """按标注顺序（WorkQueue 或主动学习的 ActiveQueue）在后台线程预取后续待标注案例"""
+
+    def __init__(
+        self,
+        queue: WorkQueue,
+        depth: int = PREFETCH_DEPTH,
+        workers: int = 1,
+    ):
+        self.queue = queue
+        self.cases = queue.cases
+        self.depth = depth
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, workers), thread_name_prefix="prefetch"
+        )
+        # actual_index -> Future[PrefetchedCase]，按调度顺序保存，超出容量淘汰最早的
+        self._futures: "OrderedDict[int, Future]" = OrderedDict()
+        self._capacity = depth * 2 + 4
+
+    def _prepare(self, actual_index: int) -> PrefetchedCase:
+        return prepare_case(self.cases.row(actual_index))
+
+    def schedule(self, current_index: int):
+        """从 current_index 之后找出最多 depth 个待标注案例并提交后台计算"""
+        for actual_index in self.queue.upcoming(current_index, self.depth):
+            if actual_index in self._futures:
+                continue
+            # 案例行在后台线程中按需读取（CaseReader 加锁，标注数组不参与）
+            self._futures[actual_index] = self._executor.submit(
+                self._prepare, actual_index
+            )
+        while len(self._futures) > self._capacity:
+            _, fut = self._futures.popitem(last=False)
+            fut.cancel()
+
+    def get(self, actual_index: int) -> PrefetchedCase:
+        """取出案例的预取结果；尚未预取时在当前线程直接计算"""
+        fut = self._futures.get(actual_index)
+        if fut is not None and not fut.cancelled():
+            try:
+                return fut.result()
+            except Exception:
+                pass
+        return self._prepare(actual_index)
+
+    def close(self):
+        for fut in self._futures.values():
+            fut.cancel()
+        self._futures.clear()
+        self._executor.shutdown(wait=False)
@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+标注循环的分阶段耗时统计（python main.py --profile）。
+
+每处理一个案例，把各阶段耗时写成一行 JSON 追加到 <标注文件>_metrics.jsonl，
+退出时打印各阶段的 p50/p95/p99。未开启时 stage() 是空操作，不影响正常标注。
+"""
+
+import json
+import time
+from collections import defaultdict
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+# 阶段名 -> 显示名称（按标注流程排列）
+STAGES = {
+    "display": "显示案例",
+    "features": "特征提取",
+    "predict": "概率预测",
+    "update": "在线更新",
+    "token_stats": "token统计",
+    "expand": "特征扩展",
+    "undo": "撤销回滚",
+    "journal": "写标注日志",
+    "save": "保存",
+    "automaton": "自动机压实(后台)",
+    "total": "单案例合计",
+}
+
+
+def metrics_path_from_base(base_output_path: str) -> Path:
+    p = Path(base_output_path)
+    return p.parent / f"{p.stem}_metrics.jsonl"
+
+
+class StageTimer:
+    """按案例累计各阶段耗时；metrics_path 为空时不记录"""
+
+    def __init__(self, metrics_path: Optional[Path] = None):
+        self.enabled = metrics_path is not None
+        self.metrics_path = metrics_path
+        self._file = open(metrics_path, "a", encoding="utf-8") if self.enabled else None
+        self._current: Dict[str, float] = {}
+        self.samples: Dict[str, List[float]] = defaultdict(list)
+
+    def stage(self, name: str):
+        if not self.enabled:
+            return nullcontext()
+        return self._timed(name)
+
+    @contextmanager
+    def _timed(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = (time.perf_counter() - t0) * 1000
+            self._current[name] = self._current.get(name, 0.0) + elapsed
+
+    def end_case(self, case_index: int, action: str):
+        """结束一个案例：写入一行记录并计入统计"""
+        if not self.enabled or not self._current:
+            return
+        stages = {k: round(v, 3) for k, v in self._current.items()}
+        total = sum(self._current.values())
+        record = {
+            "ts": round(time.time(), 3),
+            "case": int(case_index),
+            "action": action,
+            "stages": stages,
+            "total_ms": round(total, 3),
+        }
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._file.flush()
+        for name, ms in self._current.items():
+            self.samples[name].append(ms)
+        self.samples["total"].append(total)
+        self._current = {}
+
+    def add_samples(self, name: str, values_ms: Iterable[float]):
+        """计入不属于单个案例的耗时（如后台线程）"""
+        if self.enabled:
+            self.samples[name].extend(values_ms)
+
+    def percentiles(self) -> Dict[str, Dict[str, float]]:
+        result: Dict[str, Dict[str, float]] = {}
+        for name in list(STAGES) + sorted(set(self.samples) - set(STAGES)):
+            values = self.samples.get(name)
+            if not values:
+                continue
+            arr = np.asarray(values)
+            p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+            result[name] = {
+                "n": int(arr.size),
+                "p50_ms": round(float(p50), 3),
+                "p95_ms": round(float(p95), 3),
+                "p99_ms": round(float(p99), 3),
+                "max_ms": round(float(arr.max()), 3),
+            }
+        return result
+
+    def summary(self) -> str:
+        stats = self.percentiles()
+        if not stats:
+            return "（本次没有可统计的案例）"
+        lines = [
+            f"{'阶段':<16} {'次数':>6} {'p50(ms)':>10} {'p95(ms)':>10} "
+            f"{'p99(ms)':>10} {'最大(ms)':>10}"
+        ]
+        for name, s in stats.items():
+            lines.append(
+                f"{STAGES.get(name, name):<16} {s['n']:>6} {s['p50_ms']:>10} "
+                f"{s['p95_ms']:>10} {s['p99_ms']:>10} {s['max_ms']:>10}"
+            )
+        return "\n".join(lines)
+
+    def close(self):
+        if self._file is not None and not self._file.closed:
+            stats = self.percentiles()
+            if stats:
+                # 末尾追加本次会话的汇总，便于事后直接读取
+                self._file.write(json.dumps({"summary": stats}, ensure_ascii=False))
+                self._file.write("\n")
+            self._file.close()
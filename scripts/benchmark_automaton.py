@@ -0,0 +1,105 @@
+"""
+关键词自动机基准：全量重建 vs 分层匹配器增量更新，随特征数量变化的耗时。
+
+用法：
+    python scripts/benchmark_automaton.py
+    python scripts/benchmark_automaton.py --sizes 500 5000 50000 --json bench_automaton.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from typing import Dict, List
+
+# 允许从项目根导入
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from hints import COMPACT_THRESHOLD, KeywordMatcher, _build_automaton
+
+# 常用汉字区间，用于生成合成关键词与文本
+_CJK_START, _CJK_END = 0x4E00, 0x4E00 + 3000
+
+
+def _random_word(rng: random.Random) -> str:
+    n = rng.randint(2, 4)
+    return "".join(chr(rng.randint(_CJK_START, _CJK_END)) for _ in range(n))
+
+
+def _timeit(fn, repeat: int) -> float:
+    """返回单次调用的中位耗时（毫秒）"""
+    times: List[float] = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    times.sort()
+    return times[len(times) // 2]
+
+
+def bench_size(n_features: int, rng: random.Random, repeat: int) -> Dict:
+    seeds = {_random_word(rng) for _ in range(n_features)}
+    text = "".join(chr(rng.randint(_CJK_START, _CJK_END)) for _ in range(4000))
+    new_terms = [_random_word(rng) for _ in range(3)]
+
+    # 1. 旧方案：每次增删学习特征都全量重建
+    rebuild_ms = _timeit(lambda: _build_automaton(seeds), repeat)
+
+    # 2. 分层方案：只更新增量层
+    matcher = KeywordMatcher()
+    matcher.rebuild(seeds, [])
+
+    def _add_remove():
+        matcher.add(new_terms)
+        matcher.remove(new_terms)
+
+    layered_ms = _timeit(_add_remove, repeat)
+
+    # 3. 匹配耗时：已压实 vs 增量层满载（压实前最坏情况）
+    match_compacted_ms = _timeit(lambda: matcher.match(text), repeat)
+    matcher.add([_random_word(rng) for _ in range(COMPACT_THRESHOLD)])
+    match_delta_ms = _timeit(lambda: matcher.match(text), repeat)
+    compact_ms = _timeit(lambda: matcher.compact(wait=True), max(1, repeat // 3))
+
+    return {
+        "features": len(seeds),
+        "full_rebuild_ms": round(rebuild_ms, 3),
+        "layered_add_remove_ms": round(layered_ms, 4),
+        "compact_ms": round(compact_ms, 3),
+        "match_compacted_ms": round(match_compacted_ms, 4),
+        "match_with_full_delta_ms": round(match_delta_ms, 4),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="关键词自动机重建/增量更新基准")
+    parser.add_argument(
+        "--sizes", type=int, nargs="+", default=[500, 2000, 10000, 50000]
+    )
+    parser.add_argument("--repeat", type=int, default=9)
+    parser.add_argument("--json", help="结果另存为 JSON 文件")
+    args = parser.parse_args()
+
+    rng = random.Random(2025)
+    results = [bench_size(n, rng, args.repeat) for n in args.sizes]
+
+    header = (
+        f"{'特征数':>8} {'全量重建ms':>12} {'分层增删ms':>12} {'后台压实ms':>12} "
+        f"{'匹配ms':>10} {'匹配(满增量)ms':>16}"
+    )
+    print(header)
+    for r in results:
+        print(
+            f"{r['features']:>10} {r['full_rebuild_ms']:>14} "
+            f"{r['layered_add_remove_ms']:>14} {r['compact_ms']:>14} "
+            f"{r['match_compacted_ms']:>12} {r['match_with_full_delta_ms']:>16}"
+        )
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
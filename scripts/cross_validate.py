@@ -0,0 +1,303 @@
+"""
+在线智能提示模型的交叉验证：K 折 × R 种标注顺序，在进程池中并行运行。
+
+用法：
+    python scripts/cross_validate.py --input data/annotated/merged_result.parquet \\
+        --folds 5 --repeats 3 --learning-rate 0.1 0.2 --min-count 4 6 --abs-log-odds 0.8 1.0
+
+- 在线学习的结果很依赖标注顺序，每次重复用不同的随机顺序打乱后再划分 K 折；
+  训练集按打乱后的顺序逐条执行与标注时相同的更新
+  （update_model_online_enhanced + update_token_stats + maybe_expand_features），测试折向量化打分
+- 超参数（LEARNING_RATE / MIN_COUNT / ABS_LOG_ODDS_THRESH）各给多个取值时运行全部组合；
+  各组合使用相同的打乱顺序与折划分，便于成对比较
+- 案例只预处理一次（evaluation.prepare_cases），每个 (组合, 重复, 折) 是一个独立任务，
+  任务内用独立的 HintEngine 从头加载模型，学习特征只登记在该引擎中，任务之间不共享模型状态
+- 输出各组合指标（AUC、平均精确率、阈值下的准确率/精确率/召回率/F1）的均值、标准差与方差，
+  以及训练吞吐；--json 另存每个任务的结果
+"""
+
+import argparse
+import itertools
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# 允许从项目根导入
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import hints
+from evaluation import (
+    evaluate_scores,
+    load_labeled,
+    prepare_cases,
+    score_cases,
+    train_online,
+)
+from hints import HintEngine
+
+DEFAULT_INPUT = "data/annotated/accident_cases_annotated_lizhijie.csv"
+# 可调的超参数：命令行参数名 -> hints 中的模块变量
+HYPERPARAMETERS = {
+    "learning_rate": "LEARNING_RATE",
+    "min_count": "MIN_COUNT",
+    "abs_log_odds": "ABS_LOG_ODDS_THRESH",
+}
+METRICS = ["auc", "average_precision", "acc", "precision", "recall", "f1"]
+
+# 子进程内的共享数据（由 _init_worker 设置，只读）
+_PREPARED = None
+_LABELS: Optional[np.ndarray] = None
+_SETTINGS: Dict = {}
+
+
+def _init_worker(prepared, labels: np.ndarray, settings: Dict):
+    global _PREPARED, _LABELS, _SETTINGS
+    _PREPARED = prepared
+    _LABELS = labels
+    _SETTINGS = settings
+
+
+def fold_rows(n: int, folds: int, seed: int, repeat: int, fold: int):
+    """第 repeat 次打乱顺序下第 fold 折的 (训练行, 测试行)；训练行保持打乱后的顺序"""
+    order = np.random.default_rng([seed, repeat]).permutation(n)
+    parts = np.array_split(order, folds)
+    train = np.concatenate([p for j, p in enumerate(parts) if j != fold])
+    return train, parts[fold]
+
+
+def run_fold(config: Dict, repeat: int, fold: int) -> Dict:
+    """在子进程中运行一个任务：按配置设置超参数，从头训练并评估一折"""
+    settings = _SETTINGS
+    for name, value in config.items():
+        setattr(hints, HYPERPARAMETERS[name], value)
+    y = _LABELS
+    train, test = fold_rows(len(y), settings["folds"], settings["seed"], repeat, fold)
+
+    engine = HintEngine.load(settings["model_base"])
+    t0 = time.perf_counter()
+    learned = train_online(
+        engine.model,
+        _PREPARED,
+        train,
+        y[train],
+        expand=settings["expand"],
+        engine=engine,
+    )
+    t1 = time.perf_counter()
+    scores = score_cases(engine.model, _PREPARED, test, learned=learned)
+    t2 = time.perf_counter()
+
+    metrics = evaluate_scores(y[test], scores, [settings["threshold"]])
+    at_threshold = metrics["thresholds"][0]
+    return {
+        **config,
+        "repeat": repeat,
+        "fold": fold,
+        "n_train": len(train),
+        "n_test": len(test),
+        "auc": metrics["auc"],
+        "average_precision": metrics["average_precision"],
+        "acc": at_threshold["acc"],
+        "precision": at_threshold["precision"],
+        "recall": at_threshold["recall"],
+        "f1": at_threshold["f1"],
+        "n_learned": len(learned),
+        "train_seconds": t1 - t0,
+        "score_seconds": t2 - t1,
+    }
+
+
+def _run_fold_task(task):
+    return run_fold(*task)
+
+
+def summarize(results: pd.DataFrame, configs: List[Dict]) -> List[Dict]:
+    """按超参数组合汇总：各指标的均值、标准差、方差与训练吞吐"""
+    summary = []
+    keys = list(configs[0])
+    for config in configs:
+        mask = np.ones(len(results), dtype=bool)
+        for k in keys:
+            mask &= results[k].to_numpy() == config[k]
+        runs = results[mask]
+        item = {**config, "runs": int(len(runs))}
+        for m in METRICS:
+            values = runs[m].to_numpy()
+            item[m] = {
+                "mean": float(values.mean()),
+                "std": float(values.std(ddof=1)) if len(values) > 1 else 0.0,
+                "var": float(values.var(ddof=1)) if len(values) > 1 else 0.0,
+            }
+        item["n_learned"] = float(runs["n_learned"].mean())
+        item["train_rate"] = float(
+            runs["n_train"].sum() / max(runs["train_seconds"].sum(), 1e-9)
+        )
+        summary.append(item)
+    return summary
+
+
+def print_summary(summary: List[Dict], folds: int, repeats: int):
+    for i, item in enumerate(summary, 1):
+        params = " ".join(f"{HYPERPARAMETERS[k]}={item[k]}" for k in HYPERPARAMETERS)
+        print(
+            f"\n配置 {i}: {params}（{folds} 折 × {repeats} 次，共 {item['runs']} 次）"
+        )
+        for m in METRICS:
+            s = item[m]
+            print(f"  {m:<18} {s['mean']:.4f} ± {s['std']:.4f}（方差 {s['var']:.6f}）")
+        print(f"  {'学习特征数':<14} {item['n_learned']:.1f}")
+        print(f"  {'训练吞吐':<15} {item['train_rate']:.0f} 条/秒/进程")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="在线智能提示模型的 K 折交叉验证")
+    parser.add_argument(
+        "--input", default=DEFAULT_INPUT, help="标注文件（CSV/Parquet）"
+    )
+    parser.add_argument(
+        "--max-samples", type=int, default=0, help="最多使用的案例数（默认全部）"
+    )
+    parser.add_argument("--folds", type=int, default=5, help="折数 K")
+    parser.add_argument("--repeats", type=int, default=3, help="打乱顺序的次数 R")
+    parser.add_argument("--seed", type=int, default=2025, help="随机种子")
+    parser.add_argument(
+        "--workers", type=int, default=None, help="进程数（默认CPU核数）"
+    )
+    parser.add_argument(
+        "--learning-rate",
+        type=float,
+        nargs="+",
+        default=[hints.LEARNING_RATE],
+        help="LEARNING_RATE 取值",
+    )
+    parser.add_argument(
+        "--min-count",
+        type=int,
+        nargs="+",
+        default=[hints.MIN_COUNT],
+        help="MIN_COUNT 取值",
+    )
+    parser.add_argument(
+        "--abs-log-odds",
+        type=float,
+        nargs="+",
+        default=[hints.ABS_LOG_ODDS_THRESH],
+        help="ABS_LOG_ODDS_THRESH 取值",
+    )
+    parser.add_argument(
+        "--threshold", type=float, default=0.5, help="计算准确率等指标的概率阈值"
+    )
+    parser.add_argument(
+        "--no-expand",
+        action="store_true",
+        help="训练时不更新 token 统计、不扩展学习特征",
+    )
+    parser.add_argument(
+        "--model-base",
+        default="eval_cv",
+        help="初始模型（HintEngine.load 的基础路径，不存在时为默认模型）",
+    )
+    parser.add_argument("--json", default=None, help="另存每个任务结果与汇总的 JSON")
+    args = parser.parse_args()
+
+    if args.folds < 2:
+        raise SystemExit("--folds 至少为 2")
+    p = Path(args.input)
+    if not p.exists():
+        raise SystemExit(f"未找到带标签数据 {p}")
+    df, y = load_labeled(p)
+    if args.max_samples:
+        df, y = df.head(args.max_samples), y[: args.max_samples]
+    if len(df) < args.folds:
+        raise SystemExit("标注数据太少，无法划分")
+
+    workers = args.workers or os.cpu_count() or 1
+    configs = [
+        dict(zip(HYPERPARAMETERS, values))
+        for values in itertools.product(
+            args.learning_rate, args.min_count, args.abs_log_odds
+        )
+    ]
+    expand = not args.no_expand
+
+    t0 = time.perf_counter()
+    prepared = prepare_cases(
+        df,
+        workers=workers,
+        candidate_min_count=min(args.min_count) if expand else None,
+    )
+    t1 = time.perf_counter()
+    print(
+        f"预处理 {len(df)} 条案例用时 {t1 - t0:.1f}s"
+        + (f"（候选学习特征 {len(prepared.candidates)} 个）" if expand else "")
+    )
+
+    settings = {
+        "folds": args.folds,
+        "seed": args.seed,
+        "threshold": args.threshold,
+        "expand": expand,
+        "model_base": args.model_base,
+    }
+    tasks = [
+        (config, repeat, fold)
+        for config in configs
+        for repeat in range(args.repeats)
+        for fold in range(args.folds)
+    ]
+    print(
+        f"运行 {len(configs)} 组超参数 × {args.repeats} 次 × {args.folds} 折，{workers} 个进程"
+    )
+
+    results: List[Dict] = []
+
+    def _collect(result: Dict):
+        results.append(result)
+        print(
+            f"  完成 {len(results)}/{len(tasks)}: 重复 {result['repeat']} "
+            f"折 {result['fold']} auc={result['auc']:.4f}"
+        )
+
+    if workers == 1:
+        _init_worker(prepared, y, settings)
+        for task in tasks:
+            _collect(_run_fold_task(task))
+    else:
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(prepared, y, settings),
+        ) as pool:
+            for result in pool.map(_run_fold_task, tasks):
+                _collect(result)
+    t2 = time.perf_counter()
+
+    frame = pd.DataFrame(results)
+    summary = summarize(frame, configs)
+    print_summary(summary, args.folds, args.repeats)
+    updates = int(frame["n_train"].sum())
+    print(
+        f"\n总计 {len(tasks)} 个任务、{updates} 次在线更新，用时 {t2 - t1:.1f}s，"
+        f"吞吐 {updates / max(t2 - t1, 1e-9):.0f} 条/秒"
+    )
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(
+                {"settings": settings, "summary": summary, "runs": results},
+                f,
+                ensure_ascii=False,
+                indent=2,
+            )
+        print(f"结果已保存到: {args.json}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,38 +1,56 @@
+"""
+无监督对比：同一批案例上 Baseline（仅关键词）与 Enhanced（关键词 + TF-IDF）的概率分布。
+
+用法：
+    python scripts/evaluate_enhancement.py [--sample N] [--workers N]
+
+案例先并行预处理一次（evaluation.prepare_cases），两套模型均向量化打分；默认使用全部案例。
+"""
+
+import argparse
 import os
 import sys
+import time
 from pathlib import Path
 from typing import List, Tuple
 
+import numpy as np
 import pandas as pd
 
 # 允许从项目根目录导入 hints（脚本从 scripts/ 运行时）
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
+from case_store import load_cases
+from evaluation import (
+    enhanced_features,
+    keyword_features,
+    learn_document_frequency,
+    prepare_cases,
+    score_cases,
+)
 from hints import (
-    _tokenize_for_learning,  # internal tokenizer for warm-up
-    extract_features,
-    extract_features_enhanced,
     load_hint_model,
     load_hint_model_enhanced,
-    normalize_text,
     predict_non_construction_proba,
     predict_non_construction_proba_enhanced,
 )
 
 
-def five_number_summary(xs: List[float]) -> Tuple[float, float, float, float, float]:
-    s = pd.Series(xs)
-    q = s.quantile([0, 0.25, 0.5, 0.75, 1.0])
-    return (
-        float(q.iloc[0]),
-        float(q.iloc[1]),
-        float(q.iloc[2]),
-        float(q.iloc[3]),
-        float(q.iloc[4]),
-    )
+def five_number_summary(xs) -> Tuple[float, float, float, float, float]:
+    q = np.quantile(np.asarray(xs, dtype=np.float64), [0, 0.25, 0.5, 0.75, 1.0])
+    return tuple(float(v) for v in q)
 
 
 def main():
+    parser = argparse.ArgumentParser(description="Baseline 与 Enhanced 概率分布对比")
+    parser.add_argument(
+        "--sample", type=int, default=0, help="随机抽取的案例数（默认全部）"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="预处理进程数（默认CPU核数）"
+    )
+    args = parser.parse_args()
+
     # 支持两种路径：项目根目录或 data/raw 目录
     csv_path = Path("accident_cases.csv")
     if not csv_path.exists():
@@ -40,49 +58,29 @@ def main():
     if not csv_path.exists():
         raise SystemExit("未找到 accident_cases.csv，请放置在项目根目录或 data/raw/")
 
-    df = pd.read_csv(csv_path)
+    df = load_cases(csv_path)
     if "full_text" not in df.columns:
         raise SystemExit("accident_cases.csv 缺少列: full_text")
 
-    # 采样一小批数据
-    sample = df[df["full_text"].notna()].sample(n=min(300, len(df)), random_state=42)
+    sample = df[df["full_text"].notna()]
+    if args.sample:
+        sample = sample.sample(n=min(args.sample, len(sample)), random_state=42)
+
+    t0 = time.perf_counter()
+    prepared = prepare_cases(sample, workers=args.workers)
+    rows = np.arange(len(sample))
+    t1 = time.perf_counter()
 
     # 加载两个模型（互不影响）
     base_model = load_hint_model("eval_baseline")
     enh_model = load_hint_model_enhanced("eval_enhanced")
 
     # 预热 TF-IDF：无监督地为增强模型累积文档频率
-    for _, row in sample.iterrows():
-        text = normalize_text(row)
-        tokens = _tokenize_for_learning(text)
-        enh_model["tfidf"].learn_one(tokens)
-
-    base_probs: List[float] = []
-    enh_probs: List[float] = []
-
-    contrib_examples = []  # 保存差异最大的若干条，展示Top贡献特征
-
-    for idx, row in sample.iterrows():
-        feats_base = extract_features(row)
-        p_base, c_base = predict_non_construction_proba(base_model, feats_base)
-
-        feats_enh = extract_features_enhanced(enh_model, row)
-        p_enh, c_enh = predict_non_construction_proba_enhanced(enh_model, feats_enh)
-
-        base_probs.append(p_base)
-        enh_probs.append(p_enh)
-
-        contrib_examples.append(
-            {
-                "index": idx,
-                "desc": str(row.get("case_description", ""))[:120],
-                "p_base": p_base,
-                "p_enh": p_enh,
-                "delta": p_enh - p_base,
-                "top_base": c_base[:5],
-                "top_enh": c_enh[:5],
-            }
-        )
+    learn_document_frequency(enh_model, prepared, rows)
+
+    base_probs = score_cases(base_model, prepared, rows, enhanced=False)
+    enh_probs = score_cases(enh_model, prepared, rows, enhanced=True)
+    t2 = time.perf_counter()
 
     # 汇总分布
     b_min, b_q1, b_med, b_q3, b_max = five_number_summary(base_probs)
@@ -93,6 +91,7 @@ def main():
     s_enh = pd.Series(enh_probs).rank(method="average")
     corr = s_base.corr(s_enh)
 
+    print(f"样本规模: {len(sample)}（预处理 {t1 - t0:.1f}s / 打分 {t2 - t1:.2f}s）")
     print("=== 概率分布（非建筑业概率）===")
     print(
         "Baseline  min/Q1/med/Q3/max:",
@@ -104,24 +103,30 @@ def main():
     )
     print(f"Spearman 相关: {corr:.3f}")
 
-    # 展示差异最大的样本
-    print("\n=== 增强提高最多的样本（Top 5）===")
-    for item in sorted(contrib_examples, key=lambda x: x["delta"], reverse=True)[:5]:
-        print(
-            f"[+]{item['delta']:+.3f} idx={item['index']} base={item['p_base']:.3f} enh={item['p_enh']:.3f}"
-        )
-        print("  摘要:", item["desc"])
-        print("  Base:", item["top_base"])  # (feature, contribution)
-        print("  Enh :", item["top_enh"])  # (feature, contribution)
-
-    print("\n=== 增强降低最多的样本（Top 5）===")
-    for item in sorted(contrib_examples, key=lambda x: x["delta"])[:5]:
-        print(
-            f"[-]{item['delta']:+.3f} idx={item['index']} base={item['p_base']:.3f} enh={item['p_enh']:.3f}"
-        )
-        print("  摘要:", item["desc"])
-        print("  Base:", item["top_base"])  # (feature, contribution)
-        print("  Enh :", item["top_enh"])  # (feature, contribution)
+    # 差异最大的样本才逐条计算贡献特征
+    delta = enh_probs - base_probs
+    order = np.argsort(delta, kind="stable")
+
+    def show(title: str, sign: str, picked: List[int]):
+        print(title)
+        for i in picked:
+            _, c_base = predict_non_construction_proba(
+                base_model, keyword_features(prepared, i)
+            )
+            _, c_enh = predict_non_construction_proba_enhanced(
+                enh_model, enhanced_features(enh_model, prepared, i)
+            )
+            row = sample.iloc[i]
+            print(
+                f"[{sign}]{delta[i]:+.3f} idx={sample.index[i]} "
+                f"base={base_probs[i]:.3f} enh={enh_probs[i]:.3f}"
+            )
+            print("  摘要:", str(row.get("case_description", ""))[:120])
+            print("  Base:", c_base[:5])  # (feature, contribution)
+            print("  Enh :", c_enh[:5])  # (feature, contribution)
+
+    show("\n=== 增强提高最多的样本（Top 5）===", "+", order[::-1][:5].tolist())
+    show("\n=== 增强降低最多的样本（Top 5）===", "-", order[:5].tolist())
 
 
 if __name__ == "__main__":
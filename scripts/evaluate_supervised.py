@@ -1,24 +1,39 @@
+"""
+有监督评估：在线学习 70/30 划分，对比 Baseline（仅关键词）与 Enhanced（关键词 + TF-IDF）。
+
+用法：
+    python scripts/evaluate_supervised.py [--input 标注文件] [--max-samples N] [--workers N]
+
+整个带标签数据集先并行预处理一次（evaluation.prepare_cases），训练按行在线更新，
+测试集向量化打分，指标用 NumPy 计算；默认使用全部带标签案例。
+"""
+
+import argparse
 import os
 import sys
+import time
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Tuple
+from typing import List
 
-import pandas as pd
+import numpy as np
 
 # 允许从项目根导入
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
-from hints import (
-    extract_features,
-    extract_features_enhanced,
-    load_hint_model,
-    load_hint_model_enhanced,
-    predict_non_construction_proba,
-    predict_non_construction_proba_enhanced,
-    update_model_online,
-    update_model_online_enhanced,
+from evaluation import (
+    DEFAULT_THRESHOLDS,
+    average_precision,
+    load_labeled,
+    prepare_cases,
+    roc_auc,
+    score_cases,
+    threshold_metrics,
+    train_online,
 )
+from hints import load_hint_model, load_hint_model_enhanced
+
+DEFAULT_INPUT = "data/annotated/accident_cases_annotated_lizhijie.csv"
 
 
 @dataclass
@@ -27,110 +42,93 @@ class Metrics:
     auc: float
     precision: float
     recall: float
+    ap: float
     size: int
 
 
-def simple_auc(y_true: List[int], y_score: List[float]) -> float:
-    # ROC AUC（纯 Python）：排序后用梯形积分
-    data = sorted(zip(y_score, y_true), key=lambda x: x[0])
-    P = sum(y_true)
-    N = len(y_true) - P
-    if P == 0 or N == 0:
-        return 0.5
-    tp = fp = 0
-    prev_score = None
-    tpr_fpr: List[Tuple[float, float]] = [(0.0, 0.0)]
-    for score, label in data:
-        if prev_score is None or score != prev_score:
-            tpr_fpr.append((tp / P, fp / N))
-            prev_score = score
-        if label == 1:
-            tp += 1
-        else:
-            fp += 1
-    tpr_fpr.append((tp / P, fp / N))
-    # 按 FPR 升序积分
-    tpr_fpr = sorted(set(tpr_fpr), key=lambda x: x[1])
-    auc = 0.0
-    for i in range(1, len(tpr_fpr)):
-        tpr1, fpr1 = tpr_fpr[i - 1]
-        tpr2, fpr2 = tpr_fpr[i]
-        auc += (fpr2 - fpr1) * (tpr1 + tpr2) / 2.0
-    return max(0.0, min(1.0, auc))
-
-
-def compute_metrics(y_true: List[int], y_score: List[float]) -> Metrics:
-    # 1 表示“非建筑业”
-    y_pred = [1 if s >= 0.5 else 0 for s in y_score]
-    tp = sum(1 for yt, yp in zip(y_true, y_pred) if yt == 1 and yp == 1)
-    tn = sum(1 for yt, yp in zip(y_true, y_pred) if yt == 0 and yp == 0)
-    fp = sum(1 for yt, yp in zip(y_true, y_pred) if yt == 0 and yp == 1)
-    fn = sum(1 for yt, yp in zip(y_true, y_pred) if yt == 1 and yp == 0)
-    acc = (tp + tn) / max(1, len(y_true))
-    precision = tp / max(1, (tp + fp))
-    recall = tp / max(1, (tp + fn))
-    auc = simple_auc(y_true, y_score)
+def compute_metrics(y_true, y_score) -> Metrics:
+    # 1 表示“非建筑业”，概率 >= 0.5 判为非建筑业
+    at_half = threshold_metrics(y_true, y_score, [0.5])[0]
     return Metrics(
-        acc=acc, auc=auc, precision=precision, recall=recall, size=len(y_true)
+        acc=at_half["acc"],
+        auc=roc_auc(y_true, y_score),
+        precision=at_half["precision"],
+        recall=at_half["recall"],
+        ap=average_precision(y_true, y_score),
+        size=len(y_true),
     )
 
 
+def print_thresholds(name: str, y_true, y_score, thresholds: List[float]):
+    for m in threshold_metrics(y_true, y_score, thresholds):
+        print(
+            f"  {name} @{m['threshold']:.2f}: acc={m['acc']:.4f} "
+            f"precision={m['precision']:.4f} recall={m['recall']:.4f} f1={m['f1']:.4f}"
+        )
+
+
 def main():
+    parser = argparse.ArgumentParser(description="有监督评估（在线学习）")
+    parser.add_argument(
+        "--input", default=DEFAULT_INPUT, help="标注文件（CSV/Parquet）"
+    )
+    parser.add_argument(
+        "--max-samples", type=int, default=0, help="最多使用的案例数（默认全部）"
+    )
+    parser.add_argument("--train-frac", type=float, default=0.7, help="训练集比例")
+    parser.add_argument(
+        "--workers", type=int, default=None, help="预处理进程数（默认CPU核数）"
+    )
+    parser.add_argument(
+        "--thresholds",
+        type=float,
+        nargs="+",
+        default=list(DEFAULT_THRESHOLDS),
+        help="报告准确率等指标的阈值",
+    )
+    args = parser.parse_args()
+
     # 读取标注数据
-    p = Path("data/annotated/accident_cases_annotated_lizhijie.csv")
+    p = Path(args.input)
     if not p.exists():
-        raise SystemExit(
-            "未找到带标签数据 data/annotated/accident_cases_annotated_lizhijie.csv"
-        )
-    df = pd.read_csv(p)
-    df = df[df["full_text"].notna()]
-    df = df[df["is_construction"].isin([0, 1])]
+        raise SystemExit(f"未找到带标签数据 {p}")
+    df, _ = load_labeled(p)
     if df.empty:
         raise SystemExit("标注数据为空或缺少 is_construction 标签")
 
-    # 采样并划分训练/测试（在线学习）
+    # 打乱并划分训练/测试（在线学习）
     df = df.sample(frac=1.0, random_state=2025)
-    n = min(3000, len(df))
-    df = df.head(n)
-    split = int(len(df) * 0.7)
-    train = df.iloc[:split]
-    test = df.iloc[split:]
+    if args.max_samples:
+        df = df.head(args.max_samples)
+    split = int(len(df) * args.train_frac)
+    y = (df["is_construction"].to_numpy() == 0).astype(np.int8)
+
+    t0 = time.perf_counter()
+    prepared = prepare_cases(df, workers=args.workers)
+    t1 = time.perf_counter()
 
     # 准备两套独立模型
     base_model = load_hint_model("eval_sup_base")
     enh_model = load_hint_model_enhanced("eval_sup_enh")
 
     # 在线训练（按行更新）
-    for _, row in train.iterrows():
-        label_non_construction = 1 if row["is_construction"] == 0 else 0
-        # baseline
-        feats_b = extract_features(row)
-        update_model_online(base_model, feats_b, label_non_construction)
-        # enhanced（注意传 row+feats）
-        feats_e = extract_features_enhanced(enh_model, row)
-        update_model_online_enhanced(enh_model, row, feats_e, label_non_construction)
+    train_rows = np.arange(split)
+    train_online(base_model, prepared, train_rows, y[:split], enhanced=False)
+    train_online(enh_model, prepared, train_rows, y[:split], enhanced=True)
+    t2 = time.perf_counter()
 
     # 评估
-    y_true: List[int] = []
-    y_base: List[float] = []
-    y_enh: List[float] = []
-    for _, row in test.iterrows():
-        label_non_construction = 1 if row["is_construction"] == 0 else 0
-        y_true.append(label_non_construction)
-        # baseline
-        feats_b = extract_features(row)
-        p_b, _ = predict_non_construction_proba(base_model, feats_b)
-        y_base.append(p_b)
-        # enhanced
-        feats_e = extract_features_enhanced(enh_model, row)
-        p_e, _ = predict_non_construction_proba_enhanced(enh_model, feats_e)
-        y_enh.append(p_e)
-
+    test_rows = np.arange(split, len(df))
+    y_true = y[split:]
+    y_base = score_cases(base_model, prepared, test_rows, enhanced=False)
+    y_enh = score_cases(enh_model, prepared, test_rows, enhanced=True)
     m_base = compute_metrics(y_true, y_base)
     m_enh = compute_metrics(y_true, y_enh)
+    t3 = time.perf_counter()
 
     print("=== 有监督评估（在线学习，70/30） ===")
-    print(f"样本规模: 训练 {len(train)} / 测试 {len(test)}")
+    print(f"样本规模: 训练 {split} / 测试 {len(df) - split}")
+    print(f"耗时: 预处理 {t1 - t0:.1f}s / 训练 {t2 - t1:.1f}s / 打分 {t3 - t2:.2f}s")
     print("Baseline:", vars(m_base))
     print("Enhanced:", vars(m_enh))
     print(
@@ -140,8 +138,12 @@ def main():
             "auc": round(m_enh.auc - m_base.auc, 4),
             "precision": round(m_enh.precision - m_base.precision, 4),
             "recall": round(m_enh.recall - m_base.recall, 4),
+            "ap": round(m_enh.ap - m_base.ap, 4),
         },
     )
+    print("各阈值:")
+    print_thresholds("Baseline", y_true, y_base, args.thresholds)
+    print_thresholds("Enhanced", y_true, y_enh, args.thresholds)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,145 @@
+"""
+由已有标注一次性重建智能提示模型（模型文件丢失或种子关键词变化后，无需重新逐条标注）。
+
+用法：
+    python scripts/retrain.py data/annotated/merged_result.parquet [-o 模型基础路径] [--workers N]
+
+- 标注文件（CSV/Parquet）先并行预处理一次（evaluation.prepare_cases），按当前种子配置匹配关键词
+- token 统计与 TF-IDF 文档频率向量化累计，按最终的 token 统计扩展学习特征
+- 关键词 + 学习特征 + TF-IDF 特征矩阵上用小批量 SGD 拟合权重与偏置，L2 正则与偏置的处理
+  与标注时的在线更新（update_model_online_enhanced）相同
+- 输出 *_hint_model.bin（含学习特征列表），可直接用 load_hint_model_enhanced 加载并继续在线标注；
+  保存后重新加载，在前 --check-size 条上核对逐条打分与训练结果一致
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+# 允许从项目根导入
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+import hints
+from evaluation import (
+    load_labeled,
+    prepare_cases,
+    roc_auc,
+    score_cases,
+    train_batch,
+)
+from hints import HintEngine, binary_model_path_from_base, model_path_from_base
+
+
+def main():
+    parser = argparse.ArgumentParser(description="由已有标注批量重建智能提示模型")
+    parser.add_argument("input", help="标注文件（CSV/Parquet）")
+    parser.add_argument(
+        "-o",
+        "--output",
+        default=None,
+        help="模型基础路径（默认与标注文件相同，即保存为 <文件名>_hint_model.bin）",
+    )
+    parser.add_argument(
+        "--workers", type=int, default=None, help="预处理进程数（默认CPU核数）"
+    )
+    parser.add_argument("--epochs", type=int, default=10, help="SGD 轮数")
+    parser.add_argument("--batch-size", type=int, default=256, help="每批案例数")
+    parser.add_argument(
+        "--learning-rate",
+        type=float,
+        default=2.0,
+        help="初始学习率（第 k 轮为 学习率/sqrt(k)）",
+    )
+    parser.add_argument(
+        "--l2", type=float, default=hints.L2_LAMBDA, help="L2 正则化系数"
+    )
+    parser.add_argument("--seed", type=int, default=2025, help="打乱批次的随机种子")
+    parser.add_argument(
+        "--no-expand", action="store_true", help="不扩展学习特征，只用种子关键词"
+    )
+    parser.add_argument("--force", action="store_true", help="覆盖已存在的模型文件")
+    parser.add_argument(
+        "--check-size",
+        type=int,
+        default=200,
+        help="保存后重新加载并核对打分的案例数（0 为不核对）",
+    )
+    args = parser.parse_args()
+
+    p = Path(args.input)
+    if not p.exists():
+        raise SystemExit(f"未找到标注文件 {p}")
+    output = args.output or str(p)
+    existing = [
+        path
+        for path in (binary_model_path_from_base(output), model_path_from_base(output))
+        if path.exists()
+    ]
+    if existing and not args.force:
+        raise SystemExit(f"模型文件已存在: {existing[0]}（使用 --force 覆盖）")
+
+    df, y = load_labeled(p)
+    if df.empty:
+        raise SystemExit("标注数据为空或缺少 is_construction 标签")
+    expand = not args.no_expand
+
+    t0 = time.perf_counter()
+    prepared = prepare_cases(
+        df,
+        workers=args.workers,
+        candidate_min_count=hints.MIN_COUNT if expand else None,
+    )
+    t1 = time.perf_counter()
+    print(f"预处理 {len(df)} 条标注用时 {t1 - t0:.1f}s")
+
+    def _report(epoch: int, loss: float):
+        print(f"  第 {epoch} 轮: 目标值 {loss:.4f}（{time.perf_counter() - t1:.1f}s）")
+
+    engine = HintEngine()
+    print(engine.seed_load_summary())
+    rows = np.arange(len(df))
+    learned = train_batch(
+        engine.model,
+        prepared,
+        rows,
+        y,
+        expand=expand,
+        engine=engine,
+        epochs=args.epochs,
+        batch_size=args.batch_size,
+        learning_rate=args.learning_rate,
+        l2=args.l2,
+        seed=args.seed,
+        callback=_report,
+    )
+    t2 = time.perf_counter()
+
+    train_auc = roc_auc(y, score_cases(engine.model, prepared, rows, learned=learned))
+    model = engine.model
+    print(
+        f"训练 {len(df)} 条（非建筑业 {int(y.sum())} 条）用时 {t2 - t1:.1f}s："
+        f"特征 {len(model['weights'])} 个（学习特征 {len(learned)} 个），"
+        f"token 统计 {len(model['token_stats'])} 条，训练集 AUC {train_auc:.4f}"
+    )
+    saved = binary_model_path_from_base(output)
+    saved.parent.mkdir(parents=True, exist_ok=True)
+    engine.save(output)
+    print(f"模型已保存到: {saved}")
+
+    if args.check_size > 0:
+        # 用新引擎重新加载模型，按在线标注的路径从原文逐条提取特征打分，应与训练结果一致
+        check = rows[: args.check_size]
+        expected = score_cases(model, prepared, check, learned=learned)
+        actual = HintEngine.load(output).predict_many(df.iloc[check])
+        diff = float(np.abs(actual - expected).max())
+        if diff > 1e-6:
+            raise SystemExit(f"重新加载后的打分与训练结果不一致（最大差 {diff:.3g}）")
+        print(f"重新加载校验通过：{len(check)} 条打分最大差 {diff:.3g}")
+
+
+if __name__ == "__main__":
+    main()
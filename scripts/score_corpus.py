@@ -0,0 +1,266 @@
+"""
+离线批量打分：用已训练的智能提示模型为整个语料计算非建筑业概率。
+
+用法：
+    python scripts/score_corpus.py data/annotated/accident_cases_annotated_张三_hint_model.bin \\
+        data/raw/accident_cases.csv -o data/scored/accident_cases_scored.parquet
+
+- 模型支持 *_hint_model.bin / *_hint_model.json，只读取指定的文件（二进制模型各进程以 mmap 只读共享）；
+  文件不存在或无法读取时报错退出，不会退回默认模型
+- 输入支持 CSV / Parquet，按块读取（CSV 已导入案例库 data/store/ 时改读案例库）；每块交给进程池打分（各进程独立持有 jieba 与 AC 自动机）
+- 结果新增列：hint_prob（非建筑业概率）、hint_top_features（贡献最大的特征）
+- 每块结果先写入 <输出>.parts/ 目录，中断后重新运行会跳过已完成的块；
+  模型文件（大小、修改时间）、输入或块大小变化时拒绝续跑，避免新旧分数混在一起
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+# 允许从项目根导入
+sys.path.append(os.path.dirname(os.path.dirname(__file__)))
+
+from case_store import is_store_current, store_path_for
+from hints import (
+    CaseAnalysis,
+    extract_features_enhanced,
+    load_hint_model_file,
+    normalize_text,
+    predict_non_construction_proba_enhanced,
+)
+
+# 打分只需要这些列，其余列不发送给子进程
+SCORE_COLUMNS = ["title", "category", "publish_date", "date", "full_text"]
+MODEL_SUFFIXES = ("_hint_model.bin", "_hint_model.json")
+
+# 子进程内的模型（由 _init_worker 加载）
+_WORKER_MODEL: Optional[Dict] = None
+
+
+def check_model_file(model_file: str) -> Path:
+    """检查模型文件名与存在性（打分只读取这个文件，不按基础路径另选 .bin/.json）"""
+    p = Path(model_file)
+    if not p.name.endswith(MODEL_SUFFIXES):
+        raise SystemExit(
+            f"模型文件名应以 {' 或 '.join(MODEL_SUFFIXES)} 结尾: {model_file}"
+        )
+    if not p.is_file():
+        raise SystemExit(f"未找到模型文件: {model_file}")
+    return p
+
+
+def _init_worker(model_file: str):
+    global _WORKER_MODEL
+    _WORKER_MODEL = load_hint_model_file(model_file, use_mmap=True)
+
+
+def format_top_features(contrib: List[Tuple[str, float]], k: int = 5) -> str:
+    return ";".join(f"{name}:{c:+.3f}" for name, c in contrib[:k])
+
+
+def score_chunk(chunk: pd.DataFrame) -> Tuple[List[float], List[str]]:
+    """在子进程中为一块数据打分（批量打分不更新模型，无需缓存分析结果）"""
+    model = _WORKER_MODEL
+    probs: List[float] = []
+    tops: List[str] = []
+    for _, row in chunk.iterrows():
+        analysis = CaseAnalysis(normalize_text(row))
+        feats = extract_features_enhanced(model, row, analysis)
+        p, contrib = predict_non_construction_proba_enhanced(model, feats)
+        probs.append(p)
+        tops.append(format_top_features(contrib))
+    return probs, tops
+
+
+def iter_chunks(input_file: Path, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """按块读取输入文件（块的划分只取决于 chunk_size，保证续跑时编号一致）"""
+    if input_file.suffix == ".parquet":
+        pf = pq.ParquetFile(input_file)
+        for batch in pf.iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        # 全部按字符串读取，避免各块类型推断不一致（如某块某列全为空）
+        yield from pd.read_csv(
+            input_file,
+            encoding="utf-8-sig",
+            dtype=str,
+            keep_default_na=False,
+            na_values=[""],
+            chunksize=chunk_size,
+        )
+
+
+def _null_as_string(schema: pa.Schema) -> pa.Schema:
+    # 块内全为空的列推断为 null 类型，按字符串写出以便与其他块合并
+    return pa.schema(
+        [f.with_type(pa.string()) if pa.types.is_null(f.type) else f for f in schema]
+    )
+
+
+def _part_table(chunk: pd.DataFrame) -> pa.Table:
+    table = pa.Table.from_pandas(chunk, preserve_index=False)
+    return table.cast(_null_as_string(table.schema))
+
+
+def model_fingerprint(model_path: Path) -> Dict:
+    """模型文件的大小与修改时间：模型重新训练后续跑不会混入旧分数"""
+    st = model_path.stat()
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def _check_manifest(parts_dir: Path, manifest: Dict):
+    path = parts_dir / "_manifest.json"
+    if path.exists():
+        with open(path, "r", encoding="utf-8") as f:
+            old = json.load(f)
+        if old != manifest:
+            raise SystemExit(
+                f"{parts_dir} 中已有其他参数的打分结果（{old}），请删除后重试"
+            )
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, ensure_ascii=False, indent=2)
+
+
+def _write_output(parts: List[Path], output_file: Path):
+    """将各块结果按顺序合并为最终输出（逐块写入，不整体载入内存）"""
+    output_file.parent.mkdir(parents=True, exist_ok=True)
+    if output_file.suffix == ".parquet":
+        writer = None
+        try:
+            for part in parts:
+                table = pq.read_table(part)
+                if writer is None:
+                    writer = pq.ParquetWriter(
+                        output_file, _null_as_string(table.schema)
+                    )
+                writer.write_table(table.cast(writer.schema))
+        finally:
+            if writer is not None:
+                writer.close()
+    else:
+        for i, part in enumerate(parts):
+            pd.read_parquet(part).to_csv(
+                output_file,
+                mode="w" if i == 0 else "a",
+                header=(i == 0),
+                index=False,
+                encoding="utf-8-sig" if i == 0 else "utf-8",
+            )
+
+
+def score_corpus(
+    model_file: str,
+    input_file: str,
+    output_file: str,
+    chunk_size: int = 2000,
+    workers: Optional[int] = None,
+):
+    model_path = check_model_file(model_file)
+    # 先在主进程读取一次：模型文件损坏时直接报错，不创建分块目录与进程池
+    load_hint_model_file(str(model_path), use_mmap=True)
+    input_path = Path(input_file)
+    # 原始 CSV 已导入案例库时直接读案例库（解压比解析 CSV 快得多）
+    if input_path.suffix != ".parquet":
+        store_path = store_path_for(input_path)
+        if is_store_current(input_path, store_path):
+            input_path = store_path
+    output_path = Path(output_file)
+    parts_dir = output_path.parent / f"{output_path.name}.parts"
+    parts_dir.mkdir(parents=True, exist_ok=True)
+    _check_manifest(
+        parts_dir,
+        {
+            "model": str(model_path.resolve()),
+            "model_file": model_fingerprint(model_path),
+            "input": str(input_path.resolve()),
+            "chunk_size": chunk_size,
+        },
+    )
+    workers = workers or os.cpu_count() or 1
+
+    print(f"模型: {model_file}")
+    print(f"输入: {input_path}（每块 {chunk_size} 行，{workers} 个进程）")
+
+    parts: List[Path] = []
+    in_flight: Dict[int, Tuple[object, pd.DataFrame]] = {}
+    scored_rows = 0
+    skipped_chunks = 0
+    t0 = time.perf_counter()
+
+    def _collect(chunk_id: int):
+        nonlocal scored_rows
+        fut, chunk = in_flight.pop(chunk_id)
+        probs, tops = fut.result()
+        chunk = chunk.copy()
+        chunk["hint_prob"] = probs
+        chunk["hint_top_features"] = tops
+        part = parts_dir / f"part-{chunk_id:05d}.parquet"
+        tmp = part.with_suffix(".tmp")
+        pq.write_table(_part_table(chunk), tmp)
+        os.replace(tmp, part)
+        scored_rows += len(chunk)
+        elapsed = time.perf_counter() - t0
+        print(
+            f"  块 {chunk_id}: {len(chunk)} 行，累计 {scored_rows} 行，"
+            f"{scored_rows / max(elapsed, 1e-9):.1f} 行/秒"
+        )
+
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(str(model_path),)
+    ) as pool:
+        for chunk_id, chunk in enumerate(iter_chunks(input_path, chunk_size)):
+            part = parts_dir / f"part-{chunk_id:05d}.parquet"
+            parts.append(part)
+            if part.exists():
+                skipped_chunks += 1
+                continue
+            if "full_text" not in chunk.columns:
+                raise SystemExit("输入文件缺少列: full_text")
+            cols = [c for c in SCORE_COLUMNS if c in chunk.columns]
+            fut = pool.submit(score_chunk, chunk[cols])
+            in_flight[chunk_id] = (fut, chunk)
+            # 限制在途块数，避免读取速度远超打分速度时占满内存
+            while len(in_flight) >= workers * 2:
+                _collect(min(in_flight))
+        while in_flight:
+            _collect(min(in_flight))
+
+    elapsed = time.perf_counter() - t0
+    print(f"\n合并 {len(parts)} 个分块到: {output_path}")
+    _write_output(parts, output_path)
+    if skipped_chunks:
+        print(f"跳过已完成的块: {skipped_chunks} 个")
+    print(
+        f"本次打分 {scored_rows} 行，用时 {elapsed:.1f} 秒，"
+        f"吞吐 {scored_rows / max(elapsed, 1e-9):.1f} 行/秒"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="用智能提示模型为整个语料批量打分")
+    parser.add_argument("model", help="模型文件（*_hint_model.bin 或 .json）")
+    parser.add_argument("input", help="原始数据（CSV 或 Parquet）")
+    parser.add_argument(
+        "-o", "--output", required=True, help="输出文件（.parquet/.csv）"
+    )
+    parser.add_argument("--chunk-size", type=int, default=2000, help="每块行数")
+    parser.add_argument(
+        "--workers", type=int, default=None, help="进程数（默认CPU核数）"
+    )
+    args = parser.parse_args()
+
+    score_corpus(args.model, args.input, args.output, args.chunk_size, args.workers)
+
+
+if __name__ == "__main__":
+    main()
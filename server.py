@@ -0,0 +1,560 @@
+# -*- coding: utf-8 -*-
+"""
+网页标注服务：一个进程同时为多名标注者服务（标准库 ThreadingHTTPServer）。
+
+- 案例分配与标注记录使用共享队列（shared_queue.py）：每名标注者一个会话（租约、撤销），
+  所有会话共用同一个案例库读取器
+- 所有人的标注都更新同一个智能提示模型：更新与撤销按到达顺序放入队列，由单独的
+  更新线程逐个执行，请求线程只读取模型（打分），不会等待更新完成
+- /api/stats 返回各接口的延迟分位数、吞吐量与更新队列长度
+
+用法：
+    python shared_queue.py init data/shared/queue.db data/raw/accident_cases.csv
+    python server.py data/shared/queue.db --port 8000
+    # 浏览器打开 http://<服务器地址>:8000/
+
+接口（JSON）：
+    POST /api/next   {"annotator"}                      -> 当前待标注案例
+    POST /api/label  {"annotator", "case", "label"}     -> 记录标注（1/0/-1 跳过），返回下一个案例
+    POST /api/undo   {"annotator"}                      -> 撤销上一个标注，返回该案例
+    GET  /api/stats                                     -> 延迟、吞吐量与标注进度
+"""
+
+import argparse
+import json
+import queue
+import threading
+import time
+from collections import defaultdict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Deque, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from case_store import CaseReader, LabeledCases
+from excerpt import key_excerpt_for_row
+from hints import (
+    OnlineTFIDF,
+    analyze_case,
+    extract_features_enhanced,
+    load_hint_model_enhanced,
+    maybe_expand_features,
+    predict_non_construction_proba_enhanced,
+    remove_learned_features,
+    rollback_token_stats,
+    rollback_update,
+    save_hint_model_enhanced,
+    start_warm_up,
+    update_model_online_enhanced,
+    update_token_stats,
+)
+from shared_queue import SharedQueue, connect, queue_status
+from utils import OPTIONAL_FIELDS
+
+# 共享智能提示模型的保存位置（<基础名>_hint_model.bin）
+MODEL_BASE = "data/annotated/accident_cases_annotated_server"
+# 每处理多少次模型更新保存一次
+SAVE_EVERY = 10
+# 每个接口保留最近多少次请求的耗时用于计算分位数
+LATENCY_WINDOW = 10000
+# 吞吐量按最近多少秒计算
+THROUGHPUT_WINDOW = 60.0
+
+
+class RequestStats:
+    """各接口的请求耗时与吞吐量（线程安全）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = time.time()
+        self._latency: Dict[str, Deque[float]] = defaultdict(
+            lambda: deque(maxlen=LATENCY_WINDOW)
+        )
+        self._counts: Dict[str, int] = defaultdict(int)
+        self._errors: Dict[str, int] = defaultdict(int)
+        self._recent: Deque[float] = deque()
+
+    def record(self, endpoint: str, elapsed_ms: float, ok: bool = True):
+        now = time.time()
+        with self._lock:
+            self._latency[endpoint].append(elapsed_ms)
+            self._counts[endpoint] += 1
+            if not ok:
+                self._errors[endpoint] += 1
+            self._recent.append(now)
+            while self._recent and self._recent[0] < now - THROUGHPUT_WINDOW:
+                self._recent.popleft()
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            endpoints = {}
+            for name, values in self._latency.items():
+                arr = np.asarray(values)
+                p50, p95, p99 = np.percentile(arr, [50, 95, 99])
+                endpoints[name] = {
+                    "count": self._counts[name],
+                    "errors": self._errors[name],
+                    "p50_ms": round(float(p50), 3),
+                    "p95_ms": round(float(p95), 3),
+                    "p99_ms": round(float(p99), 3),
+                    "max_ms": round(float(arr.max()), 3),
+                }
+            uptime = time.time() - self.started
+            total = sum(self._counts.values())
+            window = min(uptime, THROUGHPUT_WINDOW)
+            return {
+                "uptime_s": round(uptime, 1),
+                "requests": total,
+                "throughput_rps": round(total / uptime, 3) if uptime > 0 else 0.0,
+                "recent_rps": round(len(self._recent) / window, 3) if window else 0.0,
+                "endpoints": endpoints,
+            }
+
+
+class ModelUpdater:
+    """共享智能提示模型的串行更新线程。
+
+    请求线程只提交任务（标注、撤销）并立即返回；任务按提交顺序执行，
+    标注产生的增量写回提交时给出的记录（dict），撤销同一记录时据此回滚。
+    """
+
+    def __init__(self, model: Dict, model_base: str):
+        self.model = model
+        self.model_base = model_base
+        self._jobs: "queue.Queue[Optional[Tuple]]" = queue.Queue()
+        self.applied = 0
+        self.update_ms: Deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self._thread = threading.Thread(
+            target=self._run, name="model-updater", daemon=True
+        )
+        self._thread.start()
+
+    def submit_label(self, record: Dict, row, analysis, feats, label_non_construction):
+        self._jobs.put(("label", record, row, analysis, feats, label_non_construction))
+
+    def submit_undo(self, record: Dict):
+        self._jobs.put(("undo", record))
+
+    @property
+    def pending(self) -> int:
+        return self._jobs.qsize()
+
+    def _apply_label(self, record, row, analysis, feats, label_non_construction):
+        model = self.model
+        lr_delta = update_model_online_enhanced(
+            model, row, feats, label_non_construction, analysis=analysis
+        )
+        tok_delta = update_token_stats(
+            model, row, label_non_construction, analysis=analysis
+        )
+        new_feats = maybe_expand_features(model)
+        record.update({"lr": lr_delta, "tok": tok_delta, "new": new_feats})
+
+    def _apply_undo(self, record):
+        if "lr" not in record:
+            return
+        rollback_update(self.model, record["lr"])
+        rollback_token_stats(self.model, record["tok"])
+        remove_learned_features(self.model, record["new"])
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            t0 = time.perf_counter()
+            try:
+                if job[0] == "label":
+                    self._apply_label(*job[1:])
+                else:
+                    self._apply_undo(job[1])
+                self.applied += 1
+                if self.applied % SAVE_EVERY == 0:
+                    save_hint_model_enhanced(self.model_base, self.model)
+            except Exception as e:
+                print(f"⚠️  模型更新失败: {e}")
+            self.update_ms.append((time.perf_counter() - t0) * 1000)
+
+    def close(self):
+        """处理完已提交的更新后保存模型"""
+        self._jobs.put(None)
+        self._thread.join()
+        try:
+            save_hint_model_enhanced(self.model_base, self.model)
+        except Exception as e:
+            print(f"⚠️  模型保存失败: {e}")
+
+
+class AnnotatorSession:
+    """一名标注者的会话：共享队列上的租约、当前案例与撤销记录"""
+
+    def __init__(self, db_path: Path, annotator: str, reader: CaseReader):
+        self.annotator = annotator
+        self.queue = SharedQueue(db_path, annotator, check_same_thread=False)
+        self.cases: LabeledCases = self.queue.open_cases(reader)
+        self.lock = threading.Lock()
+        self.position = 0
+        self.current: Optional[int] = None
+        self.current_feats: Optional[Dict[str, float]] = None
+        # (案例行号, 模型更新记录)；跳过没有模型更新，记录为 None
+        self.history: List[Tuple[int, Optional[Dict]]] = []
+        self.labeled = 0
+
+    def close(self):
+        self.queue.close()
+
+
+class AnnotationService:
+    """标注服务：管理会话、共享模型与统计"""
+
+    def __init__(self, db_path: Path, model_base: str = MODEL_BASE):
+        self.db_path = Path(db_path)
+        probe = SharedQueue(self.db_path, "")
+        self.store_path = probe.store_path
+        probe.conn.close()
+        self.reader = CaseReader(self.store_path)
+        Path(model_base).parent.mkdir(parents=True, exist_ok=True)
+        self.model = load_hint_model_enhanced(model_base)
+        # TF-IDF 模块预先创建，避免请求线程并发首次打分时各建一个
+        if self.model.get("tfidf") is None:
+            self.model["tfidf"] = OnlineTFIDF(max_features=300)
+        self.updater = ModelUpdater(self.model, model_base)
+        self.stats = RequestStats()
+        self._sessions: Dict[str, AnnotatorSession] = {}
+        self._sessions_lock = threading.Lock()
+        self._status_conn = connect(self.db_path, check_same_thread=False)
+        self._status_lock = threading.Lock()
+
+    def session(self, annotator: str) -> AnnotatorSession:
+        annotator = annotator.strip()
+        if not annotator:
+            raise ValueError("缺少标注者用户名")
+        with self._sessions_lock:
+            s = self._sessions.get(annotator)
+            if s is None:
+                s = AnnotatorSession(self.db_path, annotator, self.reader)
+                self._sessions[annotator] = s
+            return s
+
+    def _present(self, s: AnnotatorSession) -> Dict:
+        """领取（或沿用）当前案例并生成显示内容与智能提示"""
+        s.position = s.queue.next_pending(s.position)
+        if s.position >= len(s.queue):
+            s.current = None
+            s.current_feats = None
+            return {"done": True, "labeled": s.labeled}
+        idx = s.queue.case_at(s.position)
+        row = s.cases.row(idx)
+        analysis = analyze_case(row)
+        hint = None
+        feats = None
+        try:
+            feats = extract_features_enhanced(self.model, row, analysis)
+            prob, contrib = predict_non_construction_proba_enhanced(self.model, feats)
+            hint = {
+                "prob": round(prob, 4),
+                "reasons": [name for name, c in contrib if c != 0][:3],
+            }
+        except Exception:
+            feats = None
+        s.current = idx
+        s.current_feats = feats
+        keyword, excerpt = key_excerpt_for_row(row)
+        full_text = str(row["full_text"])
+        fields = {
+            label: str(row[field])
+            for field, label in OPTIONAL_FIELDS.items()
+            if field in row.index and pd.notna(row[field])
+        }
+        return {
+            "done": False,
+            "case": idx,
+            "fields": fields,
+            "keyword": keyword,
+            "excerpt": excerpt,
+            "full_text": None if excerpt is not None else full_text,
+            "text_length": len(full_text),
+            "skipped_before": bool(s.cases.is_skipped(idx)),
+            "hint": hint,
+            "labeled": s.labeled,
+        }
+
+    def next_case(self, annotator: str) -> Dict:
+        s = self.session(annotator)
+        with s.lock:
+            return self._present(s)
+
+    def label(self, annotator: str, case: int, label: int) -> Dict:
+        if label not in (1, 0, -1):
+            raise ValueError("label 只能是 1、0 或 -1（跳过）")
+        s = self.session(annotator)
+        with s.lock:
+            if s.current is None or int(case) != s.current:
+                # 页面过期（如重复提交）：不记录，返回当前案例
+                return dict(self._present(s), stale=True)
+            idx = s.current
+            if not s.queue.append(
+                "label" if label >= 0 else "skip", idx, label, s.position + 1
+            ):
+                # 租约已过期且案例已发给他人：不记录，转到下一条
+                return dict(self._present(s), lost=True)
+            s.cases.set_label(idx, label)
+            record = None
+            if label >= 0:
+                s.labeled += 1
+                if s.current_feats is not None:
+                    record = {}
+                    row = s.cases.row(idx)
+                    # 建筑业=1 对应非建筑业标签 0
+                    self.updater.submit_label(
+                        record, row, analyze_case(row), s.current_feats, 1 - label
+                    )
+            s.history.append((idx, record))
+            s.position += 1
+            return self._present(s)
+
+    def undo(self, annotator: str) -> Dict:
+        s = self.session(annotator)
+        with s.lock:
+            if not s.history:
+                return dict(self._present(s), undo=False)
+            idx, record = s.history.pop()
+            if s.cases.is_annotated(idx):
+                s.labeled = max(0, s.labeled - 1)
+            s.cases.set_label(idx, None)
+            s.position = s.queue.position_of(idx)
+            s.queue.append("undo", idx, None, s.position)
+            if record is not None:
+                self.updater.submit_undo(record)
+            return dict(self._present(s), undo=True)
+
+    def stats_snapshot(self) -> Dict:
+        result = self.stats.snapshot()
+        update_ms = list(self.updater.update_ms)
+        result["model"] = {
+            "n_updates": self.model.get("n_updates", 0),
+            "applied": self.updater.applied,
+            "pending": self.updater.pending,
+            "update_p95_ms": (
+                round(float(np.percentile(update_ms, 95)), 3) if update_ms else None
+            ),
+        }
+        with self._sessions_lock:
+            result["sessions"] = {
+                name: {"labeled": s.labeled} for name, s in self._sessions.items()
+            }
+        with self._status_lock:
+            status = queue_status(self._status_conn)
+        result["queue"] = {
+            k: status[k] for k in ("total", "done", "leased", "agreement")
+        }
+        return result
+
+    def close(self):
+        with self._sessions_lock:
+            for s in self._sessions.values():
+                s.close()
+            self._sessions.clear()
+        self.updater.close()
+        self._status_conn.close()
+        self.reader.close()
+
+
+class AnnotationHandler(BaseHTTPRequestHandler):
+    service: AnnotationService = None  # 由 make_server 设置
+
+    def log_message(self, format, *args):
+        # 逐请求日志改由 /api/stats 统计
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status: int, data: Dict):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self._send(status, body, "application/json; charset=utf-8")
+
+    def _read_json(self) -> Dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        if not length:
+            return {}
+        return json.loads(self.rfile.read(length).decode("utf-8"))
+
+    def _handle(self, endpoint: str, fn):
+        t0 = time.perf_counter()
+        ok = True
+        try:
+            status, data = 200, fn()
+        except (ValueError, KeyError, json.JSONDecodeError) as e:
+            ok = False
+            status, data = 400, {"error": str(e)}
+        except Exception as e:
+            ok = False
+            status, data = 500, {"error": str(e)}
+        self._send_json(status, data)
+        self.service.stats.record(endpoint, (time.perf_counter() - t0) * 1000, ok)
+
+    def do_GET(self):
+        if self.path in ("/", "/index.html"):
+            self._send(200, INDEX_HTML.encode("utf-8"), "text/html; charset=utf-8")
+        elif self.path == "/api/stats":
+            self._handle("stats", self.service.stats_snapshot)
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        service = self.service
+        if self.path == "/api/next":
+            self._handle(
+                "next", lambda: service.next_case(self._read_json()["annotator"])
+            )
+        elif self.path == "/api/label":
+
+            def label():
+                data = self._read_json()
+                return service.label(
+                    data["annotator"], int(data["case"]), int(data["label"])
+                )
+
+            self._handle("label", label)
+        elif self.path == "/api/undo":
+            self._handle("undo", lambda: service.undo(self._read_json()["annotator"]))
+        else:
+            self._send_json(404, {"error": "not found"})
+
+
+def make_server(
+    service: AnnotationService, host: str = "127.0.0.1", port: int = 8000
+) -> ThreadingHTTPServer:
+    handler = type("Handler", (AnnotationHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+INDEX_HTML = """<!DOCTYPE html>
+<html lang="zh-CN">
+<head>
+<meta charset="utf-8">
+<title>建筑业事故案例标注</title>
+<style>
+body { font-family: sans-serif; max-width: 960px; margin: 1em auto; padding: 0 1em; }
+#text { white-space: pre-wrap; background: #f7f7f7; padding: 1em; line-height: 1.6; }
+#hint { color: #555; margin: .5em 0; }
+button { font-size: 1.1em; margin-right: .5em; padding: .3em 1em; }
+.meta { color: #333; margin: .2em 0; }
+</style>
+</head>
+<body>
+<h2>建筑业事故案例标注</h2>
+<div>用户名: <input id="who"> <button onclick="start()">开始</button>
+  <span id="progress"></span></div>
+<hr>
+<div id="meta"></div>
+<div id="hint"></div>
+<div id="text"></div>
+<p>
+  <button onclick="label(1)">1 建筑业</button>
+  <button onclick="label(0)">0 非建筑业</button>
+  <button onclick="label(-1)">s 跳过</button>
+  <button onclick="undo()">u 撤销</button>
+</p>
+<script>
+let current = null;
+const who = document.getElementById("who");
+who.value = localStorage.getItem("annotator") || "";
+
+async function post(path, body) {
+  const r = await fetch(path, {method: "POST", body: JSON.stringify(body)});
+  const data = await r.json();
+  if (!r.ok) { alert(data.error); throw new Error(data.error); }
+  return data;
+}
+function show(c) {
+  const meta = document.getElementById("meta");
+  meta.innerHTML = "";
+  document.getElementById("progress").textContent =
+    "本次已标注 " + c.labeled + " 条";
+  if (c.done) {
+    current = null;
+    document.getElementById("hint").textContent = "";
+    document.getElementById("text").textContent = "🎉 共享队列中已没有可领取的案例！";
+    return;
+  }
+  current = c.case;
+  for (const [k, v] of Object.entries(c.fields)) {
+    const d = document.createElement("div");
+    d.className = "meta";
+    d.textContent = k + ": " + v;
+    meta.appendChild(d);
+  }
+  if (c.skipped_before) meta.appendChild(document.createTextNode("[此案例之前被跳过]"));
+  const h = c.hint;
+  document.getElementById("hint").textContent = h
+    ? "🔎 智能提示: 非建筑业概率约 " + Math.round(h.prob * 100) + "%" +
+      (h.reasons.length ? "，依据: " + h.reasons.join(", ") : "")
+    : "";
+  document.getElementById("text").textContent = c.excerpt !== null
+    ? "【关键信息】（找到 '" + c.keyword + "'）\\n\\n" + c.excerpt
+    : c.full_text;
+}
+async function start() {
+  localStorage.setItem("annotator", who.value.trim());
+  show(await post("/api/next", {annotator: who.value}));
+}
+async function label(v) {
+  if (current === null) return;
+  show(await post("/api/label", {annotator: who.value, case: current, label: v}));
+}
+async function undo() {
+  show(await post("/api/undo", {annotator: who.value}));
+}
+document.addEventListener("keydown", (e) => {
+  if (e.target === who) return;
+  if (e.key === "1") label(1);
+  else if (e.key === "0") label(0);
+  else if (e.key === "s") label(-1);
+  else if (e.key === "u") undo();
+});
+if (who.value) start();
+</script>
+</body>
+</html>
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="网页标注服务（多名标注者共用一个进程）"
+    )
+    parser.add_argument("db", help="共享队列数据库（shared_queue.py init 建立）")
+    parser.add_argument("--host", default="127.0.0.1", help="监听地址（默认仅本机）")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--model-base",
+        default=MODEL_BASE,
+        help="共享智能提示模型的基础路径（<基础名>_hint_model.bin）",
+    )
+    args = parser.parse_args()
+
+    start_warm_up()
+    service = AnnotationService(Path(args.db), args.model_base)
+    server = make_server(service, args.host, args.port)
+    print(f"标注服务已启动: http://{args.host}:{args.port}/  （Ctrl+C 停止）")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n正在停止，保存智能提示模型...")
+    finally:
+        server.server_close()
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
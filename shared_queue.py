@@ -0,0 +1,616 @@
+# -*- coding: utf-8 -*-
+"""
+多人共享标注队列：所有标注者的进程连接同一个 SQLite 数据库（WAL 模式），
+由数据库按随机顺序发放案例“租约”，标注结果集中记录，不再每人一份全量副本，也不需要合并。
+
+- 租约：取题时为案例登记 (案例, 标注者, 到期时间)，同一案例同时发放的份数
+  不超过还缺的标注数；标注/跳过后释放，进程异常退出的租约到期后自动重新发放。
+  租约过期且案例已发给他人后，原持有者的续期与标注都会被拒绝，案例从其会话中移除
+- 重叠标注：建库时按比例（--overlap-rate）抽取一部分案例，每条需要 --overlap 名
+  不同标注者标注，用于计算标注一致性；其余案例一人标注即完成
+- 跳过：记录在该标注者名下，不再发给他，但仍会发给其他人
+
+用法：
+    python shared_queue.py init data/shared/queue.db data/raw/accident_cases.csv \\
+        --overlap 2 --overlap-rate 0.1
+    python main.py --shared data/shared/queue.db        # 各标注者分别运行
+    python shared_queue.py status data/shared/queue.db
+    python shared_queue.py export data/shared/queue.db -o data/annotated/merged_result
+"""
+
+import argparse
+import secrets
+import sqlite3
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from case_store import (
+    LABEL_COLUMN,
+    LABEL_NA,
+    ROW_GROUP_SIZE,
+    CaseReader,
+    LabeledCases,
+    decode_labels,
+    ensure_store,
+)
+from work_queue import permutation_from_seed
+
+SHARED_FORMAT_VERSION = 1
+# 租约时长：超过该时间未提交标注，案例重新发放给其他人
+LEASE_SECONDS = 30 * 60
+# 并发写入时等待锁的最长时间（毫秒）
+BUSY_TIMEOUT_MS = 10000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS cases (
+    idx INTEGER PRIMARY KEY,            -- 案例库中的行号
+    case_id INTEGER,
+    position INTEGER NOT NULL,          -- 发放顺序（随机）
+    needed INTEGER NOT NULL,            -- 需要几名标注者
+    labeled INTEGER NOT NULL DEFAULT 0  -- 已有的 0/1 标注数（跳过不计）
+);
+CREATE INDEX IF NOT EXISTS cases_open ON cases(position) WHERE labeled < needed;
+CREATE TABLE IF NOT EXISTS leases (
+    idx INTEGER NOT NULL,
+    annotator TEXT NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (idx, annotator)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS leases_expires ON leases(expires);
+CREATE TABLE IF NOT EXISTS labels (
+    idx INTEGER NOT NULL,
+    annotator TEXT NOT NULL,
+    label INTEGER NOT NULL,             -- 1 建筑业，0 非建筑业，-1 跳过
+    ts REAL NOT NULL,
+    PRIMARY KEY (idx, annotator)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS labels_annotator ON labels(annotator, idx);
+"""
+
+# 可以发给 :who 的案例：还缺标注，他没有标过或跳过，且在租约中的份数没有占满缺口
+_OPEN_CASES = """
+SELECT c.idx FROM cases c
+WHERE c.labeled < c.needed
+  AND NOT EXISTS (SELECT 1 FROM labels l WHERE l.idx = c.idx AND l.annotator = :who)
+  AND c.labeled + (SELECT COUNT(*) FROM leases s WHERE s.idx = c.idx) < c.needed
+ORDER BY c.position
+LIMIT :n
+"""
+
+# 除 :who 以外，案例 :idx 还空着的名额（需要的标注数 - 他人的标注 - 他人的租约）
+_FREE_SLOTS = """
+SELECT c.needed
+  - (SELECT COUNT(*) FROM labels l
+     WHERE l.idx = c.idx AND l.label >= 0 AND l.annotator != :who)
+  - (SELECT COUNT(*) FROM leases s WHERE s.idx = c.idx AND s.annotator != :who)
+FROM cases c WHERE c.idx = :idx
+"""
+
+
+def connect(db_path: Path, check_same_thread: bool = True) -> sqlite3.Connection:
+    """打开共享数据库（WAL 模式，自动提交，事务由调用方显式开启）"""
+    conn = sqlite3.connect(
+        str(db_path),
+        timeout=BUSY_TIMEOUT_MS / 1000,
+        check_same_thread=check_same_thread,
+    )
+    conn.isolation_level = None
+    conn.execute("PRAGMA journal_mode=WAL")
+    # 标注结果与标注日志一样逐条落盘
+    conn.execute("PRAGMA synchronous=FULL")
+    conn.execute(f"PRAGMA busy_timeout={BUSY_TIMEOUT_MS}")
+    return conn
+
+
+def read_meta(conn: sqlite3.Connection) -> Dict[str, str]:
+    return dict(conn.execute("SELECT key, value FROM meta"))
+
+
+def init_shared_queue(
+    db_path: Path,
+    csv_path: Path,
+    overlap: int = 1,
+    overlap_rate: float = 0.0,
+    seed: Optional[int] = None,
+    lease_seconds: int = LEASE_SECONDS,
+) -> Path:
+    """由原始 CSV（先导入案例库）建立共享队列；数据库已存在时报错"""
+    db_path = Path(db_path)
+    if db_path.exists():
+        raise FileExistsError(f"共享队列已存在: {db_path}")
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    store = ensure_store(Path(csv_path))
+    pf = pq.ParquetFile(store)
+    n = pf.metadata.num_rows
+    if seed is None:
+        seed = secrets.randbits(32)
+    # 重叠案例的抽样与发放顺序用同一种子的不同子序列
+    rng = np.random.default_rng([seed, 1])
+    position = np.empty(n, dtype=np.int64)
+    position[permutation_from_seed(seed, n)] = np.arange(n)
+    needed = np.ones(n, dtype=np.int64)
+    if overlap > 1 and overlap_rate > 0:
+        needed[rng.random(n) < overlap_rate] = overlap
+    if "case_id" in pf.schema_arrow.names:
+        case_ids = pf.read(columns=["case_id"]).column(0).to_numpy()
+    else:
+        case_ids = np.arange(n)
+
+    conn = connect(db_path)
+    try:
+        conn.executescript(_SCHEMA)
+        conn.execute("BEGIN IMMEDIATE")
+        meta = {
+            "format_version": SHARED_FORMAT_VERSION,
+            "store": str(store.resolve()),
+            "source": Path(csv_path).name,
+            "num_cases": n,
+            "overlap": overlap,
+            "overlap_rate": overlap_rate,
+            "seed": seed,
+            "lease_seconds": lease_seconds,
+            "created": round(time.time(), 3),
+        }
+        conn.executemany(
+            "INSERT INTO meta VALUES (?, ?)", [(k, str(v)) for k, v in meta.items()]
+        )
+        conn.executemany(
+            "INSERT INTO cases (idx, case_id, position, needed) VALUES (?, ?, ?, ?)",
+            zip(
+                range(n),
+                case_ids.tolist(),
+                position.tolist(),
+                needed.tolist(),
+            ),
+        )
+        conn.execute("COMMIT")
+    finally:
+        conn.close()
+    return db_path
+
+
+class SharedQueue:
+    """某个标注者在共享队列上的会话。
+
+    取题接口与 WorkQueue 相同（位置只在本次会话内有效，served[位置] 为第几个领到的案例）；
+    同时实现 AnnotationJournal 的 append/truncate/close，标注事件直接写入数据库。
+    check_same_thread=False 时可在多个线程中使用（调用方负责串行化，见 server.py）。
+    """
+
+    def __init__(self, db_path: Path, annotator: str, check_same_thread: bool = True):
+        self.path = Path(db_path)
+        if not self.path.exists():
+            raise FileNotFoundError(f"共享队列不存在: {self.path}")
+        self.annotator = annotator
+        self.conn = connect(self.path, check_same_thread)
+        self.meta = read_meta(self.conn)
+        self.store_path = Path(self.meta["store"])
+        self.lease_seconds = float(self.meta.get("lease_seconds", LEASE_SECONDS))
+        self.cases: Optional[LabeledCases] = None
+        self.served: List[int] = []
+        self._served_position: Dict[int, int] = {}
+        # 租约过期后已发给他人的案例：本次会话不再显示
+        self.lost: Set[int] = set()
+
+    def open_cases(self, reader: Optional[CaseReader] = None) -> LabeledCases:
+        """按需读取案例库；本地标注数组只包含本人的标注。
+        reader 为多个会话共用的 CaseReader（为空时单独打开案例库）"""
+        if reader is None:
+            cases = LabeledCases.open(self.store_path)
+        else:
+            cases = LabeledCases(reader)
+        if len(cases) != int(self.meta["num_cases"]):
+            raise ValueError(
+                f"案例库 {self.store_path} 的案例数（{len(cases)}）与共享队列"
+                f"（{self.meta['num_cases']}）不一致，请重新建立共享队列"
+            )
+        cases.labels[:] = LABEL_NA
+        for idx, label in self.conn.execute(
+            "SELECT idx, label FROM labels WHERE annotator = ?", (self.annotator,)
+        ):
+            cases.labels[idx] = label
+        self.cases = cases
+        return cases
+
+    def __len__(self) -> int:
+        return int(self.meta["num_cases"])
+
+    # ---------------- 取题（租约） ----------------
+
+    def _lease(self) -> Optional[int]:
+        """为本人领取一个案例：优先沿用本人尚未过期的租约（上次异常退出留下的）"""
+        now = time.time()
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("DELETE FROM leases WHERE expires <= ?", (now,))
+            held = [
+                idx
+                for (idx,) in conn.execute(
+                    "SELECT idx FROM leases WHERE annotator = ? ORDER BY expires",
+                    (self.annotator,),
+                )
+                if idx not in self._served_position
+            ]
+            if held:
+                idx = held[0]
+            else:
+                row = conn.execute(
+                    _OPEN_CASES, {"who": self.annotator, "n": 1}
+                ).fetchone()
+                idx = None if row is None else row[0]
+            if idx is not None:
+                conn.execute(
+                    "INSERT OR REPLACE INTO leases VALUES (?, ?, ?)",
+                    (idx, self.annotator, now + self.lease_seconds),
+                )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return idx
+
+    def _claim(self, idx: int, now: float) -> bool:
+        """在调用方开启的事务中为本人续期或重新登记租约；名额已被他人占满时返回 False"""
+        conn = self.conn
+        conn.execute("DELETE FROM leases WHERE expires <= ?", (now,))
+        row = conn.execute(_FREE_SLOTS, {"who": self.annotator, "idx": idx}).fetchone()
+        if row is None or row[0] <= 0:
+            conn.execute(
+                "DELETE FROM leases WHERE idx = ? AND annotator = ?",
+                (idx, self.annotator),
+            )
+            return False
+        conn.execute(
+            "INSERT OR REPLACE INTO leases VALUES (?, ?, ?)",
+            (idx, self.annotator, now + self.lease_seconds),
+        )
+        return True
+
+    def hold(self, idx: int) -> bool:
+        """确认本人仍可标注该案例并续期租约。
+        租约过期后案例已发给他人时返回 False，案例记入 lost，不再显示"""
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            held = self._claim(int(idx), time.time())
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        if not held:
+            self.lost.add(int(idx))
+        return held
+
+    def case_at(self, position: int) -> int:
+        return self.served[position]
+
+    def position_of(self, case_index: int) -> int:
+        return self._served_position[case_index]
+
+    def next_pending(self, position: int) -> int:
+        """从 position 起第一个待标注的位置；走到末尾时向数据库领取新案例"""
+        while position < len(self.served):
+            idx = self.served[position]
+            if (
+                not self.cases.is_annotated(idx)
+                and idx not in self.lost
+                and self.hold(idx)
+            ):
+                return position
+            position += 1
+        idx = self._lease()
+        if idx is None:
+            return len(self)
+        self._served_position[idx] = len(self.served)
+        self.served.append(idx)
+        return position
+
+    def upcoming(self, position: int, count: int) -> List[int]:
+        """预计接下来领到的案例（不登记租约，供后台预取）"""
+        result = [
+            c
+            for c in self.served[position + 1 :]
+            if not self.cases.is_annotated(c) and c not in self.lost
+        ][:count]
+        if len(result) < count:
+            for (idx,) in self.conn.execute(
+                _OPEN_CASES, {"who": self.annotator, "n": count * 2}
+            ):
+                if len(result) >= count:
+                    break
+                if idx not in self._served_position:
+                    result.append(idx)
+        return result
+
+    def refresh(self):
+        pass
+
+    # ---------------- 标注事件（与 AnnotationJournal 接口相同） ----------------
+
+    def append(self, op: str, index: int, value, position: int) -> bool:
+        """记录一次标注事件，返回是否已记录。
+
+        op: label / skip 写入标注并释放租约；undo 删除本人的标注并重新持有租约。
+        租约过期且案例名额已被他人占满时拒绝标注（返回 False，不写入），案例记入 lost；
+        撤销后无法重新持有租约的案例同样记入 lost。
+        """
+        index = int(index)
+        now = time.time()
+        conn = self.conn
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            if op == "undo":
+                conn.execute(
+                    "DELETE FROM labels WHERE idx = ? AND annotator = ?",
+                    (index, self.annotator),
+                )
+                if not self._claim(index, now):
+                    self.lost.add(index)
+            elif op == "label" and not self._claim(index, now):
+                conn.execute("COMMIT")
+                self.lost.add(index)
+                return False
+            else:
+                conn.execute(
+                    "INSERT OR REPLACE INTO labels VALUES (?, ?, ?, ?)",
+                    (index, self.annotator, int(value), round(now, 3)),
+                )
+                conn.execute(
+                    "DELETE FROM leases WHERE idx = ? AND annotator = ?",
+                    (index, self.annotator),
+                )
+            conn.execute(
+                "UPDATE cases SET labeled = (SELECT COUNT(*) FROM labels "
+                "WHERE idx = ? AND label >= 0) WHERE idx = ?",
+                (index, index),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        return True
+
+    def truncate(self):
+        """标注已逐条写入数据库，无需压实"""
+
+    def close(self):
+        """释放本人未完成的租约，其他人可以立即领取"""
+        try:
+            self.conn.execute(
+                "DELETE FROM leases WHERE annotator = ?", (self.annotator,)
+            )
+        except sqlite3.Error:
+            pass
+        self.conn.close()
+
+
+# ---------------- 统计与导出 ----------------
+
+
+def queue_status(conn: sqlite3.Connection) -> Dict:
+    """整体进度、各标注者数量与重叠案例上的一致性"""
+    total, done, overlap_cases = conn.execute(
+        "SELECT COUNT(*), SUM(labeled >= needed), SUM(needed > 1) FROM cases"
+    ).fetchone()
+    per_annotator = {
+        who: {"labeled": labeled, "skipped": skipped}
+        for who, labeled, skipped in conn.execute(
+            "SELECT annotator, SUM(label >= 0), SUM(label < 0) "
+            "FROM labels GROUP BY annotator ORDER BY annotator"
+        )
+    }
+    leased = conn.execute(
+        "SELECT COUNT(*) FROM leases WHERE expires > ?", (time.time(),)
+    ).fetchone()[0]
+    return {
+        "total": total,
+        "done": done or 0,
+        "overlap_cases": overlap_cases or 0,
+        "leased": leased,
+        "annotators": per_annotator,
+        "agreement": agreement(conn),
+    }
+
+
+def agreement(conn: sqlite3.Connection) -> Dict:
+    """重叠案例（needed > 1）上，两两比较的一致率与 Fleiss' kappa。
+    期望一致率用全体标注合并的阳性比例（不区分标注者，因此不是 Cohen's kappa）"""
+    votes: Dict[int, List[int]] = defaultdict(list)
+    for idx, label in conn.execute(
+        "SELECT idx, label FROM labels WHERE label >= 0 AND idx IN "
+        "(SELECT l.idx FROM labels l JOIN cases c ON c.idx = l.idx "
+        "WHERE l.label >= 0 AND c.needed > 1 GROUP BY l.idx HAVING COUNT(*) > 1)"
+    ):
+        votes[idx].append(label)
+    pairs = agree = 0
+    ones = total = 0
+    for labels in votes.values():
+        k = len(labels)
+        pos = sum(labels)
+        # 同一案例的两两组合中一致的对数
+        pairs += k * (k - 1) // 2
+        agree += pos * (pos - 1) // 2 + (k - pos) * (k - pos - 1) // 2
+        ones += pos
+        total += k
+    if pairs == 0:
+        return {"cases": 0, "pairs": 0, "observed": None, "fleiss_kappa": None}
+    observed = agree / pairs
+    p1 = ones / total
+    expected = p1 * p1 + (1 - p1) * (1 - p1)
+    kappa = (observed - expected) / (1 - expected) if expected < 1 else 1.0
+    return {
+        "cases": len(votes),
+        "pairs": pairs,
+        "observed": round(observed, 4),
+        "fleiss_kappa": round(kappa, 4),
+    }
+
+
+def export_labels(db_path: Path, output: Path) -> Dict[str, int]:
+    """导出合并结果（格式同 merge_annotations.py）：
+    <output>.parquet / .csv，以及有分歧的案例 <output>_conflicts.csv"""
+    conn = connect(Path(db_path))
+    try:
+        meta = read_meta(conn)
+        n = int(meta["num_cases"])
+        pos = np.zeros(n, dtype=np.int32)
+        neg = np.zeros(n, dtype=np.int32)
+        names: Dict[int, List[str]] = defaultdict(list)
+        for idx, who, label in conn.execute(
+            "SELECT idx, annotator, label FROM labels WHERE label >= 0 "
+            "ORDER BY idx, ts"
+        ):
+            if label == 1:
+                pos[idx] += 1
+            else:
+                neg[idx] += 1
+            names[idx].append(who)
+    finally:
+        conn.close()
+
+    count = pos + neg
+    conflict = (pos > 0) & (neg > 0)
+    consensus = np.full(n, LABEL_NA, dtype=np.int8)
+    consensus[(pos > 0) & ~conflict] = 1
+    consensus[(neg > 0) & ~conflict] = 0
+    annotators = np.array([",".join(names.get(i, [])) for i in range(n)], dtype=object)
+
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    parquet_path = output.with_suffix(".parquet")
+    csv_path = output.with_suffix(".csv")
+    conflict_path = output.parent / f"{output.stem}_conflicts.csv"
+    reader = CaseReader(Path(meta["store"]))
+    writer = None
+    start = 0
+    n_conflicts = 0
+    try:
+        for table in reader.iter_batches():
+            end = start + table.num_rows
+            table = (
+                table.append_column(LABEL_COLUMN, decode_labels(consensus[start:end]))
+                .append_column("annotation_count", pa.array(count[start:end]))
+                .append_column(
+                    "is_construction_conflict", pa.array(conflict[start:end])
+                )
+                .append_column("annotators", pa.array(annotators[start:end]))
+            )
+            if writer is None:
+                writer = pq.ParquetWriter(
+                    parquet_path, table.schema, compression="zstd"
+                )
+            writer.write_table(table, row_group_size=ROW_GROUP_SIZE)
+            df = table.to_pandas()
+            df.to_csv(
+                csv_path,
+                mode="w" if start == 0 else "a",
+                header=start == 0,
+                index=False,
+                encoding="utf-8-sig" if start == 0 else "utf-8",
+            )
+            conflicts = df[df["is_construction_conflict"]]
+            if len(conflicts):
+                conflicts.to_csv(
+                    conflict_path,
+                    mode="w" if n_conflicts == 0 else "a",
+                    header=n_conflicts == 0,
+                    index=False,
+                    encoding="utf-8-sig" if n_conflicts == 0 else "utf-8",
+                )
+                n_conflicts += len(conflicts)
+            start = end
+    finally:
+        if writer is not None:
+            writer.close()
+        reader.close()
+    return {
+        "total": n,
+        "annotated": int((count > 0).sum()),
+        "conflicts": int(conflict.sum()),
+    }
+
+
+def print_status(status: Dict):
+    print(f"案例总数:       {status['total']}")
+    print(f"已完成:         {status['done']}")
+    print(f"重叠标注案例:   {status['overlap_cases']}")
+    print(f"租约中:         {status['leased']}")
+    for who, s in status["annotators"].items():
+        print(f"  {who}: 标注 {s['labeled']}，跳过 {s['skipped']}")
+    agr = status["agreement"]
+    if agr["pairs"]:
+        print(
+            f"一致性:         {agr['cases']} 个多人标注案例，两两一致率 "
+            f"{agr['observed']:.2%}，Fleiss' kappa {agr['fleiss_kappa']:.3f}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多人共享标注队列（SQLite）")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p_init = sub.add_parser("init", help="由原始 CSV 建立共享队列")
+    p_init.add_argument("db", help="共享数据库路径，如 data/shared/queue.db")
+    p_init.add_argument("csv", help="原始 CSV 文件")
+    p_init.add_argument(
+        "--overlap", type=int, default=1, help="重叠案例需要的标注人数（默认 1）"
+    )
+    p_init.add_argument(
+        "--overlap-rate",
+        type=float,
+        default=0.0,
+        help="抽取多大比例的案例做重叠标注（如 0.1）",
+    )
+    p_init.add_argument("--seed", type=int, help="发放顺序的随机种子")
+    p_init.add_argument(
+        "--lease-minutes",
+        type=float,
+        default=LEASE_SECONDS / 60,
+        help="租约时长（分钟），超时未标注的案例重新发放",
+    )
+    p_status = sub.add_parser("status", help="查看进度与一致性")
+    p_status.add_argument("db")
+    p_export = sub.add_parser("export", help="导出合并后的标注结果")
+    p_export.add_argument("db")
+    p_export.add_argument(
+        "-o",
+        "--output",
+        default="data/annotated/merged_result",
+        help="输出路径（写出 .parquet、.csv 与 _conflicts.csv）",
+    )
+    args = parser.parse_args()
+
+    if args.command == "init":
+        db = init_shared_queue(
+            Path(args.db),
+            Path(args.csv),
+            overlap=args.overlap,
+            overlap_rate=args.overlap_rate,
+            seed=args.seed,
+            lease_seconds=int(args.lease_minutes * 60),
+        )
+        print(f"已建立共享队列: {db}")
+        print(f"各标注者运行: python main.py --shared {db}")
+    elif args.command == "status":
+        conn = connect(Path(args.db))
+        try:
+            print_status(queue_status(conn))
+        finally:
+            conn.close()
+    else:
+        stats = export_labels(Path(args.db), Path(args.output))
+        print(
+            f"已导出 {stats['annotated']}/{stats['total']} 个已标注案例"
+            f"（分歧 {stats['conflicts']} 个）-> {Path(args.output).with_suffix('.csv')}"
+        )
+
+
+if __name__ == "__main__":
+    main()
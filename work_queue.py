@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+"""
+标注顺序与待标注队列。
+
+标注进度用“位置”表示（进度文件、标注日志中的 pos）：顺序模式下位置就是行号，
+随机模式下 order[位置] 为行号，inverse[行号] 为位置（撤销时 O(1) 回到该案例）。
+
+启动时一次性（向量化）算出按位置排列的待标注队列（未标注或跳过的案例）。会话中只有
+队列里的案例会被标注或撤销，所以找下一个待标注案例只需在队列中二分定位，再越过
+本次会话已标注的少数几个，与语料规模无关。
+
+随机顺序保存为 <标注文件>_random_order.npy（可内存映射），生成它的随机种子记在
+<标注文件>_random_seed.txt，.npy 丢失时可由种子重新生成；旧版的
+_random_indices.txt（逗号分隔文本）首次启动时自动转换。
+"""
+
+import secrets
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+from case_store import LabeledCases
+
+
+def _paths(base_output_path: str):
+    p = Path(base_output_path)
+    return (
+        p.parent / f"{p.stem}_random_order.npy",
+        p.parent / f"{p.stem}_random_seed.txt",
+        p.parent / f"{p.stem}_random_indices.txt",
+    )
+
+
+def _index_dtype(n: int):
+    return np.int32 if n < 2**31 else np.int64
+
+
+def permutation_from_seed(seed: int, n: int) -> np.ndarray:
+    return np.random.default_rng(seed).permutation(n).astype(_index_dtype(n))
+
+
+def _save_order(order_path: Path, order: np.ndarray):
+    tmp = order_path.with_name(order_path.name + ".tmp.npy")
+    np.save(tmp, order)
+    tmp.replace(order_path)
+
+
+def _read_seed(seed_path: Path) -> Optional[int]:
+    try:
+        return int(seed_path.read_text().strip())
+    except (OSError, ValueError):
+        return None
+
+
+def load_random_order(base_output_path: str, n: int) -> np.ndarray:
+    """读取（或首次生成）随机标注顺序；长度与案例数不一致时重新生成"""
+    order_path, seed_path, legacy_path = _paths(base_output_path)
+    order = None
+    if order_path.exists():
+        order = np.load(order_path, mmap_mode="r")
+    elif legacy_path.exists():
+        with open(legacy_path, "r") as f:
+            order = np.array(f.read().strip().split(","), dtype=_index_dtype(n))
+        _save_order(order_path, order)
+    elif seed_path.exists():
+        seed = _read_seed(seed_path)
+        if seed is not None:
+            order = permutation_from_seed(seed, n)
+            _save_order(order_path, order)
+
+    if order is not None and len(order) == n:
+        return order
+    if order is not None:
+        print(
+            f"⚠️  警告: 随机顺序文件长度({len(order)})与当前数据({n})不匹配，将重新生成"
+        )
+    seed = secrets.randbits(32)
+    seed_path.write_text(str(seed))
+    order = permutation_from_seed(seed, n)
+    _save_order(order_path, order)
+    return order
+
+
+class WorkQueue:
+    """按标注顺序取待标注案例；order 为空表示顺序模式"""
+
+    def __init__(self, cases: LabeledCases, order: Optional[np.ndarray] = None):
+        self.cases = cases
+        self.order = order
+        n = len(cases)
+        if order is not None:
+            self.inverse = np.empty(n, dtype=_index_dtype(n))
+            self.inverse[order] = np.arange(n, dtype=self.inverse.dtype)
+            labels_by_position = cases.labels[order]
+        else:
+            self.inverse = None
+            labels_by_position = cases.labels
+        # 启动时待标注（未标注或跳过）的位置，升序
+        self._pending = np.flatnonzero(labels_by_position < 0).astype(_index_dtype(n))
+
+    def __len__(self) -> int:
+        return len(self.cases)
+
+    def case_at(self, position: int) -> int:
+        return int(self.order[position]) if self.order is not None else position
+
+    def position_of(self, case_index: int) -> int:
+        return int(self.inverse[case_index]) if self.inverse is not None else case_index
+
+    def _next_slot(self, position: int) -> int:
+        """队列中第一个位置 >= position 且仍待标注的下标"""
+        pending = self._pending
+        # 用同类型标量查找，避免 NumPy 把整个数组转换成 int64
+        i = int(np.searchsorted(pending, pending.dtype.type(position)))
+        while i < len(pending) and self.cases.is_annotated(self.case_at(pending[i])):
+            i += 1
+        return i
+
+    def next_pending(self, position: int) -> int:
+        """从 position 起第一个待标注的位置；没有则返回 len(self)"""
+        i = self._next_slot(position)
+        return int(self._pending[i]) if i < len(self._pending) else len(self)
+
+    def upcoming(self, position: int, count: int) -> List[int]:
+        """position 之后（不含）最多 count 个待标注案例的行号"""
+        result: List[int] = []
+        i = self._next_slot(position + 1)
+        pending = self._pending
+        while i < len(pending) and len(result) < count:
+            case_index = self.case_at(pending[i])
+            if not self.cases.is_annotated(case_index):
+                result.append(case_index)
+            i += 1
+        return result
+
+    def refresh(self):
+        """模型更新后调用；固定顺序无需处理（见 active_learning.ActiveQueue）"""
+
+    def close(self):
+        pass